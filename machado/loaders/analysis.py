@@ -7,16 +7,21 @@
 """Analysis."""
 
 from datetime import datetime
-from typing import Union
+from threading import Lock
+from typing import List, Union
 
-from django.core.exceptions import ObjectDoesNotExist
+import numpy as np
+from django.core.exceptions import MultipleObjectsReturned, ObjectDoesNotExist
+from django.db import transaction
 from django.db.utils import IntegrityError, DataError
 
-from machado.loaders.common import retrieve_organism, retrieve_feature_id
+from machado.loaders.bulk import copy_rows
+from machado.loaders.common import AccessionResolver, ReferenceCache
+from machado.loaders.common import retrieve_organism
 from machado.loaders.exceptions import ImportingError
 from machado.models import Analysis, Analysisfeature, Analysisprop
 from machado.models import Assay, Acquisition, Quantification
-from machado.models import Cvterm, Db, Dbxref, Organism, Feature
+from machado.models import Db, Dbxref, Organism, Feature
 
 
 class AnalysisLoader(object):
@@ -24,12 +29,14 @@ class AnalysisLoader(object):
 
     help = "Load analysis records."
 
-    def __init__(self) -> None:
+    def __init__(self, refcache: ReferenceCache = None) -> None:
         """Execute the init function."""
-        self.cvterm_contained_in = Cvterm.objects.get(
-            name="located in", cv__name="relationship"
-        )
+        self.refcache = ReferenceCache() if refcache is None else refcache
+        self.resolver = AccessionResolver()
+        self.cvterm_contained_in = self.refcache.cvterm("located in", "relationship")
         self.filename = None
+        self.not_found: List[str] = list()
+        self.lock = Lock()
 
     def store_analysis(
         self,
@@ -128,16 +135,16 @@ class AnalysisLoader(object):
             pass
         else:
             try:
-                organism = retrieve_organism(organism)
+                organism = self.refcache.memoize(
+                    ("organism", organism), lambda: retrieve_organism(organism)
+                )
             except (IntegrityError, DataError) as e:
                 raise ImportingError(str(e), file=self.filename)
         # retrieve feature
         if isinstance(feature, Feature):
             feature_id = feature.feature_id
         else:
-            feature_id = retrieve_feature_id(
-                accession=feature, soterm="mRNA", organism=organism
-            )
+            feature_id = self.resolver.resolve(feature, "mRNA", organism)
         # finally create analysisfeature
         try:
             Analysisfeature.objects.create(
@@ -150,3 +157,54 @@ class AnalysisLoader(object):
             )
         except (IntegrityError, DataError) as e:
             raise ImportingError(str(e), file=self.filename)
+
+    def store_analysisfeature_matrix(
+        self,
+        analyses: List[Analysis],
+        features: List[str],
+        organism: Organism,
+        scores: np.ndarray,
+        norm: bool = True,
+        ignorenotfound: bool = False,
+    ) -> None:
+        """Store a block of an expression matrix with COPY.
+
+        scores has a row per feature and a column per analysis. Each feature
+        is resolved once, the cells that are zero or NaN are dropped in one
+        vectorized pass and the others are written as normscore (or rawscore
+        if not norm). With ignorenotfound, the rows of features not found are
+        skipped and the errors are kept in not_found.
+        """
+        feature_ids = np.zeros(len(features), dtype=np.int64)
+        found = np.ones(len(features), dtype=bool)
+        for i, feature in enumerate(features):
+            try:
+                feature_ids[i] = self.resolver.resolve(
+                    feature, "mRNA", organism, query=False
+                )
+            except ObjectDoesNotExist as e:
+                if not ignorenotfound:
+                    raise
+                found[i] = False
+                with self.lock:
+                    self.not_found.append(str(e))
+            except MultipleObjectsReturned as e:
+                raise ImportingError(str(e), file=self.filename)
+
+        rows, columns = np.nonzero(
+            (scores != 0) & ~np.isnan(scores) & found[:, np.newaxis]
+        )
+        analysis_ids = np.array([item.analysis_id for item in analyses], dtype=np.int64)
+        try:
+            with transaction.atomic():
+                copy_rows(
+                    "analysisfeature",
+                    ("feature_id", "analysis_id", "normscore" if norm else "rawscore"),
+                    zip(
+                        feature_ids[rows].tolist(),
+                        analysis_ids[columns].tolist(),
+                        scores[rows, columns].tolist(),
+                    ),
+                )
+        except (IntegrityError, DataError) as e:
+            raise ImportingError(str(e), file=self.filename)
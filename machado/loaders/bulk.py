@@ -0,0 +1,156 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Bulk write helpers."""
+
+import re
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+from django.db import connection
+
+COPY_BLOCK_ROWS = 1000
+
+COPY_SPECIAL = re.compile(r"[\\\t\n\r]")
+
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def reserve_ids(table: str, column: str, count: int) -> List[int]:
+    """Reserve primary keys from the table's sequence.
+
+    Knowing the ids in advance lets dependent rows (featureloc, featureprop,
+    ...) be written with COPY in the same batch as their parent rows.
+    """
+    if count <= 0:
+        return list()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, %s)) "
+            "FROM generate_series(1, %s)",
+            [table, column, count],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def copy_text(value: Any) -> str:
+    """Format a value as a field of COPY's text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, (int, float)):
+        return str(value)
+    value = str(value)
+    if COPY_SPECIAL.search(value) is None:
+        return value
+    return value.translate(COPY_ESCAPES)
+
+
+def copy_rows(table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> int:
+    """Write rows to a table with COPY FROM STDIN and return the row count.
+
+    The rows are formatted as COPY text here and sent in blocks, which takes
+    a fraction of the time of adapting every value on its own.
+    """
+    statement = "COPY {} ({}) FROM STDIN".format(
+        connection.ops.quote_name(table),
+        ", ".join(connection.ops.quote_name(column) for column in columns),
+    )
+    total = 0
+    lines: List[str] = list()
+    # the raw psycopg cursor is used, so its errors are wrapped as Django's
+    with connection.cursor() as cursor, connection.wrap_database_errors:
+        with cursor.cursor.copy(statement) as copy:
+            for row in rows:
+                lines.append("\t".join(map(copy_text, row)))
+                if len(lines) >= COPY_BLOCK_ROWS:
+                    total += len(lines)
+                    copy.write("\n".join(lines) + "\n")
+                    lines.clear()
+            if lines:
+                total += len(lines)
+                copy.write("\n".join(lines) + "\n")
+    return total
+
+
+def upsert_dbxrefs(
+    db_id: int, accessions: Iterable[str], version: str = ""
+) -> Dict[str, int]:
+    """Get or create the dbxrefs of a db and return them by accession."""
+    accessions = sorted(set(accessions))
+    if not accessions:
+        return dict()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO dbxref (db_id, accession, version) "
+            "SELECT %s, accession, %s FROM unnest(%s::text[]) AS accession "
+            "ON CONFLICT (db_id, accession, version) DO NOTHING",
+            [db_id, version, accessions],
+        )
+        cursor.execute(
+            "SELECT accession, dbxref_id FROM dbxref "
+            "WHERE db_id = %s AND version = %s AND accession = ANY(%s)",
+            [db_id, version, accessions],
+        )
+        return dict(cursor.fetchall())
+
+
+def upsert_named_dbxrefs(
+    keys: Iterable[Tuple[str, str]], version: str = ""
+) -> Dict[Tuple[str, str], int]:
+    """Get or create dbs and dbxrefs and return the dbxrefs by (db, accession).
+
+    The new rows' ids come from RETURNING, so the existing ones are the only
+    ones looked up afterwards.
+    """
+    keys = sorted(set(keys))
+    if not keys:
+        return dict()
+    names = sorted({name for name, accession in keys})
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO db (name) SELECT unnest(%s::text[]) "
+            "ON CONFLICT (name) DO NOTHING RETURNING name, db_id",
+            [names],
+        )
+        db_ids = dict(cursor.fetchall())
+        if len(db_ids) < len(names):
+            cursor.execute(
+                "SELECT name, db_id FROM db WHERE name = ANY(%s)",
+                [[name for name in names if name not in db_ids]],
+            )
+            db_ids.update(cursor.fetchall())
+
+        accessions = [accession for name, accession in keys]
+        cursor.execute(
+            "INSERT INTO dbxref (db_id, accession, version) "
+            "SELECT db_id, accession, %s "
+            "FROM unnest(%s::bigint[], %s::text[]) AS t(db_id, accession) "
+            "ON CONFLICT (db_id, accession, version) DO NOTHING "
+            "RETURNING db_id, accession, dbxref_id",
+            [version, [db_ids[name] for name, accession in keys], accessions],
+        )
+        names = {db_id: name for name, db_id in db_ids.items()}
+        dbxref_ids = {
+            (names[db_id], accession): dbxref_id
+            for db_id, accession, dbxref_id in cursor.fetchall()
+        }
+        missing = [key for key in keys if key not in dbxref_ids]
+        if missing:
+            cursor.execute(
+                "SELECT t.db_id, t.accession, dbxref.dbxref_id "
+                "FROM unnest(%s::bigint[], %s::text[]) AS t(db_id, accession) "
+                "JOIN dbxref ON dbxref.db_id = t.db_id "
+                "AND dbxref.accession = t.accession AND dbxref.version = %s",
+                [
+                    [db_ids[name] for name, accession in missing],
+                    [accession for name, accession in missing],
+                    version,
+                ],
+            )
+            dbxref_ids.update(
+                ((names[db_id], accession), dbxref_id)
+                for db_id, accession, dbxref_id in cursor.fetchall()
+            )
+    return dbxref_ids
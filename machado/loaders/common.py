@@ -16,11 +16,14 @@ import gzip
 import os
 
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
+from django.db import connection
 
 from machado.loaders.exceptions import ImportingError
-from machado.models import Cvterm, Cvtermsynonym, Feature, FeatureDbxref, Organism
+from machado.models import Cv, Cvterm, Cvtermsynonym, Db, Dbxref
+from machado.models import Feature, FeatureDbxref, Organism, Pub
 
-from typing import Union
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 
 class FileValidator(object):
@@ -82,6 +85,124 @@ class FieldsValidator(object):
             counter += 1
 
 
+class ReferenceCache(object):
+    """Memoize reference data lookups by natural key.
+
+    The loaders resolve the same dbs, cvs, cvterms and pubs for every record
+    of a file; a cache kept for the whole run resolves each of them once.
+    Failed lookups raise and are not cached, except for ontology terms, which
+    are often missing and are cached as None.
+
+    Threads can share an instance without locking: concurrent misses may run
+    the same lookup, but dict.setdefault keeps the first value stored. The
+    cache is a plain dict, so worker processes get a copy of it.
+    """
+
+    def __init__(self) -> None:
+        """Execute the init function."""
+        self.items: Dict[Tuple, Any] = dict()
+
+    def memoize(self, key: Tuple, lookup: Callable[[], Any]) -> Any:
+        """Return the cached value of key, calling lookup on a miss."""
+        try:
+            return self.items[key]
+        except KeyError:
+            return self.items.setdefault(key, lookup())
+
+    def db(self, name: str) -> Db:
+        """Retrieve or create a db."""
+        return self.memoize(
+            ("db", name), lambda: Db.objects.get_or_create(name=name)[0]
+        )
+
+    def cv(self, name: str) -> Cv:
+        """Retrieve or create a cv."""
+        return self.memoize(
+            ("cv", name), lambda: Cv.objects.get_or_create(name=name)[0]
+        )
+
+    def cvterm(self, name: str, cv: str) -> Cvterm:
+        """Retrieve a cvterm, raising ObjectDoesNotExist if missing."""
+        return self.memoize(
+            ("cvterm", cv, name),
+            lambda: Cvterm.objects.get(name=name, cv__name=cv),
+        )
+
+    def dbxref(self, db: str, accession: str) -> Dbxref:
+        """Retrieve or create a dbxref."""
+        return self.memoize(
+            ("dbxref", db, accession),
+            lambda: Dbxref.objects.get_or_create(db=self.db(db), accession=accession)[
+                0
+            ],
+        )
+
+    def null_cvterm(self) -> Cvterm:
+        """Retrieve or create the null cvterm."""
+        return self.memoize(
+            ("cvterm", "null", "null"),
+            lambda: Cvterm.objects.get_or_create(
+                cv=self.cv("null"),
+                name="null",
+                definition="",
+                dbxref=self.dbxref("null", "null"),
+                is_obsolete=0,
+                is_relationshiptype=0,
+            )[0],
+        )
+
+    def null_pub(self) -> Pub:
+        """Retrieve or create the null pub."""
+        return self.memoize(
+            ("pub", "null"),
+            lambda: Pub.objects.get_or_create(
+                miniref="null",
+                uniquename="null",
+                type_id=self.null_cvterm().cvterm_id,
+                is_obsolete=False,
+            )[0],
+        )
+
+    def property_cvterm(self, key: str) -> Cvterm:
+        """Retrieve or create the feature_property cvterm of an attribute."""
+        return self.memoize(
+            ("cvterm", "feature_property", key),
+            lambda: Cvterm.objects.get_or_create(
+                cv=self.cv("feature_property"),
+                name=key,
+                dbxref=self.dbxref("null", key),
+                defaults={
+                    "definition": "",
+                    "is_relationshiptype": 0,
+                    "is_obsolete": 0,
+                },
+            )[0],
+        )
+
+    def ontology_term(self, db: str, accession: str) -> Optional[Cvterm]:
+        """Retrieve the cvterm of a DB:ACCESSION term, or None if missing."""
+
+        def lookup() -> Optional[Cvterm]:
+            try:
+                return Cvterm.objects.get(
+                    dbxref__db__name=db, dbxref__accession=accession
+                )
+            except ObjectDoesNotExist:
+                return None
+
+        return self.memoize(("ontology_term", db, accession), lookup)
+
+    def doi_pub(self, doi: str) -> Pub:
+        """Retrieve the pub of a DOI, raising ObjectDoesNotExist if missing."""
+        return self.memoize(
+            ("pub", "DOI", doi),
+            lambda: Pub.objects.get(
+                PubDbxref_pub_Pub__dbxref__db__name="DOI",
+                PubDbxref_pub_Pub__dbxref__accession=doi.lower(),
+            ),
+        )
+
+
 def get_num_lines(file_path):
     """Count number of lines in a text file."""
     if file_path.endswith(".gz"):
@@ -241,6 +362,232 @@ def retrieve_feature_id(
         )
 
 
+class AccessionResolver(object):
+    """Resolve accessions to feature_ids as retrieve_feature_id does.
+
+    Each (organism, soterm) namespace is read once into dicts keyed by
+    uniquename, name, dbxref accession and feature_dbxref accession, so a
+    lookup takes a few dict probes instead of up to five queries (the iexact
+    ones can't use an index). The steps are tried in the same order, and a
+    key matching more than one row is marked as ambiguous. Accessions missing
+    from the maps are still searched in the database, so features stored
+    after a namespace is read are found as well.
+
+    Without an organism every organism is searched and, as in
+    MultispeciesFeatureLoader, ambiguous matches fall through to the next
+    step, except for the last one.
+    """
+
+    AMBIGUOUS = -1
+
+    def __init__(self) -> None:
+        """Execute the init function."""
+        self.namespaces: Dict[Tuple[Optional[int], str], Tuple[Dict, ...]] = dict()
+        self.lock = Lock()
+
+    def __getstate__(self) -> Dict:
+        """Drop the lock when sent across processes."""
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        """Restore the lock when received from another process."""
+        self.__dict__.update(state)
+        self.lock = Lock()
+
+    def add(self, mapping: Dict[str, int], key: str, feature_id: int) -> None:
+        """Map key to feature_id, or mark it as ambiguous if already mapped."""
+        mapping[key] = self.AMBIGUOUS if key in mapping else feature_id
+
+    def load(self, soterm: str, organism: Optional[Organism]) -> Tuple[Dict, ...]:
+        """Retrieve the maps of a namespace, reading them on the first call."""
+        key = (None if organism is None else organism.organism_id, soterm)
+        try:
+            return self.namespaces[key]
+        except KeyError:
+            pass
+        with self.lock:
+            if key not in self.namespaces:
+                uniquenames: Dict[str, int] = dict()
+                names: Dict[str, int] = dict()
+                dbxrefs: Dict[str, int] = dict()
+                feature_dbxrefs: Dict[str, int] = dict()
+                features = Feature.objects.filter(
+                    type__cv__name="sequence", type__name=soterm
+                )
+                feature_dbxref_rows = FeatureDbxref.objects.filter(
+                    feature__type__cv__name="sequence", feature__type__name=soterm
+                )
+                if organism is not None:
+                    features = features.filter(organism=organism)
+                    feature_dbxref_rows = feature_dbxref_rows.filter(
+                        feature__organism=organism
+                    )
+                for feature_id, uniquename, name, accession in features.values_list(
+                    "feature_id", "uniquename", "name", "dbxref__accession"
+                ).iterator():
+                    self.add(uniquenames, uniquename, feature_id)
+                    # upper() mirrors the iexact lookups
+                    if name is not None:
+                        self.add(names, name.upper(), feature_id)
+                    if accession is not None:
+                        self.add(dbxrefs, accession.upper(), feature_id)
+                for feature_id, accession in feature_dbxref_rows.values_list(
+                    "feature_id", "dbxref__accession"
+                ).iterator():
+                    self.add(feature_dbxrefs, accession.upper(), feature_id)
+                self.namespaces[key] = (uniquenames, names, dbxrefs, feature_dbxrefs)
+        return self.namespaces[key]
+
+    def resolve(
+        self,
+        accession: str,
+        soterm: str,
+        organism: Optional[Organism] = None,
+        query: bool = True,
+    ) -> int:
+        """Retrieve the feature_id of an accession.
+
+        With query=False, accessions missing from the maps aren't searched in
+        the database, which is enough when no features are stored meanwhile.
+        """
+        if accession is None:
+            raise ObjectDoesNotExist(
+                "Feature {} '{}' does not exist.".format(soterm, accession)
+            )
+        uniquenames, names, dbxrefs, feature_dbxrefs = self.load(soterm, organism)
+        for mapping, key in (
+            (uniquenames, accession),
+            (uniquenames, "{}-{}".format(soterm, accession)),
+            (names, accession.upper()),
+            (dbxrefs, accession.upper()),
+            (feature_dbxrefs, accession.upper()),
+        ):
+            feature_id = mapping.get(key)
+            if feature_id is None:
+                continue
+            if feature_id != self.AMBIGUOUS:
+                return feature_id
+            if organism is not None or mapping is feature_dbxrefs:
+                raise MultipleObjectsReturned(
+                    "Multiple features found matching {} '{}'.".format(
+                        soterm, accession
+                    )
+                )
+        if not query:
+            raise ObjectDoesNotExist(
+                "Feature {} '{}' does not exist.".format(soterm, accession)
+            )
+        return self.query(accession, soterm, organism)
+
+    def resolve_batch(
+        self,
+        accessions: Iterable[str],
+        soterm: str,
+        organism: Optional[Organism] = None,
+    ) -> Dict[str, int]:
+        """Retrieve the feature_ids of many accessions with set-based queries.
+
+        Only the rows matching the accessions are read, with one query per
+        step of resolve (uniquename = ANY(...) and so on), and the same
+        precedence and ambiguity rules. The namespace maps aren't used or
+        filled. Accessions not found or ambiguous are left out of the result.
+        """
+        pending = sorted(set(accessions))
+        resolved: Dict[str, int] = dict()
+        where = (
+            "f.type_id IN (SELECT t.cvterm_id FROM cvterm t JOIN cv c "
+            "ON c.cv_id = t.cv_id WHERE c.name = 'sequence' AND t.name = %s)"
+        )
+        params: List[Any] = [soterm]
+        if organism is not None:
+            where += " AND f.organism_id = %s"
+            params.append(organism.organism_id)
+        steps = (
+            ("f.uniquename", "feature f", lambda acc: acc),
+            ("f.uniquename", "feature f", lambda acc: "{}-{}".format(soterm, acc)),
+            ("upper(f.name)", "feature f", str.upper),
+            (
+                "upper(d.accession)",
+                "feature f JOIN dbxref d ON d.dbxref_id = f.dbxref_id",
+                str.upper,
+            ),
+            (
+                "upper(d.accession)",
+                "feature_dbxref fd JOIN feature f ON f.feature_id = fd.feature_id "
+                "JOIN dbxref d ON d.dbxref_id = fd.dbxref_id",
+                str.upper,
+            ),
+        )
+        with connection.cursor() as cursor:
+            for i, (column, tables, key) in enumerate(steps):
+                if not pending:
+                    break
+                keys = {accession: key(accession) for accession in pending}
+                cursor.execute(
+                    "SELECT {}, f.feature_id FROM {} WHERE {} AND {} = ANY(%s)".format(
+                        column, tables, where, column
+                    ),
+                    params + [sorted(set(keys.values()))],
+                )
+                mapping: Dict[str, int] = dict()
+                for value, feature_id in cursor.fetchall():
+                    self.add(mapping, value, feature_id)
+                last = i == len(steps) - 1
+                remaining = list()
+                for accession in pending:
+                    feature_id = mapping.get(keys[accession])
+                    if feature_id is None:
+                        remaining.append(accession)
+                    elif feature_id != self.AMBIGUOUS:
+                        resolved[accession] = feature_id
+                    elif organism is None and not last:
+                        # as in resolve, ambiguous matches fall through
+                        remaining.append(accession)
+                pending = remaining
+        return resolved
+
+    def query(
+        self, accession: str, soterm: str, organism: Optional[Organism] = None
+    ) -> int:
+        """Search the database for an accession missing from the maps.
+
+        This finds the features stored after the namespace was read; the
+        accessions found are added to the uniquename map.
+        """
+        features = Feature.objects.filter(type__cv__name="sequence", type__name=soterm)
+        feature_dbxrefs = FeatureDbxref.objects.filter(
+            feature__type__cv__name="sequence", feature__type__name=soterm
+        )
+        if organism is not None:
+            features = features.filter(organism=organism)
+            feature_dbxrefs = feature_dbxrefs.filter(feature__organism=organism)
+        for queryset, lookup in (
+            (features, {"uniquename": accession}),
+            (features, {"uniquename": "{}-{}".format(soterm, accession)}),
+            (features, {"name__iexact": accession}),
+            (features, {"dbxref__accession__iexact": accession}),
+            (feature_dbxrefs, {"dbxref__accession__iexact": accession}),
+        ):
+            feature_ids = list(
+                queryset.filter(**lookup).values_list("feature_id", flat=True)[:2]
+            )
+            if len(feature_ids) == 1:
+                uniquenames = self.load(soterm, organism)[0]
+                uniquenames.setdefault(accession, feature_ids[0])
+                return feature_ids[0]
+            if feature_ids and (organism is not None or queryset is feature_dbxrefs):
+                raise MultipleObjectsReturned(
+                    "Multiple features found matching {} '{}'.".format(
+                        soterm, accession
+                    )
+                )
+        raise ObjectDoesNotExist(
+            "Feature {} '{}' does not exist.".format(soterm, accession)
+        )
+
+
 def retrieve_cvterm(cv: str, term: str) -> Cvterm:
     """Retrieve cvterm object."""
     # cvterm.name
@@ -19,6 +19,13 @@ class ImportingError(Exception):
         self.context = context
         super().__init__(self.message)
 
+    def __reduce__(self):
+        """Keep the contextual details when raised in a worker process."""
+        return (
+            self.__class__,
+            (self.message, self.file, self.line, self.field, self.context),
+        )
+
     def __str__(self):
         """Return string representation of the importing error."""
         msg = self.message
@@ -6,70 +6,137 @@
 
 """Load feature file."""
 
+import sys
+from array import array
+from bisect import bisect_left
 from datetime import datetime, timezone
+from itertools import repeat
+from threading import Lock
 from time import time
-from typing import Dict, List, Union, Set
+from typing import Dict, Iterable, List, Optional, Tuple, Union, Set
 
+import numpy as np
 from Bio.SearchIO._model import Hit
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
+from django.db import connection, transaction
 from django.db.utils import IntegrityError, DataError
 from pysam.libctabixproxies import GTFProxy, VCFProxy
 
-from machado.loaders.common import retrieve_feature_id, retrieve_cvterm
+from machado.loaders.bulk import copy_rows, reserve_ids, upsert_dbxrefs
+from machado.loaders.common import AccessionResolver, ReferenceCache
+from machado.loaders.common import retrieve_cvterm, retrieve_organism
 from machado.loaders.exceptions import ImportingError
 from machado.loaders.featureattributes import FeatureAttributesLoader
-from machado.models import Cv, Db, Cvterm, Dbxref, Dbxrefprop, Organism
+from machado.models import Cvterm, Db, Dbxref, Dbxrefprop, Organism
 from machado.models import Feature, FeatureCvterm, FeatureDbxref, Featureloc
 from machado.models import FeatureRelationship, FeatureRelationshipprop
-from machado.models import Featureprop, FeaturePub, Pub, PubDbxref
+from machado.models import Featureprop, FeaturePub, PubDbxref
+
+
+class FeatureIdMap(object):
+    """Map the uniquenames stored in a run to their feature_ids.
+
+    Millions of GFF rows fit in memory as a list of interned keys plus an
+    array of 64-bit ids, sorted once and searched by bisection.
+    """
+
+    def __init__(self) -> None:
+        """Execute the init function."""
+        self.keys: List[str] = list()
+        self.ids = array("q")
+        self.is_sorted = True
+        self.lock = Lock()
+
+    def __len__(self) -> int:
+        """Return the number of stored uniquenames."""
+        return len(self.keys)
+
+    def __getstate__(self) -> Dict:
+        """Drop the lock when sent across processes."""
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        """Restore the lock when received from another process."""
+        self.__dict__.update(state)
+        self.lock = Lock()
+
+    def add(self, uniquename: str, feature_id: int) -> None:
+        """Store the feature_id of a uniquename."""
+        with self.lock:
+            self.keys.append(sys.intern(uniquename))
+            self.ids.append(feature_id)
+            self.is_sorted = False
+
+    def update(self, other: "FeatureIdMap") -> None:
+        """Store every uniquename of another map."""
+        with self.lock:
+            self.keys.extend(sys.intern(key) for key in other.keys)
+            self.ids.extend(other.ids)
+            self.is_sorted = False
+
+    def sort(self) -> None:
+        """Sort the keys so they can be bisected."""
+        with self.lock:
+            if self.is_sorted:
+                return None
+            order = sorted(range(len(self.keys)), key=self.keys.__getitem__)
+            self.keys = [self.keys[i] for i in order]
+            self.ids = array("q", (self.ids[i] for i in order))
+            self.is_sorted = True
+
+    def get(self, uniquename: str) -> Optional[int]:
+        """Retrieve the feature_id of a uniquename, if it was stored."""
+        self.sort()
+        i = bisect_left(self.keys, uniquename)
+        if i == len(self.keys) or self.keys[i] != uniquename:
+            return None
+        if i + 1 < len(self.keys) and self.keys[i + 1] == uniquename:
+            raise MultipleObjectsReturned(
+                "Multiple features match '{}'".format(uniquename)
+            )
+        return self.ids[i]
 
 
 class FeatureLoaderBase(object):
     """Shared base for loading feature records."""
 
-    def __init__(self, source: str, filename: str, doi: str = None) -> None:
+    def __init__(
+        self,
+        source: str,
+        filename: str,
+        doi: str = None,
+        refcache: ReferenceCache = None,
+    ) -> None:
         """Execute the init function."""
         # initialization of lists/sets to store ignored attributes,
         # ignored goterms, and relationships
         self.cache: Dict[str, str] = dict()
         self.usedcache = 0
         self.relationships: List[Dict[str, str]] = list()
+        self.feature_ids = FeatureIdMap()
+        self.unresolved_relationships: List[Tuple[str, str]] = list()
         self.ignored_attrs: Set[str] = set()
         self.ignored_goterms: Set[str] = set()
+        self.attrs_loaders: Dict[Tuple[str, Optional[str]], FeatureAttributesLoader] = (
+            dict()
+        )
 
         self.filename = filename
+        self.refcache = ReferenceCache() if refcache is None else refcache
+        self.resolver = AccessionResolver()
         try:
-            self.db, created = Db.objects.get_or_create(name=source.upper())
+            self.db = self.refcache.db(source.upper())
         except (IntegrityError, DataError) as e:
             raise ImportingError(str(e), file=filename)
 
-        self.db_null, created = Db.objects.get_or_create(name="null")
-        null_dbxref, created = Dbxref.objects.get_or_create(
-            db=self.db_null, accession="null"
-        )
-        null_cv, created = Cv.objects.get_or_create(name="null")
-        null_cvterm, created = Cvterm.objects.get_or_create(
-            cv=null_cv,
-            name="null",
-            definition="",
-            dbxref=null_dbxref,
-            is_obsolete=0,
-            is_relationshiptype=0,
-        )
-        self.pub, created = Pub.objects.get_or_create(
-            miniref="null",
-            uniquename="null",
-            type_id=null_cvterm.cvterm_id,
-            is_obsolete=False,
-        )
+        self.db_null = self.refcache.db("null")
+        self.pub = self.refcache.null_pub()
 
-        self.cvterm_contained_in = Cvterm.objects.get(
-            name="located in", cv__name="relationship"
-        )
-        self.aa_cvterm = Cvterm.objects.get(name="polypeptide", cv__name="sequence")
-        self.so_term_protein_match = Cvterm.objects.get(
-            name="protein_match", cv__name="sequence"
-        )
+        self.cvterm_contained_in = self.refcache.cvterm("located in", "relationship")
+        self.aa_cvterm = self.refcache.cvterm("polypeptide", "sequence")
+        self.so_term_protein_match = self.refcache.cvterm("protein_match", "sequence")
         # Retrieve DOI's Dbxref
         dbxref_doi = None
         self.pub_dbxref_doi = None
@@ -89,6 +156,65 @@ class FeatureLoaderBase(object):
                     file=self.filename,
                 )
 
+    def get_attrs_loader(
+        self, filecontent: str, doi: str = None
+    ) -> FeatureAttributesLoader:
+        """Retrieve the attributes loader of the file content.
+
+        A single loader per file content collects the ignored attributes and
+        goterms of the whole run and shares this loader's reference cache.
+        """
+        key = (filecontent, doi)
+        if key not in self.attrs_loaders:
+            attrs_loader = FeatureAttributesLoader(
+                filecontent=filecontent, doi=doi, refcache=self.refcache
+            )
+            attrs_loader.ignored_attrs = self.ignored_attrs
+            attrs_loader.ignored_goterms = self.ignored_goterms
+            self.attrs_loaders.setdefault(key, attrs_loader)
+        return self.attrs_loaders[key]
+
+    def store_feature_group_batch(
+        self,
+        groups: List[Tuple[str, List[str]]],
+        term: Union[int, Cvterm],
+        soterm: str = "mRNA",
+        organism: Optional[Organism] = None,
+    ) -> None:
+        """Store a batch of (name, members) Feature Relationship Groups.
+
+        The distinct members of the batch are resolved with set-based
+        queries, following the steps of retrieve_feature_id, and the
+        featureprops of the groups with 2 or more members found are written
+        with COPY. Without an organism every organism is searched.
+        """
+        if isinstance(term, Cvterm):
+            cvterm_id = term.cvterm_id
+        else:
+            cvterm_id = term
+        feature_ids = self.resolver.resolve_batch(
+            (member for name, members in groups for member in members),
+            soterm,
+            organism,
+        )
+        featureprops = list()
+        for name, members in groups:
+            found = [feature_ids[acc] for acc in members if acc in feature_ids]
+            # only stores clusters with 2 or more members
+            if len(found) > 1:
+                featureprops.extend(
+                    (feature_id, cvterm_id, name, 0) for feature_id in found
+                )
+        try:
+            with transaction.atomic():
+                copy_rows(
+                    "featureprop",
+                    ("feature_id", "type_id", "value", "rank"),
+                    featureprops,
+                )
+        except (IntegrityError, DataError) as e:
+            raise ImportingError(str(e), file=self.filename)
+
 
 class FeatureLoader(FeatureLoaderBase):
     """Load single-organism feature records."""
@@ -96,7 +222,12 @@ class FeatureLoader(FeatureLoaderBase):
     help = "Load single-organism feature records."
 
     def __init__(
-        self, source: str, filename: str, organism: Organism, doi: str = None
+        self,
+        source: str,
+        filename: str,
+        organism: Organism,
+        doi: str = None,
+        refcache: ReferenceCache = None,
     ) -> None:
         """Execute the init function."""
         if organism is not None:
@@ -106,27 +237,48 @@ class FeatureLoader(FeatureLoaderBase):
                 "FeatureLoader requires a valid organism parameter.", file=filename
             )
 
-        super(FeatureLoader, self).__init__(source, filename, doi)
+        super(FeatureLoader, self).__init__(source, filename, doi, refcache)
+
+    def retrieve_srcfeature_id(self, contig: str, line: int = None) -> int:
+        """Retrieve the feature_id of the reference sequence."""
+
+        def lookup() -> int:
+            srcdb = self.refcache.db("FASTA_SOURCE")
+            try:
+                srcdbxref = Dbxref.objects.get(accession=contig, db=srcdb)
+            except ObjectDoesNotExist as e:
+                raise ImportingError(
+                    "{} {} ({})".format(srcdb.name, contig, e),
+                    file=self.filename,
+                    line=line,
+                )
+            srcfeature = Feature.objects.filter(
+                dbxref=srcdbxref, organism=self.organism
+            ).values_list("feature_id", flat=True)
+            if len(srcfeature) != 1:
+                raise ImportingError(
+                    "Reference feature '{}' not found. Ensure the reference FASTA "
+                    "file is loaded before importing features.".format(contig)
+                )
+            return srcfeature.first()
+
+        return self.refcache.memoize(
+            ("srcfeature", self.organism.organism_id, contig), lookup
+        )
 
     def store_tabix_GFF_feature(
         self, tabix_feature: GTFProxy, qtl: bool, line: int = None
     ) -> None:
         """Store tabix feature."""
-        filecontent = "qtl" if qtl else "genome"
-
-        attrs_loader = FeatureAttributesLoader(filecontent=filecontent)
+        attrs_loader = self.get_attrs_loader("qtl" if qtl else "genome")
         attrs_dict = attrs_loader.get_attributes(tabix_feature.attributes)
-        self.ignored_attrs = attrs_loader.ignored_attrs
-        self.ignored_goterms = attrs_loader.ignored_goterms
 
         if qtl:
-            cvterm = Cvterm.objects.get(name="QTL", cv__name="sequence")
+            cvterm = self.refcache.cvterm("QTL", "sequence")
             attrs_dict["qtl_type"] = tabix_feature.feature
         else:
             try:
-                cvterm = Cvterm.objects.get(
-                    name=tabix_feature.feature, cv__name="sequence"
-                )
+                cvterm = self.refcache.cvterm(tabix_feature.feature, "sequence")
             except ObjectDoesNotExist:
                 raise ImportingError(
                     "'{}' is not a valid Sequence Ontology term.".format(
@@ -184,25 +336,7 @@ class FeatureLoader(FeatureLoaderBase):
             except (IntegrityError, DataError) as e:
                 raise ImportingError(str(e), file=self.filename, line=line)
 
-        srcdb = Db.objects.get(name="FASTA_SOURCE")
-        try:
-            srcdbxref = Dbxref.objects.get(accession=tabix_feature.contig, db=srcdb)
-        except ObjectDoesNotExist as e:
-            raise ImportingError(
-                "{} {} ({}, file=self.filename, line=line)".format(
-                    srcdb.name, tabix_feature.contig, e
-                )
-            )
-        srcfeature = Feature.objects.filter(
-            dbxref=srcdbxref, organism=self.organism
-        ).values_list("feature_id", flat=True)
-        if len(srcfeature) == 1:
-            srcfeature_id = srcfeature.first()
-        else:
-            raise ImportingError(
-                "Reference feature '{}' not found. Ensure the reference FASTA "
-                "file is loaded before importing features.".format(tabix_feature.contig)
-            )
+        srcfeature_id = self.retrieve_srcfeature_id(tabix_feature.contig, line=line)
 
         # the database requires -1, 0, and +1 for strand
         if tabix_feature.strand == "+":
@@ -237,7 +371,7 @@ class FeatureLoader(FeatureLoaderBase):
         except (IntegrityError, DataError) as e:
             print(
                 attrs_id,
-                srcdbxref,
+                tabix_feature.contig,
                 tabix_feature.start,
                 tabix_feature.end,
                 strand,
@@ -248,15 +382,16 @@ class FeatureLoader(FeatureLoaderBase):
         # Process attrs_dict after the creation of the feature
         attrs_loader.process_attributes(feature_id, attrs_dict)
 
+        self.feature_ids.add(attrs_id, feature_id)
         for parent in attrs_parent:
-            self.relationships.append({"object_id": attrs_id, "subject_id": parent})
+            self.relationships.append(
+                {"object_id": sys.intern(attrs_id), "subject_id": sys.intern(parent)}
+            )
 
         # Additional protein record for each transcript with the exact same ID
         transcripts_types = ["mRNA", "C_gene_segment", "V_gene_segment"]
         if tabix_feature.feature in transcripts_types:
-            translation_of = Cvterm.objects.get(
-                name="translation_of", cv__name="sequence"
-            )
+            translation_of = self.refcache.cvterm("translation_of", "sequence")
             feature_mRNA_translation_id = Feature.objects.create(
                 organism=self.organism,
                 uniquename=attrs_id,
@@ -275,58 +410,109 @@ class FeatureLoader(FeatureLoaderBase):
                 rank=0,
             )
 
-    def store_relationship(
-        self, subject_id: int, object_id: int
-    ) -> FeatureRelationship:
-        """Retrieve the relationship object."""
+    def store_relationship(self, subject_id: str, object_id: str) -> None:
+        """Store the part_of relationship of a pair of uniquenames."""
+        self.store_relationships([{"subject_id": subject_id, "object_id": object_id}])
+
+    def store_relationships(self, relationships: Iterable[Dict[str, str]]) -> None:
+        """Store a batch of part_of relationships.
+
+        The uniquenames are resolved with the features stored in this run,
+        falling back to a single query for the ones loaded previously. Pairs
+        that can't be resolved are kept in unresolved_relationships.
+        """
         part_of = Cvterm.objects.get(name="part_of", cv__name="sequence")
+        relationships = list(relationships)
 
-        try:
-            fr = FeatureRelationship(
-                subject_id=Feature.objects.exclude(type=self.aa_cvterm)
-                .get(uniquename=subject_id, organism=self.organism)
-                .feature_id,
-                object_id=Feature.objects.exclude(type=self.aa_cvterm)
-                .get(uniquename=object_id, organism=self.organism)
-                .feature_id,
-                type_id=part_of.cvterm_id,
-                rank=0,
+        feature_ids: Dict[str, Optional[int]] = dict()
+        for item in relationships:
+            for uniquename in (item["subject_id"], item["object_id"]):
+                if uniquename in feature_ids:
+                    continue
+                try:
+                    feature_ids[uniquename] = self.feature_ids.get(uniquename)
+                except MultipleObjectsReturned:
+                    feature_ids[uniquename] = None
+        missing = [key for key, value in feature_ids.items() if value is None]
+        if missing:
+            registered = (
+                Feature.objects.exclude(type=self.aa_cvterm)
+                .filter(uniquename__in=missing, organism=self.organism)
+                .values_list("uniquename", "feature_id")
             )
-            fr.save()
-        except ObjectDoesNotExist:
-            print(
-                "Parent/Feature ({}/{}) not registered.".format(object_id, subject_id)
+            counts: Dict[str, int] = dict()
+            for uniquename, feature_id in registered:
+                counts[uniquename] = counts.get(uniquename, 0) + 1
+                feature_ids[uniquename] = feature_id
+            for uniquename, count in counts.items():
+                # ambiguous uniquenames can't be resolved
+                if count > 1:
+                    feature_ids[uniquename] = None
+
+        rows = dict()
+        for item in relationships:
+            subject_id = feature_ids[item["subject_id"]]
+            object_id = feature_ids[item["object_id"]]
+            if subject_id is None or object_id is None:
+                self.unresolved_relationships.append(
+                    (item["object_id"], item["subject_id"])
+                )
+                continue
+            rows[(subject_id, object_id)] = (
+                subject_id,
+                object_id,
+                part_of.cvterm_id,
+                0,
             )
 
-    def store_tabix_VCF_feature(
-        self, tabix_feature: VCFProxy, line: int = None
-    ) -> None:
-        """Store tabix feature from VCF files."""
-        attrs_loader = FeatureAttributesLoader(filecontent="polymorphism")
-        attrs_dict = attrs_loader.get_attributes(tabix_feature.info)
-        self.ignored_attrs = attrs_loader.ignored_attrs
-        self.ignored_goterms = attrs_loader.ignored_goterms
+        try:
+            with transaction.atomic():
+                copy_rows(
+                    "feature_relationship",
+                    ("subject_id", "object_id", "type_id", "rank"),
+                    rows.values(),
+                )
+        except (IntegrityError, DataError) as e:
+            raise ImportingError(str(e), file=self.filename)
 
-        if attrs_dict.get("vc"):
-            attrs_class = attrs_dict.get("vc")
-        elif attrs_dict.get("tsa"):
-            attrs_class = attrs_dict.get("tsa")
+    def retrieve_variant_cvterm(
+        self, accession: str, attrs: Dict[str, str], line: int = None
+    ) -> Cvterm:
+        """Retrieve the cvterm of a variant's class (VC or TSA attribute)."""
+        if attrs.get("vc"):
+            attrs_class = attrs.get("vc")
+        elif attrs.get("tsa"):
+            attrs_class = attrs.get("tsa")
         else:
             raise ImportingError(
                 "{}: Unable to identify the variation type attribute (e.g., TSA or VC).".format(
-                    tabix_feature.id
+                    accession
                 ),
                 file=self.filename,
+                line=line,
             )
 
         try:
-            cvterm = retrieve_cvterm(cv="sequence", term=attrs_class)
+            return self.refcache.memoize(
+                ("cvterm_or_synonym", "sequence", attrs_class),
+                lambda: retrieve_cvterm(cv="sequence", term=attrs_class),
+            )
         except ObjectDoesNotExist:
             raise ImportingError(
                 "'{}' is not a valid Sequence Ontology term.".format(attrs_class),
                 file=self.filename,
+                line=line,
             )
 
+    def store_tabix_VCF_feature(
+        self, tabix_feature: VCFProxy, line: int = None
+    ) -> None:
+        """Store tabix feature from VCF files."""
+        attrs_loader = self.get_attrs_loader("polymorphism")
+        attrs_dict = attrs_loader.get_attributes(tabix_feature.info)
+
+        cvterm = self.retrieve_variant_cvterm(tabix_feature.id, attrs_dict, line=line)
+
         try:
             dbxref, created = Dbxref.objects.get_or_create(
                 db=self.db, accession=tabix_feature.id
@@ -358,7 +544,7 @@ class FeatureLoader(FeatureLoaderBase):
             )
 
         if tabix_feature.qual != ".":
-            cvterm_qual = Cvterm.objects.get(name="quality_value", cv__name="sequence")
+            cvterm_qual = self.refcache.cvterm("quality_value", "sequence")
             featureprop_obj = Featureprop(
                 feature_id=feature_id,
                 type=cvterm_qual,
@@ -376,25 +562,7 @@ class FeatureLoader(FeatureLoaderBase):
             except (IntegrityError, DataError) as e:
                 raise ImportingError(str(e), file=self.filename, line=line)
 
-        srcdb = Db.objects.get(name="FASTA_SOURCE")
-        try:
-            srcdbxref = Dbxref.objects.get(accession=tabix_feature.contig, db=srcdb)
-        except ObjectDoesNotExist as e:
-            raise ImportingError(
-                "{} {} ({}, file=self.filename, line=line)".format(
-                    srcdb.name, tabix_feature.contig, e
-                )
-            )
-        srcfeature = Feature.objects.filter(
-            dbxref=srcdbxref, organism=self.organism
-        ).values_list("feature_id", flat=True)
-        if len(srcfeature) == 1:
-            srcfeature_id = srcfeature.first()
-        else:
-            raise ImportingError(
-                "Reference feature '{}' not found. Ensure the reference FASTA "
-                "file is loaded before importing features.".format(tabix_feature.contig)
-            )
+        srcfeature_id = self.retrieve_srcfeature_id(tabix_feature.contig, line=line)
 
         # Reference allele
         try:
@@ -410,7 +578,7 @@ class FeatureLoader(FeatureLoaderBase):
                 rank=0,
             )
         except (IntegrityError, DataError) as e:
-            print(tabix_feature.id, srcdbxref, tabix_feature.pos)
+            print(tabix_feature.id, tabix_feature.contig, tabix_feature.pos)
             raise ImportingError(str(e), file=self.filename, line=line)
 
         # Alternative alleles
@@ -428,7 +596,7 @@ class FeatureLoader(FeatureLoaderBase):
                     rank=rank,
                 )
             except (IntegrityError, DataError) as e:
-                print(tabix_feature.id, srcdbxref, tabix_feature.pos)
+                print(tabix_feature.id, tabix_feature.contig, tabix_feature.pos)
                 raise ImportingError(str(e), file=self.filename, line=line)
             rank += 1
 
@@ -441,22 +609,16 @@ class FeatureLoader(FeatureLoaderBase):
         doi: Union[str, None],
     ) -> None:
         """Store feature annotation."""
-        feature_id = retrieve_feature_id(
-            accession=feature, soterm=soterm, organism=self.organism
-        )
+        feature_id = self.resolver.resolve(feature, soterm, self.organism)
         attrs_str = "{}={};".format(cvterm, annotation)
 
-        attrs_loader = FeatureAttributesLoader(filecontent="genome", doi=doi)
+        attrs_loader = self.get_attrs_loader("genome", doi=doi)
         attrs_dict = attrs_loader.get_attributes(attrs_str)
         attrs_loader.process_attributes(feature_id, attrs_dict)
-        self.ignored_attrs = attrs_loader.ignored_attrs
-        self.ignored_goterms = attrs_loader.ignored_goterms
 
     def store_feature_dbxref(self, feature: str, soterm: str, dbxref: str) -> None:
         """Store feature dbxref."""
-        feature_id = retrieve_feature_id(
-            accession=feature, soterm=soterm, organism=self.organism
-        )
+        feature_id = self.resolver.resolve(feature, soterm, self.organism)
 
         try:
             db_name, dbxref_accession = dbxref.split(":", 1)
@@ -467,9 +629,8 @@ class FeatureLoader(FeatureLoaderBase):
                 ),
                 file=self.filename,
             )
-        db_obj, created = Db.objects.get_or_create(name=db_name)
         dbxref_obj, created = Dbxref.objects.get_or_create(
-            db=db_obj, accession=dbxref_accession
+            db=self.refcache.db(db_name), accession=dbxref_accession
         )
         FeatureDbxref.objects.get_or_create(
             feature_id=feature_id, dbxref=dbxref_obj, is_current=True
@@ -477,12 +638,9 @@ class FeatureLoader(FeatureLoaderBase):
 
     def store_feature_publication(self, feature: str, soterm: str, doi: str) -> None:
         """Store feature publication."""
-        feature_id = retrieve_feature_id(
-            accession=feature, soterm=soterm, organism=self.organism
-        )
+        feature_id = self.resolver.resolve(feature, soterm, self.organism)
         try:
-            doi_obj = Dbxref.objects.get(accession=doi.lower(), db__name="DOI")
-            pub_obj = Pub.objects.get(PubDbxref_pub_Pub__dbxref=doi_obj)
+            pub_obj = self.refcache.doi_pub(doi)
         except ObjectDoesNotExist:
             raise ImportingError(
                 "DOI '{}' is not registered.".format(doi), file=self.filename
@@ -506,12 +664,8 @@ class FeatureLoader(FeatureLoaderBase):
             cvterm_id = term
         # lets get feature_ids from the pair
         try:
-            subject_id = retrieve_feature_id(
-                accession=pair[0], soterm=soterm, organism=self.organism
-            )
-            object_id = retrieve_feature_id(
-                accession=pair[1], soterm=soterm, organism=self.organism
-            )
+            subject_id = self.resolver.resolve(pair[0], soterm, self.organism)
+            object_id = self.resolver.resolve(pair[1], soterm, self.organism)
             frelationship_id = FeatureRelationship.objects.create(
                 subject_id=subject_id,
                 object_id=object_id,
@@ -530,6 +684,81 @@ class FeatureLoader(FeatureLoaderBase):
         except (IntegrityError, DataError) as e:
             raise ImportingError(str(e), file=self.filename)
 
+    def store_feature_pair_batch(
+        self,
+        pairs: List[Tuple[str, str]],
+        values: np.ndarray,
+        term: Union[int, Cvterm],
+        soterm: str = "mRNA",
+    ) -> None:
+        """Store a batch of Feature Relationship Pairs with COPY.
+
+        The distinct accessions of the batch are resolved once and the pairs
+        mapped to arrays of feature_ids. The pairs with a feature not
+        registered are kept in unresolved_relationships; the others are
+        written as the rows store_feature_pairs writes.
+        """
+        if isinstance(term, Cvterm):
+            cvterm_id = term.cvterm_id
+        else:
+            cvterm_id = term
+        accessions, inverse = np.unique(
+            np.array(pairs, dtype=str).ravel(), return_inverse=True
+        )
+        accession_ids = np.zeros(len(accessions), dtype=np.int64)
+        for i, accession in enumerate(accessions.tolist()):
+            try:
+                accession_ids[i] = self.resolver.resolve(
+                    accession, soterm, self.organism, query=False
+                )
+            except ObjectDoesNotExist:
+                accession_ids[i] = -1
+            except MultipleObjectsReturned as e:
+                raise ImportingError(str(e), file=self.filename)
+        feature_ids = accession_ids[inverse.reshape(-1, 2)]
+        found = (feature_ids != -1).all(axis=1)
+        self.unresolved_relationships.extend(
+            [tuple(pairs[i]) for i in np.flatnonzero(~found).tolist()]
+        )
+        feature_ids = feature_ids[found]
+        values = values[found]
+        contained_in_id = self.cvterm_contained_in.cvterm_id
+
+        try:
+            with transaction.atomic():
+                relationship_ids = reserve_ids(
+                    "feature_relationship", "feature_relationship_id", len(values)
+                )
+                copy_rows(
+                    "feature_relationship",
+                    (
+                        "feature_relationship_id",
+                        "subject_id",
+                        "object_id",
+                        "type_id",
+                        "value",
+                        "rank",
+                    ),
+                    zip(
+                        relationship_ids,
+                        feature_ids[:, 0].tolist(),
+                        feature_ids[:, 1].tolist(),
+                        repeat(cvterm_id),
+                        values.tolist(),
+                        repeat(0),
+                    ),
+                )
+                copy_rows(
+                    "feature_relationshipprop",
+                    ("feature_relationship_id", "type_id", "value", "rank"),
+                    (
+                        (relationship_id, contained_in_id, self.filename, 0)
+                        for relationship_id in relationship_ids
+                    ),
+                )
+        except (IntegrityError, DataError) as e:
+            raise ImportingError(str(e), file=self.filename)
+
     def store_feature_groups(
         self,
         group: list,
@@ -545,14 +774,16 @@ class FeatureLoader(FeatureLoaderBase):
             cvterm_id = term.cvterm_id
         else:
             cvterm_id = term
+        if not isinstance(organism, Organism):
+            organism = self.refcache.memoize(
+                ("organism", organism), lambda: retrieve_organism(organism)
+            )
         featureprops = list()
         feature_id_list = list()
         for acc in group:
             try:
                 # retrieves feature_id from dbxref's accession
-                feature_id_list.append(
-                    retrieve_feature_id(accession=acc, soterm=soterm, organism=organism)
-                )
+                feature_id_list.append(self.resolver.resolve(acc, soterm, organism))
             except (MultipleObjectsReturned, ObjectDoesNotExist):
                 pass
 
@@ -577,84 +808,40 @@ class MultispeciesFeatureLoader(FeatureLoaderBase):
 
     def retrieve_feature_id(self, accession: str, soterm: str) -> int:
         """Retrieve feature object assuming unique across all organisms."""
-        # feature.uniquename
-        try:
-            return Feature.objects.get(
-                uniquename=accession,
-                type__cv__name="sequence",
-                type__name=soterm,
-            ).feature_id
-        except (MultipleObjectsReturned, ObjectDoesNotExist):
-            pass
-
-        # soterm-feature.uniquename
-        try:
-            return Feature.objects.get(
-                uniquename="{}-{}".format(soterm, accession),
-                type__cv__name="sequence",
-                type__name=soterm,
-            ).feature_id
-        except (MultipleObjectsReturned, ObjectDoesNotExist):
-            pass
-
-        # feature.name
-        try:
-            return Feature.objects.get(
-                name__iexact=accession,
-                type__cv__name="sequence",
-                type__name=soterm,
-            ).feature_id
-        except (MultipleObjectsReturned, ObjectDoesNotExist):
-            pass
-
-        # feature.dbxref.accession
-        try:
-            return Feature.objects.get(
-                dbxref__accession__iexact=accession,
-                type__cv__name="sequence",
-                type__name=soterm,
-            ).feature_id
-        except (MultipleObjectsReturned, ObjectDoesNotExist):
-            pass
-
-        # featuredbxref.dbxref.accession
-        try:
-            return FeatureDbxref.objects.get(
-                dbxref__accession__iexact=accession,
-                feature__type__cv__name="sequence",
-                feature__type__name=soterm,
-            ).feature_id
-        except ObjectDoesNotExist:
-            raise ObjectDoesNotExist(
-                "Feature {} '{}' does not exist.".format(soterm, accession)
-            )
-        except MultipleObjectsReturned:
-            raise MultipleObjectsReturned(
-                "Multiple features match {} '{}'".format(soterm, accession)
-            )
-
-    def store_bio_searchio_hit(self, searchio_hit: Hit, target: str) -> None:
-        """Store bio searchio hit."""
-        organism_obj, created = Organism.objects.get_or_create(
-            abbreviation="multispecies",
-            genus="multispecies",
-            species="multispecies",
-            common_name="multispecies",
+        return self.resolver.resolve(accession, soterm)
+
+    def retrieve_multispecies_organism(self) -> Organism:
+        """Retrieve or create the multispecies organism."""
+        return self.refcache.memoize(
+            ("organism", "multispecies"),
+            lambda: Organism.objects.get_or_create(
+                abbreviation="multispecies",
+                genus="multispecies",
+                species="multispecies",
+                common_name="multispecies",
+            )[0],
         )
 
-        if not hasattr(searchio_hit, "accession"):
-            searchio_hit.accession = None
-
+    def retrieve_hit_db(self, searchio_hit: Hit, target: str) -> Db:
+        """Retrieve the db of a hit."""
         # if interproscan-xml parsing, get db name from Hit.attributes.
         if target == "InterPro":
             db_name = searchio_hit.attributes["Target"].upper()
             # prevents the creation of multiple databases for SIGNALP
             if db_name.startswith("SIGNALP"):
                 db_name = "SIGNALP"
-            db, created = Db.objects.get_or_create(name=db_name)
+            return self.refcache.db(db_name)
         # if blast-xml parsing, db name is self.db ("BLAST_source")
-        else:
-            db = self.db
+        return self.db
+
+    def store_bio_searchio_hit(self, searchio_hit: Hit, target: str) -> None:
+        """Store bio searchio hit."""
+        organism_obj = self.retrieve_multispecies_organism()
+
+        if not hasattr(searchio_hit, "accession"):
+            searchio_hit.accession = None
+
+        db = self.retrieve_hit_db(searchio_hit, target)
 
         dbxref, created = Dbxref.objects.get_or_create(db=db, accession=searchio_hit.id)
         feature, created = Feature.objects.get_or_create(
@@ -674,23 +861,20 @@ class MultispeciesFeatureLoader(FeatureLoaderBase):
         for aux_dbxref in searchio_hit.dbxrefs:
             aux_db, aux_term = aux_dbxref.split(":", 1)
             if aux_db == "GO":
-                try:
-                    term_db = Db.objects.get(name=aux_db.upper())
-                    dbxref = Dbxref.objects.get(db=term_db, accession=aux_term)
-                    cvterm = Cvterm.objects.get(dbxref=dbxref)
-                    FeatureCvterm.objects.get_or_create(
-                        feature=feature,
-                        cvterm=cvterm,
-                        pub=self.pub,
-                        is_not=False,
-                        rank=0,
-                    )
-                except ObjectDoesNotExist:
+                cvterm = self.refcache.ontology_term(aux_db.upper(), aux_term)
+                if cvterm is None:
                     self.ignored_goterms.add(aux_dbxref)
+                    continue
+                FeatureCvterm.objects.get_or_create(
+                    feature=feature,
+                    cvterm=cvterm,
+                    pub=self.pub,
+                    is_not=False,
+                    rank=0,
+                )
             else:
-                term_db, created = Db.objects.get_or_create(name=aux_db.upper())
                 dbxref, created = Dbxref.objects.get_or_create(
-                    db=term_db, accession=aux_term
+                    db=self.refcache.db(aux_db.upper()), accession=aux_term
                 )
                 FeatureDbxref.objects.get_or_create(
                     feature=feature, dbxref=dbxref, is_current=1
@@ -698,6 +882,135 @@ class MultispeciesFeatureLoader(FeatureLoaderBase):
 
         return None
 
+    def store_bio_searchio_hits(self, hits: List[Tuple[Hit, str]]) -> None:
+        """Store the hits of a batch with a few upserts.
+
+        The batch writes the rows store_bio_searchio_hit writes for each hit,
+        once per distinct protein_match, dbxref and annotation. Rows already
+        registered, by this batch or an earlier one, are kept.
+        """
+        organism_id = self.retrieve_multispecies_organism().organism_id
+        features: Dict[str, Tuple[Optional[str], int]] = dict()
+        cvterm_set: Set[Tuple[str, int]] = set()
+        dbxref_set: Set[Tuple[str, int, str]] = set()
+        for searchio_hit, target in hits:
+            db = self.retrieve_hit_db(searchio_hit, target)
+            features.setdefault(
+                searchio_hit.id,
+                (getattr(searchio_hit, "accession", None), db.db_id),
+            )
+            for aux_dbxref in searchio_hit.dbxrefs:
+                aux_db, aux_term = aux_dbxref.split(":", 1)
+                if aux_db == "GO":
+                    cvterm = self.refcache.ontology_term(aux_db.upper(), aux_term)
+                    if cvterm is None:
+                        self.ignored_goterms.add(aux_dbxref)
+                        continue
+                    cvterm_set.add((searchio_hit.id, cvterm.cvterm_id))
+                else:
+                    dbxref_set.add(
+                        (
+                            searchio_hit.id,
+                            self.refcache.db(aux_db.upper()).db_id,
+                            aux_term,
+                        )
+                    )
+        if not features:
+            return None
+
+        # sorted, so concurrent batches lock the same rows in the same order
+        cvterms = sorted(cvterm_set)
+        dbxrefs = sorted(dbxref_set)
+        try:
+            with transaction.atomic():
+                feature_ids = self.upsert_protein_matches(organism_id, features)
+                with connection.cursor() as cursor:
+                    if cvterms:
+                        cursor.execute(
+                            "INSERT INTO feature_cvterm "
+                            "(feature_id, cvterm_id, pub_id, is_not, rank) "
+                            "SELECT feature_id, cvterm_id, %s, false, 0 "
+                            "FROM unnest(%s::bigint[], %s::bigint[]) "
+                            "AS t(feature_id, cvterm_id) "
+                            "ON CONFLICT DO NOTHING",
+                            [
+                                self.pub.pub_id,
+                                [feature_ids[uniquename] for uniquename, _ in cvterms],
+                                [cvterm_id for _, cvterm_id in cvterms],
+                            ],
+                        )
+                    dbxref_ids = dict()
+                    for db_id in {item[1] for item in dbxrefs}:
+                        accessions = upsert_dbxrefs(
+                            db_id, [item[2] for item in dbxrefs if item[1] == db_id]
+                        )
+                        for accession, dbxref_id in accessions.items():
+                            dbxref_ids[db_id, accession] = dbxref_id
+                    if dbxrefs:
+                        cursor.execute(
+                            "INSERT INTO feature_dbxref "
+                            "(feature_id, dbxref_id, is_current) "
+                            "SELECT feature_id, dbxref_id, true "
+                            "FROM unnest(%s::bigint[], %s::bigint[]) "
+                            "AS t(feature_id, dbxref_id) "
+                            "ON CONFLICT DO NOTHING",
+                            [
+                                [feature_ids[item[0]] for item in dbxrefs],
+                                [dbxref_ids[item[1:]] for item in dbxrefs],
+                            ],
+                        )
+        except (IntegrityError, DataError) as e:
+            raise ImportingError(str(e), file=self.filename)
+
+    def upsert_protein_matches(
+        self, organism_id: int, features: Dict[str, Tuple[Optional[str], int]]
+    ) -> Dict[str, int]:
+        """Get or create protein_match features and return them by uniquename.
+
+        features maps each uniquename to its name and the db of its dbxref.
+        """
+        dbxref_ids = dict()
+        for db_id in {db_id for name, db_id in features.values()}:
+            dbxref_ids[db_id] = upsert_dbxrefs(
+                db_id,
+                [
+                    uniquename
+                    for uniquename, item in features.items()
+                    if item[1] == db_id
+                ],
+            )
+        uniquenames = sorted(features)
+        now = datetime.now(timezone.utc)
+        type_id = self.so_term_protein_match.cvterm_id
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO feature (organism_id, uniquename, type_id, name, "
+                "dbxref_id, is_analysis, is_obsolete, timeaccessioned, "
+                "timelastmodified) "
+                "SELECT %s, uniquename, %s, name, dbxref_id, false, false, %s, %s "
+                "FROM unnest(%s::text[], %s::text[], %s::bigint[]) "
+                "AS t(uniquename, name, dbxref_id) "
+                "ON CONFLICT (organism_id, uniquename, type_id) DO NOTHING",
+                [
+                    organism_id,
+                    type_id,
+                    now,
+                    now,
+                    uniquenames,
+                    [features[uniquename][0] for uniquename in uniquenames],
+                    [
+                        dbxref_ids[features[uniquename][1]][uniquename]
+                        for uniquename in uniquenames
+                    ],
+                ],
+            )
+            cursor.execute(
+                "SELECT uniquename, feature_id FROM feature "
+                "WHERE organism_id = %s AND type_id = %s AND uniquename = ANY(%s)",
+                [organism_id, type_id, uniquenames],
+            )
+            return dict(cursor.fetchall())
+
     def store_feature_groups(
         self,
         group: list,
@@ -12,8 +12,9 @@ from urllib.parse import unquote
 from django.core.exceptions import ObjectDoesNotExist
 from django.db.models import Max
 
+from machado.loaders.common import ReferenceCache
 from machado.loaders.exceptions import ImportingError
-from machado.models import Cv, Db, Cvterm, Dbxref
+from machado.models import Dbxref
 from machado.models import FeatureCvterm, FeatureDbxref, FeaturePub
 from machado.models import Featureprop, FeaturepropPub, FeatureSynonym
 from machado.models import Pub, PubDbxref, Synonym
@@ -65,23 +66,13 @@ class FeatureAttributesLoader(object):
 
     help = "Load feature attributes."
 
-    def __init__(self, filecontent: str, doi: str = None) -> None:
+    def __init__(
+        self, filecontent: str, doi: str = None, refcache: ReferenceCache = None
+    ) -> None:
         """Execute the init function."""
-        # initialization of lists/sets to store ignored attributes, and
-        # ignored goterms
-        self.db_null, created = Db.objects.get_or_create(name="null")
-        null_dbxref, created = Dbxref.objects.get_or_create(
-            db=self.db_null, accession="null"
-        )
-        null_cv, created = Cv.objects.get_or_create(name="null")
-        null_cvterm, created = Cvterm.objects.get_or_create(
-            cv=null_cv,
-            name="null",
-            definition="",
-            dbxref=null_dbxref,
-            is_obsolete=0,
-            is_relationshiptype=0,
-        )
+        # reference data is shared with the calling loader when given
+        self.refcache = ReferenceCache() if refcache is None else refcache
+        self.db_null = self.refcache.db("null")
 
         if filecontent == "genome":
             self.filter = VALID_GENOME_ATTRS
@@ -95,32 +86,31 @@ class FeatureAttributesLoader(object):
             )
 
         # Retrieve DOI's Dbxref
-        dbxref_doi = None
-        pub_dbxref_doi = None
         if doi:
-            try:
-                dbxref_doi = Dbxref.objects.get(accession=doi)
-            except ObjectDoesNotExist:
-                raise ImportingError("DOI '{}' is not registered.".format(doi))
-            try:
-                pub_dbxref_doi = PubDbxref.objects.get(dbxref=dbxref_doi)
-            except ObjectDoesNotExist:
-                raise ImportingError("DOI '{}' is not registered.".format(doi))
-            try:
-                self.pub = Pub.objects.get(pub_id=pub_dbxref_doi.pub_id)
-            except ObjectDoesNotExist:
-                raise ImportingError("DOI '{}' is not registered.".format(doi))
-        else:
-            self.pub, created = Pub.objects.get_or_create(
-                miniref="null",
-                uniquename="null",
-                type_id=null_cvterm.cvterm_id,
-                is_obsolete=False,
+            self.pub = self.refcache.memoize(
+                ("pub", doi), lambda: self.retrieve_doi_pub(doi)
             )
+        else:
+            self.pub = self.refcache.null_pub()
 
         self.ignored_attrs: Set[str] = set()
         self.ignored_goterms: Set[str] = set()
 
+    def retrieve_doi_pub(self, doi: str) -> Pub:
+        """Retrieve the pub of a registered DOI."""
+        try:
+            dbxref_doi = Dbxref.objects.get(accession=doi)
+        except ObjectDoesNotExist:
+            raise ImportingError("DOI '{}' is not registered.".format(doi))
+        try:
+            pub_dbxref_doi = PubDbxref.objects.get(dbxref=dbxref_doi)
+        except ObjectDoesNotExist:
+            raise ImportingError("DOI '{}' is not registered.".format(doi))
+        try:
+            return Pub.objects.get(pub_id=pub_dbxref_doi.pub_id)
+        except ObjectDoesNotExist:
+            raise ImportingError("DOI '{}' is not registered.".format(doi))
+
     def get_attributes(self, attributes: str) -> Dict[str, str]:
         """Get attributes."""
         result = dict()
@@ -146,7 +136,7 @@ class FeatureAttributesLoader(object):
     def process_attributes(self, feature_id: int, attrs: Dict[str, str]) -> None:
         """Process the valid attributes."""
         try:
-            cvterm_exact = Cvterm.objects.get(name="exact", cv__name="synonym_type")
+            cvterm_exact = self.refcache.cvterm("exact", "synonym_type")
         except ObjectDoesNotExist as e:
             raise ImportingError(str(e))
 
@@ -158,20 +148,18 @@ class FeatureAttributesLoader(object):
                 # store in featurecvterm
                 terms = attrs[key].split(",")
                 for term in terms:
-                    try:
-                        aux_db, aux_term = term.split(":", 1)
-                        term_db = Db.objects.get(name=aux_db.upper())
-                        dbxref = Dbxref.objects.get(db=term_db, accession=aux_term)
-                        cvterm = Cvterm.objects.get(dbxref=dbxref)
-                        FeatureCvterm.objects.create(
-                            feature_id=feature_id,
-                            cvterm=cvterm,
-                            pub=self.pub,
-                            is_not=False,
-                            rank=0,
-                        )
-                    except ObjectDoesNotExist:
+                    aux_db, aux_term = term.split(":", 1)
+                    cvterm = self.refcache.ontology_term(aux_db.upper(), aux_term)
+                    if cvterm is None:
                         self.ignored_goterms.add(term)
+                        continue
+                    FeatureCvterm.objects.create(
+                        feature_id=feature_id,
+                        cvterm=cvterm,
+                        pub=self.pub,
+                        is_not=False,
+                        rank=0,
+                    )
             elif key in ["dbxref"]:
                 try:
                     dbxrefs = attrs[key].split(",")
@@ -183,27 +171,22 @@ class FeatureAttributesLoader(object):
                         aux_db, aux_dbxref = dbxref.split(":", 1)
                     except ValueError as e:
                         raise ImportingError("{}: {}".format(dbxref, e))
-                    db, created = Db.objects.get_or_create(name=aux_db.upper())
                     dbxref, created = Dbxref.objects.get_or_create(
-                        db=db, accession=aux_dbxref
+                        db=self.refcache.db(aux_db.upper()), accession=aux_dbxref
                     )
                     FeatureDbxref.objects.create(
                         feature_id=feature_id, dbxref=dbxref, is_current=1
                     )
             elif key in ["pacid"]:
-                db, created = Db.objects.get_or_create(name="PACID")
                 dbxref, created = Dbxref.objects.get_or_create(
-                    db=db, accession=attrs[key]
+                    db=self.refcache.db("PACID"), accession=attrs[key]
                 )
                 FeatureDbxref.objects.create(
                     feature_id=feature_id, dbxref=dbxref, is_current=1
                 )
             elif key in ["doi"]:
                 try:
-                    doi_obj = Dbxref.objects.get(
-                        accession=attrs[key].lower(), db__name="DOI"
-                    )
-                    pub_obj = Pub.objects.get(PubDbxref_pub_Pub__dbxref=doi_obj)
+                    pub_obj = self.refcache.doi_pub(attrs[key])
                 except ObjectDoesNotExist:
                     raise ImportingError(
                         "DOI '{}' is not registered.".format(attrs[key])
@@ -227,22 +210,7 @@ class FeatureAttributesLoader(object):
                     is_internal=False,
                 )
             elif key in ["annotation"]:
-                annotation_dbxref, created = Dbxref.objects.get_or_create(
-                    db=self.db_null, accession=key
-                )
-                cv_feature_property, created = Cv.objects.get_or_create(
-                    name="feature_property"
-                )
-                annotation_cvterm, created = Cvterm.objects.get_or_create(
-                    cv=cv_feature_property,
-                    name=key,
-                    dbxref=annotation_dbxref,
-                    defaults={
-                        "definition": "",
-                        "is_relationshiptype": 0,
-                        "is_obsolete": 0,
-                    },
-                )
+                annotation_cvterm = self.refcache.property_cvterm(key)
                 try:
                     featureprop_obj = Featureprop.objects.get(
                         feature_id=feature_id,
@@ -275,22 +243,7 @@ class FeatureAttributesLoader(object):
                         feature_id=feature_id, pub=self.pub
                     )
             else:
-                note_dbxref, created = Dbxref.objects.get_or_create(
-                    db=self.db_null, accession=key
-                )
-                cv_feature_property, created = Cv.objects.get_or_create(
-                    name="feature_property"
-                )
-                note_cvterm, created = Cvterm.objects.get_or_create(
-                    cv=cv_feature_property,
-                    name=key,
-                    dbxref=note_dbxref,
-                    defaults={
-                        "definition": "",
-                        "is_relationshiptype": 0,
-                        "is_obsolete": 0,
-                    },
-                )
+                note_cvterm = self.refcache.property_cvterm(key)
                 featureprop_obj, created = Featureprop.objects.get_or_create(
                     feature_id=feature_id,
                     type_id=note_cvterm.cvterm_id,
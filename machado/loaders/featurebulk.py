@@ -0,0 +1,571 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Load feature file in bulk."""
+
+import sys
+from datetime import datetime, timezone
+from time import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection, transaction
+from django.db.utils import DataError, IntegrityError
+from pysam.libctabixproxies import GTFProxy, VCFProxy
+
+from machado.loaders.bulk import copy_rows, reserve_ids, upsert_dbxrefs
+from machado.loaders.common import ReferenceCache
+from machado.loaders.exceptions import ImportingError
+from machado.loaders.feature import FeatureLoader
+from machado.loaders.featureattributes import FeatureAttributesLoader
+
+TRANSCRIPT_TYPES = ["mRNA", "C_gene_segment", "V_gene_segment"]
+
+FEATURE_COLUMNS = (
+    "feature_id",
+    "dbxref_id",
+    "organism_id",
+    "name",
+    "uniquename",
+    "type_id",
+    "is_analysis",
+    "is_obsolete",
+    "timeaccessioned",
+    "timelastmodified",
+)
+
+FEATURELOC_COLUMNS = (
+    "feature_id",
+    "srcfeature_id",
+    "fmin",
+    "is_fmin_partial",
+    "fmax",
+    "is_fmax_partial",
+    "strand",
+    "phase",
+    "locgroup",
+    "rank",
+)
+
+VARIANT_FEATURELOC_COLUMNS = (
+    "feature_id",
+    "srcfeature_id",
+    "fmin",
+    "is_fmin_partial",
+    "fmax",
+    "is_fmax_partial",
+    "residue_info",
+    "locgroup",
+    "rank",
+)
+
+
+class FeatureBulkLoader(FeatureLoader):
+    """Load single-organism feature records in batches.
+
+    The rows written are the same ones FeatureLoader writes one feature at a
+    time, but the keys they depend on (sequence ontology terms, reference
+    features, property types, dbs...) are resolved once by the reference cache,
+    and every table of a batch is written with a single COPY or multi-row
+    statement.
+    """
+
+    help = "Load single-organism feature records in batches."
+
+    def __init__(
+        self,
+        source: str,
+        filename: str,
+        organism,
+        doi: str = None,
+        refcache: ReferenceCache = None,
+    ) -> None:
+        """Execute the init function."""
+        super(FeatureBulkLoader, self).__init__(
+            source, filename, organism, doi, refcache
+        )
+        self.auto_stamp = 0.0
+
+    def get_soterm_id(self, name: str) -> int:
+        """Retrieve the cvterm_id of a sequence ontology term."""
+        try:
+            return self.refcache.cvterm(name, "sequence").cvterm_id
+        except ObjectDoesNotExist:
+            raise ImportingError(
+                "'{}' is not a valid Sequence Ontology term.".format(name),
+                file=self.filename,
+            )
+
+    def get_ontology_term_id(self, term: str) -> Optional[int]:
+        """Retrieve the cvterm_id of a DB:ACCESSION ontology term."""
+        try:
+            aux_db, aux_term = term.split(":", 1)
+        except ValueError as e:
+            raise ImportingError("{}: {}".format(term, e), file=self.filename)
+        cvterm = self.refcache.ontology_term(aux_db.upper(), aux_term)
+        return None if cvterm is None else cvterm.cvterm_id
+
+    def get_synonym_exact_id(self) -> int:
+        """Retrieve the cvterm_id of the exact synonym type."""
+        try:
+            return self.refcache.cvterm("exact", "synonym_type").cvterm_id
+        except ObjectDoesNotExist as e:
+            raise ImportingError(str(e))
+
+    def get_auto_id(self) -> str:
+        """Return an auto# uniquename for features that lack an ID."""
+        # consecutive rows may be parsed within the clock resolution
+        stamp = max(time(), self.auto_stamp + 1e-6)
+        self.auto_stamp = stamp
+        return "auto{}".format(str(stamp))
+
+    def store_tabix_GFF_features(
+        self, tabix_features: List[Tuple[int, GTFProxy]], qtl: bool
+    ) -> None:
+        """Store a batch of (line, tabix feature) GFF records."""
+        attrs_loader = self.get_attrs_loader("qtl" if qtl else "genome")
+
+        records = list()
+        for line, tabix_feature in tabix_features:
+            attrs_dict = attrs_loader.get_attributes(tabix_feature.attributes)
+            if qtl:
+                type_id = self.get_soterm_id("QTL")
+                attrs_dict["qtl_type"] = tabix_feature.feature
+            else:
+                type_id = self.get_soterm_id(tabix_feature.feature)
+
+            attrs_id = attrs_dict.get("id")
+            try:
+                attrs_parent = attrs_dict.get("parent").split(",")
+            except AttributeError:
+                attrs_parent = list()
+            # set id = auto# for features that lack it
+            if attrs_id is None:
+                attrs_id = self.get_auto_id()
+
+            # the database requires -1, 0, and +1 for strand
+            if tabix_feature.strand == "+":
+                strand = +1
+            elif tabix_feature.strand == "-":
+                strand = -1
+            else:
+                strand = 0
+
+            # if row.frame is . phase = None
+            # some versions of pysam throws ValueError
+            try:
+                phase = tabix_feature.frame
+                if tabix_feature.frame == ".":
+                    phase = None
+            except ValueError:
+                phase = None
+
+            records.append(
+                {
+                    "line": line,
+                    "uniquename": attrs_id,
+                    "name": attrs_dict.get("name"),
+                    "type_id": type_id,
+                    "attrs": attrs_dict,
+                    "parents": attrs_parent,
+                    "srcfeature_id": self.retrieve_srcfeature_id(
+                        tabix_feature.contig, line=line
+                    ),
+                    "fmin": tabix_feature.start,
+                    "fmax": tabix_feature.end,
+                    "strand": strand,
+                    "phase": phase,
+                    "translated": tabix_feature.feature in TRANSCRIPT_TYPES,
+                }
+            )
+
+        try:
+            with transaction.atomic():
+                self.write_GFF_records(records, attrs_loader)
+        except (IntegrityError, DataError) as e:
+            raise ImportingError(str(e), file=self.filename)
+
+        for record in records:
+            self.feature_ids.add(record["uniquename"], record["feature_id"])
+            for parent in record["parents"]:
+                self.relationships.append(
+                    {
+                        "object_id": sys.intern(record["uniquename"]),
+                        "subject_id": sys.intern(parent),
+                    }
+                )
+
+    def check_registered(self, keys: List[Tuple[str, int]]) -> None:
+        """Raise if a (uniquename, type_id) is repeated or already stored."""
+        seen: Set[Tuple[str, int]] = set()
+        for key in keys:
+            if key in seen:
+                raise ImportingError(
+                    "Feature ID '{}' is already registered.".format(key[0]),
+                    file=self.filename,
+                )
+            seen.add(key)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT f.uniquename FROM feature f "
+                "JOIN unnest(%s::text[], %s::bigint[]) AS k(uniquename, type_id) "
+                "ON f.uniquename = k.uniquename AND f.type_id = k.type_id "
+                "WHERE f.organism_id = %s LIMIT 1",
+                [
+                    [key[0] for key in keys],
+                    [key[1] for key in keys],
+                    self.organism.organism_id,
+                ],
+            )
+            row = cursor.fetchone()
+        if row is not None:
+            raise ImportingError(
+                "Feature ID '{}' is already registered.".format(row[0]),
+                file=self.filename,
+            )
+
+    def write_GFF_records(
+        self, records: List[Dict[str, Any]], attrs_loader: FeatureAttributesLoader
+    ) -> None:
+        """Write the features of a batch and their dependent rows."""
+        if not records:
+            return None
+        keys = [(record["uniquename"], record["type_id"]) for record in records]
+        keys.extend(
+            (record["uniquename"], self.aa_cvterm.cvterm_id)
+            for record in records
+            if record["translated"]
+        )
+        self.check_registered(keys)
+
+        dbxref_ids = upsert_dbxrefs(
+            self.db.db_id,
+            [record["uniquename"] for record in records],
+            version=self.filename,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO dbxrefprop (dbxref_id, type_id, value, rank) "
+                "SELECT dbxref_id, %s, %s, 0 FROM unnest(%s::bigint[]) AS dbxref_id "
+                "ON CONFLICT (dbxref_id, type_id, rank) DO NOTHING",
+                [
+                    self.cvterm_contained_in.cvterm_id,
+                    self.filename,
+                    sorted(set(dbxref_ids.values())),
+                ],
+            )
+
+        feature_ids = iter(reserve_ids("feature", "feature_id", len(keys)))
+        now = datetime.now(timezone.utc)
+        if any(record["translated"] for record in records):
+            translation_of_id = self.get_soterm_id("translation_of")
+        features = list()
+        featurelocs = list()
+        translations = list()
+        rows: Dict[str, list] = {
+            "featureprop": list(),
+            "feature_cvterm": list(),
+            "feature_dbxref": list(),
+            "feature_synonym": list(),
+        }
+        feature_pubs: Set[Tuple[int, int]] = set()
+        for record in records:
+            record["feature_id"] = next(feature_ids)
+            dbxref_id = dbxref_ids[record["uniquename"]]
+            features.append(
+                (
+                    record["feature_id"],
+                    dbxref_id,
+                    self.organism.organism_id,
+                    record["name"],
+                    record["uniquename"],
+                    record["type_id"],
+                    False,
+                    False,
+                    now,
+                    now,
+                )
+            )
+            featurelocs.append(
+                (
+                    record["feature_id"],
+                    record["srcfeature_id"],
+                    record["fmin"],
+                    False,
+                    record["fmax"],
+                    False,
+                    record["strand"],
+                    record["phase"],
+                    0,
+                    0,
+                )
+            )
+            # DOI: try to link feature to publication's DOI
+            if self.pub_dbxref_doi:
+                feature_pubs.add((record["feature_id"], self.pub_dbxref_doi.pub_id))
+            self.collect_attributes(
+                record["feature_id"], record["attrs"], attrs_loader, rows, feature_pubs
+            )
+        # Additional protein record for each transcript with the exact same ID
+        for record in records:
+            if not record["translated"]:
+                continue
+            polypeptide_id = next(feature_ids)
+            features.append(
+                (
+                    polypeptide_id,
+                    dbxref_ids[record["uniquename"]],
+                    self.organism.organism_id,
+                    record["name"],
+                    record["uniquename"],
+                    self.aa_cvterm.cvterm_id,
+                    False,
+                    False,
+                    now,
+                    now,
+                )
+            )
+            translations.append(
+                (record["feature_id"], polypeptide_id, translation_of_id, 0)
+            )
+
+        copy_rows("feature", FEATURE_COLUMNS, features)
+        copy_rows("featureloc", FEATURELOC_COLUMNS, featurelocs)
+        copy_rows(
+            "feature_relationship",
+            ("subject_id", "object_id", "type_id", "rank"),
+            translations,
+        )
+        copy_rows("feature_pub", ("feature_id", "pub_id"), sorted(feature_pubs))
+        copy_rows(
+            "featureprop",
+            ("feature_id", "type_id", "value", "rank"),
+            rows["featureprop"],
+        )
+        copy_rows(
+            "feature_cvterm",
+            ("feature_id", "cvterm_id", "pub_id", "is_not", "rank"),
+            rows["feature_cvterm"],
+        )
+        self.write_feature_dbxrefs(rows["feature_dbxref"])
+        self.write_feature_synonyms(rows["feature_synonym"], attrs_loader)
+
+    def collect_attributes(
+        self,
+        feature_id: int,
+        attrs: Dict[str, str],
+        attrs_loader: FeatureAttributesLoader,
+        rows: Dict[str, list],
+        feature_pubs: Set[Tuple[int, int]],
+    ) -> None:
+        """Collect the rows FeatureAttributesLoader.process_attributes writes."""
+        self.get_synonym_exact_id()
+        pub_id = attrs_loader.pub.pub_id
+        for key in attrs:
+            if key not in attrs_loader.filter:
+                continue
+            elif key in ["ontology_term"]:
+                for term in attrs[key].split(","):
+                    cvterm_id = self.get_ontology_term_id(term)
+                    if cvterm_id is None:
+                        self.ignored_goterms.add(term)
+                        continue
+                    rows["feature_cvterm"].append(
+                        (feature_id, cvterm_id, pub_id, False, 0)
+                    )
+            elif key in ["dbxref"]:
+                for dbxref in attrs[key].split(","):
+                    # It expects just one dbxref formated as XX:012345
+                    try:
+                        aux_db, aux_dbxref = dbxref.split(":", 1)
+                    except ValueError as e:
+                        raise ImportingError("{}: {}".format(dbxref, e))
+                    rows["feature_dbxref"].append(
+                        (feature_id, aux_db.upper(), aux_dbxref)
+                    )
+            elif key in ["pacid"]:
+                rows["feature_dbxref"].append((feature_id, "PACID", attrs[key]))
+            elif key in ["doi"]:
+                try:
+                    doi_pub_id = self.refcache.doi_pub(attrs[key]).pub_id
+                except ObjectDoesNotExist:
+                    raise ImportingError(
+                        "DOI '{}' is not registered.".format(attrs[key])
+                    )
+                feature_pubs.add((feature_id, doi_pub_id))
+            elif key in ["alias", "gene_synonym", "synonym", "abbrev"]:
+                rows["feature_synonym"].append((feature_id, attrs[key]))
+            else:
+                # the feature is new, so the annotation gets rank 0 as well
+                rows["featureprop"].append(
+                    (
+                        feature_id,
+                        self.refcache.property_cvterm(key).cvterm_id,
+                        attrs[key],
+                        0,
+                    )
+                )
+
+    def write_feature_dbxrefs(
+        self, feature_dbxrefs: List[Tuple[int, str, str]]
+    ) -> None:
+        """Write (feature_id, db name, accession) rows to feature_dbxref."""
+        accessions: Dict[str, Set[str]] = dict()
+        for feature_id, db_name, accession in feature_dbxrefs:
+            accessions.setdefault(db_name, set()).add(accession)
+        dbxref_ids = dict()
+        for db_name, db_accessions in accessions.items():
+            db_dbxref_ids = upsert_dbxrefs(
+                self.refcache.db(db_name).db_id, db_accessions
+            )
+            for accession, dbxref_id in db_dbxref_ids.items():
+                dbxref_ids[(db_name, accession)] = dbxref_id
+        copy_rows(
+            "feature_dbxref",
+            ("feature_id", "dbxref_id", "is_current"),
+            (
+                (feature_id, dbxref_ids[(db_name, accession)], True)
+                for feature_id, db_name, accession in feature_dbxrefs
+            ),
+        )
+
+    def write_feature_synonyms(
+        self,
+        feature_synonyms: List[Tuple[int, str]],
+        attrs_loader: FeatureAttributesLoader,
+    ) -> None:
+        """Write (feature_id, synonym) rows to feature_synonym."""
+        if not feature_synonyms:
+            return None
+        names = sorted(set(name for feature_id, name in feature_synonyms))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO synonym (name, type_id, synonym_sgml) "
+                "SELECT u.name, %s, u.name FROM unnest(%s::text[]) AS u(name) "
+                "WHERE NOT EXISTS (SELECT 1 FROM synonym s WHERE s.name = u.name) "
+                "ON CONFLICT (name, type_id) DO NOTHING",
+                [self.get_synonym_exact_id(), names],
+            )
+            # an existing synonym is reused regardless of its type
+            cursor.execute(
+                "SELECT name, synonym_id FROM synonym WHERE name = ANY(%s) "
+                "ORDER BY synonym_id DESC",
+                [names],
+            )
+            synonym_ids = dict(cursor.fetchall())
+        copy_rows(
+            "feature_synonym",
+            ("synonym_id", "feature_id", "pub_id", "is_current", "is_internal"),
+            (
+                (synonym_ids[name], feature_id, attrs_loader.pub.pub_id, True, False)
+                for feature_id, name in feature_synonyms
+            ),
+        )
+
+    def store_tabix_VCF_features(
+        self, tabix_features: List[Tuple[int, VCFProxy]]
+    ) -> None:
+        """Store a batch of (line, tabix feature) VCF records."""
+        attrs_loader = self.get_attrs_loader("polymorphism")
+
+        records = list()
+        for line, tabix_feature in tabix_features:
+            type_id = self.retrieve_variant_cvterm(
+                tabix_feature.id,
+                attrs_loader.get_attributes(tabix_feature.info),
+                line=line,
+            ).cvterm_id
+            records.append(
+                (
+                    tabix_feature.id,
+                    type_id,
+                    self.retrieve_srcfeature_id(tabix_feature.contig, line=line),
+                    tabix_feature.pos,
+                    tabix_feature.ref,
+                    tabix_feature.alt,
+                    tabix_feature.qual,
+                )
+            )
+
+        try:
+            with transaction.atomic():
+                self.write_VCF_records(records)
+        except (IntegrityError, DataError) as e:
+            raise ImportingError(str(e), file=self.filename)
+
+    def write_VCF_records(
+        self, records: List[Tuple[str, int, int, int, str, str, str]]
+    ) -> None:
+        """Write the variants of a batch and their dependent rows."""
+        if not records:
+            return None
+        self.check_registered([(record[0], record[1]) for record in records])
+
+        dbxref_ids = upsert_dbxrefs(self.db.db_id, [record[0] for record in records])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO dbxrefprop (dbxref_id, type_id, value, rank) "
+                "SELECT dbxref_id, %s, '', 0 FROM unnest(%s::bigint[]) AS dbxref_id "
+                "ON CONFLICT (dbxref_id, type_id, rank) DO NOTHING",
+                [self.cvterm_contained_in.cvterm_id, sorted(dbxref_ids.values())],
+            )
+
+        feature_ids = reserve_ids("feature", "feature_id", len(records))
+        now = datetime.now(timezone.utc)
+        organism_id = self.organism.organism_id
+        features = list()
+        featurelocs = list()
+        featureprops = list()
+        for feature_id, record in zip(feature_ids, records):
+            uniquename, type_id, srcfeature_id, pos, ref, alt, qual = record
+            features.append(
+                (
+                    feature_id,
+                    dbxref_ids[uniquename],
+                    organism_id,
+                    "{}->{}".format(ref, alt),
+                    uniquename,
+                    type_id,
+                    False,
+                    False,
+                    now,
+                    now,
+                )
+            )
+            # the reference allele is located on the contig, the alternative
+            # ones have no srcfeature
+            featurelocs.append(
+                (feature_id, srcfeature_id, pos, False, pos + 1, False, ref, 0, 0)
+            )
+            for rank, allele in enumerate(alt.split(","), start=1):
+                featurelocs.append(
+                    (feature_id, None, pos, False, pos + 1, False, allele, 0, rank)
+                )
+            if qual != ".":
+                featureprops.append((feature_id, qual))
+
+        copy_rows("feature", FEATURE_COLUMNS, features)
+        copy_rows("featureloc", VARIANT_FEATURELOC_COLUMNS, featurelocs)
+        if featureprops:
+            quality_value_id = self.get_soterm_id("quality_value")
+            copy_rows(
+                "featureprop",
+                ("feature_id", "type_id", "value", "rank"),
+                (
+                    (feature_id, quality_value_id, qual, 0)
+                    for feature_id, qual in featureprops
+                ),
+            )
+        # DOI: try to link feature to publication's DOI
+        if self.pub_dbxref_doi:
+            copy_rows(
+                "feature_pub",
+                ("feature_id", "pub_id"),
+                (
+                    (feature_id, self.pub_dbxref_doi.pub_id)
+                    for feature_id in feature_ids
+                ),
+            )
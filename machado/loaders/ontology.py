@@ -7,17 +7,121 @@
 """Ontology."""
 
 import re
+from collections import defaultdict
 from multiprocessing.synchronize import Lock
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.utils import IntegrityError
+from django.db import connection, transaction
+from django.db.utils import DataError, IntegrityError
 
+from machado.loaders.bulk import copy_rows, upsert_named_dbxrefs
 from machado.loaders.exceptions import ImportingError
 from machado.models import Cv, Cvterm, Cvtermprop, CvtermDbxref, Cvtermsynonym
-from machado.models import CvtermRelationship
+from machado.models import Cvtermpath, CvtermRelationship
 from machado.models import Db, Dbxref
 
+SO_SYNONYM_PATTERN = re.compile(r'^"(.+)" (\w+) \[\]$')
+
+
+def split_xref(xref: str) -> Tuple[str, str]:
+    """Split a xref into its db name and accession."""
+    ref_db, ref_content = xref.split(":", 1)
+    if ref_db == "http":
+        ref_db = "URL"
+        ref_content = "http:" + ref_content
+    return ref_db.upper(), ref_content
+
+
+def split_cvterm_def(definition: str) -> Tuple[str, List[Tuple[str, str]]]:
+    """Split a definition into its text and its xrefs.
+
+    Definition format:
+    "text" [refdb:refcontent, refdb:refcontent]
+    """
+    try:
+        text, dbxrefs = definition.split('" [')
+        text = re.sub(r'^"', "", text)
+        dbxrefs = re.sub(r"\]$", "", dbxrefs)
+    except ValueError:
+        text = definition
+        dbxrefs = ""
+    if not dbxrefs:
+        return text, list()
+    return text, [split_xref(dbxref) for dbxref in dbxrefs.split(", ")]
+
+
+def store_cvtermpath(cv_names: Iterable[str]) -> int:
+    """Store the transitive closure of the cvterm relationships.
+
+    Every term of the cvs gets one cvtermpath row per ancestor, with the
+    shortest pathdistance; the type is the relationship of the path's first
+    step. The previous paths of the cvs are replaced. Returns the number of
+    paths stored.
+    """
+    cv_names = set(cv_names)
+    cv_ids = list(Cv.objects.filter(name__in=cv_names).values_list("cv_id", flat=True))
+    if len(cv_ids) < len(cv_names):
+        registered = Cv.objects.filter(name__in=cv_names).values_list("name", flat=True)
+        raise ImportingError(
+            "Cv not registered: {}".format(
+                ", ".join(sorted(cv_names - set(registered)))
+            )
+        )
+
+    # the whole graph is read, since the paths may cross cvs
+    parents: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+    for subject_id, object_id, type_id in CvtermRelationship.objects.values_list(
+        "subject_id", "object_id", "type_id"
+    ).iterator():
+        parents[subject_id].append((object_id, type_id))
+    # read beforehand, since no query can run while the paths are copied
+    subjects = [
+        (cvterm_id, cv_id)
+        for cvterm_id, cv_id in Cvterm.objects.filter(cv_id__in=cv_ids).values_list(
+            "cvterm_id", "cv_id"
+        )
+        if cvterm_id in parents
+    ]
+
+    def paths():
+        for subject_id, cv_id in subjects:
+            for type_id in {type_id for object_id, type_id in parents[subject_id]}:
+                # breadth-first, so the first visit has the shortest distance
+                distances: Dict[int, int] = dict()
+                frontier = [
+                    object_id
+                    for object_id, edge_type_id in parents[subject_id]
+                    if edge_type_id == type_id
+                ]
+                pathdistance = 1
+                while frontier:
+                    step = list()
+                    for cvterm_id in frontier:
+                        if cvterm_id not in distances:
+                            distances[cvterm_id] = pathdistance
+                            step.extend(
+                                object_id
+                                for object_id, edge_type_id in parents.get(
+                                    cvterm_id, ()
+                                )
+                            )
+                    frontier = step
+                    pathdistance += 1
+                for object_id, pathdistance in distances.items():
+                    yield type_id, subject_id, object_id, cv_id, pathdistance
+
+    try:
+        with transaction.atomic():
+            Cvtermpath.objects.filter(subject__cv_id__in=cv_ids).delete()
+            return copy_rows(
+                "cvtermpath",
+                ["type_id", "subject_id", "object_id", "cv_id", "pathdistance"],
+                paths(),
+            )
+    except (IntegrityError, DataError) as e:
+        raise ImportingError(str(e))
+
 
 class OntologyLoader(object):
     """Ontology."""
@@ -320,52 +424,230 @@ class OntologyLoader(object):
         )
         cvrel.save()
 
+    def store_terms(self, terms: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        """Store the ontology terms in bulk.
+
+        The rows of every term are computed first, so each table is written
+        by a single multi-row statement. It stores the same rows as
+        store_term.
+        """
+        cvterms: Dict[Tuple[str, str], Tuple[str, str, str]] = dict()
+        cvterm_dbxrefs: List[Tuple[Tuple[str, str], Tuple[str, str], int]] = list()
+        comments: List[Tuple[Tuple[str, str], str]] = list()
+        synonyms: List[Tuple[Tuple[str, str], str, str]] = list()
+        for n, data in terms:
+            aux_db, aux_accession = n.split(":")
+            key = (aux_db.upper(), aux_accession)
+            try:
+                name = data["name"]
+            except KeyError as e:
+                raise ImportingError(
+                    "Failed to load ontology term. Error: {}. Details: {}".format(
+                        e, data
+                    )
+                )
+            definition = ""
+            if data.get("def"):
+                definition, dbxrefs = split_cvterm_def(data["def"])
+                cvterm_dbxrefs.extend((key, dbxref, 1) for dbxref in dbxrefs)
+            namespace = data.get("namespace")
+            cvterms[key] = (
+                namespace if namespace is not None else self.cv.name,
+                name,
+                definition,
+            )
+            for alt_id in data.get("alt_id") or []:
+                aux_db, aux_accession = alt_id.split(":")
+                cvterm_dbxrefs.append((key, (aux_db.upper(), aux_accession), 0))
+            if data.get("comment") is not None:
+                comments.append((key, data["comment"]))
+            for xref in data.get("xref") or []:
+                if xref:
+                    cvterm_dbxrefs.append((key, split_xref(xref), 0))
+            for synonym in data.get("synonym") or []:
+                matches = SO_SYNONYM_PATTERN.findall(synonym)
+                if len(matches) == 1 and len(matches[0]) == 2:
+                    synonyms.append((key, matches[0][0], matches[0][1].lower()))
+        if not cvterms:
+            return
+
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cv_ids = {
+                    name: Cv.objects.get_or_create(name=name)[0].cv_id
+                    for name in {
+                        cv_name for cv_name, name, definition in cvterms.values()
+                    }
+                }
+                synonym_type_ids = {
+                    name: self.retrieve_synonym_type(name).cvterm_id
+                    for name in {synonym_type for key, text, synonym_type in synonyms}
+                }
+                dbxref_ids = upsert_named_dbxrefs(
+                    list(cvterms) + [dbxref for key, dbxref, d in cvterm_dbxrefs]
+                )
+
+                keys = list(cvterms)
+                cursor.execute(
+                    "INSERT INTO cvterm (cv_id, name, definition, dbxref_id, "
+                    "is_obsolete, is_relationshiptype) "
+                    "SELECT cv_id, name, definition, dbxref_id, 0, 0 "
+                    "FROM unnest(%s::bigint[], %s::text[], %s::text[], "
+                    "%s::bigint[]) AS t(cv_id, name, definition, dbxref_id) "
+                    "ON CONFLICT (dbxref_id) "
+                    "DO UPDATE SET definition = EXCLUDED.definition "
+                    "RETURNING dbxref_id, cvterm_id, cv_id, name",
+                    [
+                        [cv_ids[cvterms[key][0]] for key in keys],
+                        [cvterms[key][1] for key in keys],
+                        [cvterms[key][2] for key in keys],
+                        [dbxref_ids[key] for key in keys],
+                    ],
+                )
+                returned = {row[0]: row[1:] for row in cursor.fetchall()}
+                cvterm_ids = dict()
+                for key in keys:
+                    cvterm_id, cv_id, name = returned[dbxref_ids[key]]
+                    if (cv_id, name) != (cv_ids[cvterms[key][0]], cvterms[key][1]):
+                        raise ImportingError(
+                            "Failed to load ontology term {}:{}, its dbxref is "
+                            "registered to the cvterm '{}'".format(*key, name)
+                        )
+                    cvterm_ids[key] = cvterm_id
+
+                # the first occurrence of a dbxref sets is_for_definition
+                definitions: Dict[Tuple[int, int], int] = dict()
+                for key, dbxref, is_for_definition in cvterm_dbxrefs:
+                    definitions.setdefault(
+                        (cvterm_ids[key], dbxref_ids[dbxref]), is_for_definition
+                    )
+                cursor.execute(
+                    "INSERT INTO cvterm_dbxref (cvterm_id, dbxref_id, "
+                    "is_for_definition) "
+                    "SELECT * FROM unnest(%s::bigint[], %s::bigint[], %s::int[]) "
+                    "ON CONFLICT (cvterm_id, dbxref_id) DO NOTHING",
+                    [
+                        [cvterm_id for cvterm_id, dbxref_id in definitions],
+                        [dbxref_id for cvterm_id, dbxref_id in definitions],
+                        list(definitions.values()),
+                    ],
+                )
+                cursor.execute(
+                    "INSERT INTO cvtermprop (cvterm_id, type_id, value, rank) "
+                    "SELECT cvterm_id, %s, value, 0 "
+                    "FROM unnest(%s::bigint[], %s::text[]) AS t(cvterm_id, value) "
+                    "ON CONFLICT DO NOTHING",
+                    [
+                        self.cvterm_comment.cvterm_id,
+                        [cvterm_ids[key] for key, value in comments],
+                        [value for key, value in comments],
+                    ],
+                )
+                cursor.execute(
+                    "INSERT INTO cvtermsynonym (cvterm_id, synonym, type_id) "
+                    "SELECT * FROM unnest(%s::bigint[], %s::text[], %s::bigint[]) "
+                    "ON CONFLICT (cvterm_id, synonym) DO NOTHING",
+                    [
+                        [cvterm_ids[key] for key, text, synonym_type in synonyms],
+                        [text for key, text, synonym_type in synonyms],
+                        [
+                            synonym_type_ids[synonym_type]
+                            for key, text, synonym_type in synonyms
+                        ],
+                    ],
+                )
+        except (IntegrityError, DataError) as e:
+            raise ImportingError(str(e))
+
+    def store_relationships(self, edges: Iterable[Tuple[str, str, str]]) -> None:
+        """Store the relationships between ontology terms in bulk."""
+        keys = list()
+        for u, v, type in edges:
+            subject_db_name, subject_dbxref_accession = u.split(":")
+            object_db_name, object_dbxref_accession = v.split(":")
+            keys.append(
+                (
+                    (subject_db_name.upper(), subject_dbxref_accession),
+                    (object_db_name.upper(), object_dbxref_accession),
+                    type,
+                )
+            )
+        if not keys:
+            return
+
+        # Get the relationship types
+        type_ids = dict(
+            Cvterm.objects.filter(
+                dbxref__db=self.db_global,
+                dbxref__accession__in={type for u, v, type in keys},
+            ).values_list("dbxref__accession", "cvterm_id")
+        )
+        type_ids["is_a"] = self.cvterm_is_a.cvterm_id
+
+        # Get the subject and object cvterms
+        terms = sorted({term for u, v, type in keys for term in (u, v)})
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT db.name, dbxref.accession, cvterm.cvterm_id "
+                "FROM unnest(%s::text[], %s::text[]) AS t(name, accession) "
+                "JOIN db ON db.name = t.name "
+                "JOIN dbxref ON dbxref.db_id = db.db_id "
+                "AND dbxref.accession = t.accession "
+                "JOIN cvterm ON cvterm.dbxref_id = dbxref.dbxref_id",
+                [
+                    [name for name, accession in terms],
+                    [accession for name, accession in terms],
+                ],
+            )
+            cvterm_ids = {
+                (name, accession): cvterm_id
+                for name, accession, cvterm_id in cursor.fetchall()
+            }
+        missing = ["{}:{}".format(*term) for term in terms if term not in cvterm_ids]
+        missing += sorted({type for u, v, type in keys if type not in type_ids})
+        if missing:
+            raise ImportingError(
+                "Cvterm not registered: {}".format(", ".join(missing[:20]))
+            )
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO cvterm_relationship (type_id, subject_id, object_id) "
+                    "SELECT * FROM unnest(%s::bigint[], %s::bigint[], %s::bigint[]) "
+                    "ON CONFLICT DO NOTHING",
+                    [
+                        [type_ids[type] for u, v, type in keys],
+                        [cvterm_ids[u] for u, v, type in keys],
+                        [cvterm_ids[v] for u, v, type in keys],
+                    ],
+                )
+        except (IntegrityError, DataError) as e:
+            raise ImportingError(str(e))
+
     def process_cvterm_def(
         self, cvterm: Cvterm, definition: str, is_for_definition: int = 1
     ) -> None:
-        """Process defition to obtain cvterms."""
-        text = ""
-
-        """
-        Definition format:
-        "text" [refdb:refcontent, refdb:refcontent]
+        """Process defition to obtain cvterms.
 
         Definition format example:
         "A gene encoding an mRNA that has the stop codon redefined as
          pyrrolysine." [SO:xp]
         """
-        # Retrieve text and dbxrefs
-        try:
-            text, dbxrefs = definition.split('" [')
-            text = re.sub(r'^"', "", text)
-            dbxrefs = re.sub(r"\]$", "", dbxrefs)
-        except ValueError:
-            text = definition
-            dbxrefs = ""
-
-        if dbxrefs:
-            dbxref_list = dbxrefs.split(", ")
-
-            # Save all dbxrefs
-            for dbxref in dbxref_list:
-                ref_db, ref_content = dbxref.split(":", 1)
-
-                if ref_db == "http":
-                    ref_db = "URL"
-                    ref_content = "http:" + ref_content
-
-                # Get/Set Dbxref instance: ref_db,ref_content
-                db, created = Db.objects.get_or_create(name=ref_db.upper())
-                dbxref, created = Dbxref.objects.get_or_create(
-                    db=db, accession=ref_content
-                )
+        text, dbxrefs = split_cvterm_def(definition)
 
-                # Estabilish the cvterm and the dbxref relationship
-                CvtermDbxref.objects.get_or_create(
-                    cvterm=cvterm,
-                    dbxref=dbxref,
-                    defaults={"is_for_definition": is_for_definition},
-                )
+        # Save all dbxrefs
+        for ref_db, ref_content in dbxrefs:
+            # Get/Set Dbxref instance: ref_db,ref_content
+            db, created = Db.objects.get_or_create(name=ref_db)
+            dbxref, created = Dbxref.objects.get_or_create(db=db, accession=ref_content)
+
+            # Estabilish the cvterm and the dbxref relationship
+            CvtermDbxref.objects.get_or_create(
+                cvterm=cvterm,
+                dbxref=dbxref,
+                defaults={"is_for_definition": is_for_definition},
+            )
 
         cvterm.definition = text
         cvterm.save()
@@ -375,14 +657,10 @@ class OntologyLoader(object):
     ) -> None:
         """Process cvterm_xref."""
         if xref:
-            ref_db, ref_content = xref.split(":", 1)
-
-            if ref_db == "http":
-                ref_db = "URL"
-                ref_content = "http:" + ref_content
+            ref_db, ref_content = split_xref(xref)
 
             # Get/Set Dbxref instance: ref_db,ref_content
-            db, created = Db.objects.get_or_create(name=ref_db.upper())
+            db, created = Db.objects.get_or_create(name=ref_db)
             dbxref, created = Dbxref.objects.get_or_create(db=db, accession=ref_content)
 
             # Estabilish the cvterm and the dbxref relationship
@@ -447,8 +725,7 @@ class OntologyLoader(object):
         There are several cases that don't follow this format.
         Those are being ignored for now.
         """
-        pattern = re.compile(r'^"(.+)" (\w+) \[\]$')
-        matches = pattern.findall(synonym)
+        matches = SO_SYNONYM_PATTERN.findall(synonym)
 
         if len(matches) != 1 or len(matches[0]) != 2:
             return
@@ -456,20 +733,25 @@ class OntologyLoader(object):
         synonym_text, synonym_type = matches[0]
 
         # Handling the synonym_type
+        cvterm_type = self.retrieve_synonym_type(synonym_type.lower())
+
+        # Storing the synonym
+        cvtermsynonym = Cvtermsynonym.objects.create(
+            cvterm=cvterm, synonym=synonym_text, type_id=cvterm_type.cvterm_id
+        )
+        cvtermsynonym.save()
+
+    def retrieve_synonym_type(self, synonym_type: str) -> Cvterm:
+        """Get or create the synonym_type cvterm."""
         dbxref_type, created = Dbxref.objects.get_or_create(
-            db=self.db_internal, accession=synonym_type.lower()
+            db=self.db_internal, accession=synonym_type
         )
         cvterm_type, created = Cvterm.objects.get_or_create(
             cv=self.cv_synonym_type,
-            name=synonym_type.lower(),
+            name=synonym_type,
             definition="",
             dbxref=dbxref_type,
             is_obsolete=0,
             is_relationshiptype=0,
         )
-
-        # Storing the synonym
-        cvtermsynonym = Cvtermsynonym.objects.create(
-            cvterm=cvterm, synonym=synonym_text, type_id=cvterm_type.cvterm_id
-        )
-        cvtermsynonym.save()
+        return cvterm_type
@@ -6,11 +6,13 @@
 
 """Phylotree."""
 
-from typing import Dict, Optional, Tuple
+from typing import Any, Dict, Optional, Tuple
 
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection, transaction
 from django.db.utils import IntegrityError, DataError
 
+from machado.loaders.bulk import copy_rows, reserve_ids
 from machado.loaders.exceptions import ImportingError
 from machado.models import Cv, Cvterm, Db, Dbxref, Organism
 from machado.models import Phylotree, Phylonode, PhylonodeOrganism
@@ -44,6 +46,22 @@ class PhylotreeLoader(object):
         except (IntegrityError, DataError) as e:
             raise ImportingError(str(e))
 
+    def retrieve_level_cvterm(self, level: str) -> Cvterm:
+        """Get or create the cvterm of a taxonomic level."""
+        level_cvterm = self.level_cvterms.get(level)
+        if level_cvterm is None:
+            level_dbxref, created = Dbxref.objects.get_or_create(
+                db=self.level_db, accession=level
+            )
+            level_cvterm, created = Cvterm.objects.get_or_create(
+                cv=self.level_cv,
+                dbxref=level_dbxref,
+                name=level,
+                defaults={"is_obsolete": 0, "is_relationshiptype": 1},
+            )
+            self.level_cvterms[level] = level_cvterm
+        return level_cvterm
+
     def get_organism_by_accession(self, accession: int) -> Optional[Organism]:
         """Get organism by dbxref.accession."""
         try:
@@ -84,18 +102,7 @@ class PhylotreeLoader(object):
         right_idx: int = 0,
     ) -> Tuple[int, Phylonode]:
         """Store phylonode record."""
-        level_cvterm = self.level_cvterms.get(level)
-        if level_cvterm is None:
-            level_dbxref, created = Dbxref.objects.get_or_create(
-                db=self.level_db, accession=level
-            )
-            level_cvterm, created = Cvterm.objects.get_or_create(
-                cv=self.level_cv,
-                dbxref=level_dbxref,
-                name=level,
-                defaults={"is_obsolete": 0, "is_relationshiptype": 1},
-            )
-            self.level_cvterms[level] = level_cvterm
+        level_cvterm = self.retrieve_level_cvterm(level)
 
         parent_phylonode_id = None
         if parent_id is not None:
@@ -119,3 +126,80 @@ class PhylotreeLoader(object):
         organism.save()
         PhylonodeOrganism.objects.create(phylonode=phylonode, organism=organism)
         return (tax_id, phylonode)
+
+    def store_phylonodes(self, nodes: Dict[int, Dict[str, Any]]) -> Dict[int, int]:
+        """Store the phylonode records of a whole tree.
+
+        The nodes are keyed by tax_id, with parent_id, level, left_idx and
+        right_idx. The organisms are looked up with a single join and the
+        phylonode ids are reserved beforehand, so the nodes are written with
+        their parent ids by COPY. Returns the phylonode_id by tax_id.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT dbxref.accession, organism_dbxref.organism_id "
+                "FROM dbxref JOIN organism_dbxref "
+                "ON organism_dbxref.dbxref_id = dbxref.dbxref_id "
+                "WHERE dbxref.db_id = %s",
+                [self.db.db_id],
+            )
+            organism_ids = dict(cursor.fetchall())
+        for tax_id in nodes:
+            if str(tax_id) not in organism_ids:
+                raise ImportingError(
+                    "Organism not found for taxonomic ID '{}'.".format(tax_id)
+                )
+
+        type_ids = {
+            level: self.retrieve_level_cvterm(level).cvterm_id
+            for level in {data["level"] for data in nodes.values()}
+        }
+        try:
+            with transaction.atomic():
+                phylonode_ids = dict(
+                    zip(nodes, reserve_ids("phylonode", "phylonode_id", len(nodes)))
+                )
+                copy_rows(
+                    "phylonode",
+                    [
+                        "phylonode_id",
+                        "phylotree_id",
+                        "parent_phylonode_id",
+                        "type_id",
+                        "left_idx",
+                        "right_idx",
+                    ],
+                    (
+                        (
+                            phylonode_ids[tax_id],
+                            self.phylotree.phylotree_id,
+                            phylonode_ids.get(data["parent_id"]),
+                            type_ids[data["level"]],
+                            data["left_idx"],
+                            data["right_idx"],
+                        )
+                        for tax_id, data in nodes.items()
+                    ),
+                )
+                copy_rows(
+                    "phylonode_organism",
+                    ["phylonode_id", "organism_id"],
+                    (
+                        (phylonode_ids[tax_id], organism_ids[str(tax_id)])
+                        for tax_id in nodes
+                    ),
+                )
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "UPDATE organism SET type_id = t.type_id "
+                        "FROM unnest(%s::bigint[], %s::bigint[]) "
+                        "AS t(organism_id, type_id) "
+                        "WHERE organism.organism_id = t.organism_id",
+                        [
+                            [organism_ids[str(tax_id)] for tax_id in nodes],
+                            [type_ids[data["level"]] for data in nodes.values()],
+                        ],
+                    )
+        except (IntegrityError, DataError) as e:
+            raise ImportingError(str(e))
+        return phylonode_ids
@@ -8,16 +8,83 @@
 
 from datetime import datetime, timezone
 from hashlib import md5
+from itertools import chain, groupby
+from operator import itemgetter
+from threading import Lock
+from typing import Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple
 
 from Bio.SeqRecord import SeqRecord
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.exceptions import MultipleObjectsReturned, ObjectDoesNotExist
+from django.db import connection, transaction
 from django.db.utils import IntegrityError, DataError
 
+from machado.loaders.bulk import copy_rows, copy_text, reserve_ids, upsert_dbxrefs
+from machado.loaders.common import AccessionResolver, ReferenceCache
 from machado.loaders.common import retrieve_feature_id
 from machado.loaders.exceptions import ImportingError
-from machado.models import Cvterm, Db, Dbxref, Dbxrefprop, Feature, FeaturePub, Organism
+from machado.models import Cvterm, Db, Dbxref, Feature, Organism
 from machado.models import PubDbxref
 
+BLOCK_SIZE = 1 << 20
+
+FEATURE_COLUMNS = (
+    "feature_id",
+    "dbxref_id",
+    "organism_id",
+    "name",
+    "uniquename",
+    "residues",
+    "seqlen",
+    "md5checksum",
+    "type_id",
+    "is_analysis",
+    "is_obsolete",
+    "timeaccessioned",
+    "timelastmodified",
+)
+
+
+def read_fasta_blocks(
+    handle: TextIO, block_size: int = BLOCK_SIZE
+) -> Iterator[Tuple[int, str, str]]:
+    """Read a FASTA file in blocks of block_size characters.
+
+    Yield (record index, title, residues) for every chunk of residues, without
+    whitespace, and an empty chunk when a record starts, so the memory used
+    doesn't depend on the length of the sequences or of their lines.
+    """
+    index = -1
+    title = None
+    header: Optional[List[str]] = None
+    for block in iter(lambda: handle.read(block_size), ""):
+        start = 0
+        while start < len(block):
+            if header is not None:
+                end = block.find("\n", start)
+                if end == -1:
+                    header.append(block[start:])
+                    break
+                header.append(block[start:end])
+                index += 1
+                title = "".join(header).strip()
+                header = None
+                yield index, title, ""
+                start = end + 1
+                continue
+            end = block.find(">", start)
+            if end == -1:
+                end = len(block)
+            else:
+                header = list()
+            residues = "".join(block[start:end].split())
+            if residues:
+                if title is None:
+                    raise ImportingError("Sequence found before the first header.")
+                yield index, title, residues
+            start = end + 1
+    if header is not None:
+        yield index + 1, "".join(header).strip(), ""
+
 
 class SequenceLoader(object):
     """Load sequence records."""
@@ -37,6 +104,11 @@ class SequenceLoader(object):
         )
         self.filename = filename
         self.organism = organism
+        self.refcache = ReferenceCache()
+        self.uniquenames: Dict[int, Set[str]] = dict()
+        self.resolver = AccessionResolver()
+        self.unmatched: List[str] = list()
+        self.lock = Lock()
 
         # Retrieve sequence ontology object
         self.cvterm_contained_in = Cvterm.objects.get(
@@ -56,6 +128,20 @@ class SequenceLoader(object):
             except ObjectDoesNotExist as e:
                 raise ImportingError(str(e), file=self.filename)
 
+    def registered_uniquenames(self, soterm_id: int) -> Set[str]:
+        """Retrieve the uniquenames of the organism's features of a soterm.
+
+        The set is read once per soterm and kept up to date with the features
+        stored afterwards. It must be called with the lock held.
+        """
+        if soterm_id not in self.uniquenames:
+            self.uniquenames[soterm_id] = set(
+                Feature.objects.filter(
+                    organism=self.organism, type_id=soterm_id
+                ).values_list("uniquename", flat=True)
+            )
+        return self.uniquenames[soterm_id]
+
     def store_biopython_seq_record(
         self,
         seq_obj: SeqRecord,
@@ -63,8 +149,29 @@ class SequenceLoader(object):
         ignore_residues: bool = False,
     ) -> None:
         """Store Biopython SeqRecord."""
+        self.store_biopython_seq_records([seq_obj], soterm, ignore_residues)
+
+    def store_biopython_seq_records(
+        self,
+        seq_objs: List[SeqRecord],
+        soterm: str,
+        ignore_residues: bool = False,
+    ) -> None:
+        """Store a batch of Biopython SeqRecords."""
+        soterm_obj = self.retrieve_soterm(soterm)
+        self.claim_uniquenames(
+            soterm_obj.cvterm_id, [seq_obj.id for seq_obj in seq_objs]
+        )
+        try:
+            with transaction.atomic():
+                self.write_seq_records(seq_objs, soterm_obj, ignore_residues)
+        except (IntegrityError, DataError) as e:
+            raise ImportingError(str(e), file=self.filename)
+
+    def retrieve_soterm(self, soterm: str) -> Cvterm:
+        """Retrieve the Sequence Ontology term of the sequences."""
         try:
-            soterm_obj = Cvterm.objects.get(name=soterm, cv__name="sequence")
+            return self.refcache.cvterm(soterm, "sequence")
         except ObjectDoesNotExist as e:
             raise ImportingError(
                 "The Sequence Ontology term '{}' is not registered. Details: {}".format(
@@ -73,58 +180,167 @@ class SequenceLoader(object):
                 file=self.filename,
             )
 
-        try:
-            dbxref, created = Dbxref.objects.get_or_create(
-                db=self.db, accession=seq_obj.id
-            )
-            Dbxrefprop.objects.get_or_create(
-                dbxref=dbxref,
-                type_id=self.cvterm_contained_in.cvterm_id,
-                rank=0,
-            )
-            retrieve_feature_id(
-                accession=seq_obj.id, soterm=soterm, organism=self.organism
-            )
-            raise ImportingError(
-                "Sequence '{}' is already registered.".format(seq_obj.id),
-                file=self.filename,
+    def claim_uniquenames(self, soterm_id: int, ids: List[str]) -> None:
+        """Raise if an id is repeated or already stored, or else reserve them."""
+        with self.lock:
+            uniquenames = self.registered_uniquenames(soterm_id)
+            seen: Set[str] = set()
+            for accession in ids:
+                if accession in uniquenames or accession in seen:
+                    raise ImportingError(
+                        "Sequence '{}' is already registered.".format(accession),
+                        file=self.filename,
+                    )
+                seen.add(accession)
+            # claimed before writing, so other threads won't store them again
+            uniquenames.update(seen)
+
+    def store_dbxrefs(self, ids: List[str]) -> Dict[str, int]:
+        """Get or create the FASTA_SOURCE dbxrefs and return them by id."""
+        dbxref_ids = upsert_dbxrefs(self.db.db_id, ids)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO dbxrefprop (dbxref_id, type_id, value, rank) "
+                "SELECT dbxref_id, %s, '', 0 FROM unnest(%s::bigint[]) AS dbxref_id "
+                "ON CONFLICT (dbxref_id, type_id, rank) DO NOTHING",
+                [self.cvterm_contained_in.cvterm_id, sorted(dbxref_ids.values())],
             )
-        except ObjectDoesNotExist:
-            residues = seq_obj.seq
+        return dbxref_ids
 
-            m = md5(str(seq_obj.seq).encode()).hexdigest()
-            if ignore_residues is True:
-                residues = ""
+    def store_feature_pubs(self, feature_ids: List[int]) -> None:
+        """Link the features to the publication's DOI, if any."""
+        if self.pub_dbxref_doi:
+            copy_rows(
+                "feature_pub",
+                ("feature_id", "pub_id"),
+                (
+                    (feature_id, self.pub_dbxref_doi.pub_id)
+                    for feature_id in feature_ids
+                ),
+            )
 
+    def write_seq_records(
+        self, seq_objs: List[SeqRecord], soterm_obj: Cvterm, ignore_residues: bool
+    ) -> None:
+        """Write the features of a batch and their dependent rows."""
+        dbxref_ids = self.store_dbxrefs([seq_obj.id for seq_obj in seq_objs])
+        feature_ids = reserve_ids("feature", "feature_id", len(seq_objs))
+        now = datetime.now(timezone.utc)
+        features = list()
+        for feature_id, seq_obj in zip(feature_ids, seq_objs):
+            sequence = str(seq_obj.seq)
             name = None
             if seq_obj.description != "<unknown description>":
                 name = seq_obj.description
-
-            # storing feature
-            feature = Feature(
-                dbxref=dbxref,
-                organism=self.organism,
-                uniquename=seq_obj.id,
-                name=name,
-                residues=residues,
-                seqlen=len(seq_obj.seq),
-                md5checksum=m,
-                type=soterm_obj,
-                is_analysis=False,
-                is_obsolete=False,
-                timeaccessioned=datetime.now(timezone.utc),
-                timelastmodified=datetime.now(timezone.utc),
+            features.append(
+                (
+                    feature_id,
+                    dbxref_ids[seq_obj.id],
+                    self.organism.organism_id,
+                    name,
+                    seq_obj.id,
+                    "" if ignore_residues else sequence,
+                    len(sequence),
+                    md5(sequence.encode()).hexdigest(),
+                    soterm_obj.cvterm_id,
+                    False,
+                    False,
+                    now,
+                    now,
+                )
             )
-            feature.save()
+        copy_rows("feature", FEATURE_COLUMNS, features)
+        self.store_feature_pubs(feature_ids)
 
-            # DOI: try to link sequence to publication's DOI
-            if feature and self.pub_dbxref_doi:
-                try:
-                    FeaturePub.objects.create(
-                        feature=feature, pub_id=self.pub_dbxref_doi.pub_id
+    def store_fasta_stream(
+        self,
+        handle: TextIO,
+        soterm: str,
+        ignore_residues: bool = False,
+        block_size: int = BLOCK_SIZE,
+    ) -> Iterator[str]:
+        """Store the sequences of a FASTA file without holding them in memory.
+
+        The file is read in blocks of block_size characters and the residues
+        are written to the feature row with COPY while they are read, so the
+        memory used doesn't depend on the length of the sequences. The id of
+        each stored sequence is yielded.
+        """
+        soterm_obj = self.retrieve_soterm(soterm)
+        for _, chunks in groupby(
+            read_fasta_blocks(handle, block_size), key=itemgetter(0)
+        ):
+            _, title, residues = next(chunks)
+            accession = title.split(None, 1)[0] if title else ""
+            self.claim_uniquenames(soterm_obj.cvterm_id, [accession])
+            try:
+                with transaction.atomic():
+                    self.write_streamed_seq_record(
+                        accession,
+                        title,
+                        chain([residues], (chunk for _, _, chunk in chunks)),
+                        soterm_obj,
+                        ignore_residues,
                     )
-                except (IntegrityError, DataError) as e:
-                    raise ImportingError(str(e), file=self.filename)
+            except (IntegrityError, DataError) as e:
+                raise ImportingError(str(e), file=self.filename)
+            yield accession
+
+    def write_streamed_seq_record(
+        self,
+        accession: str,
+        title: str,
+        chunks: Iterable[str],
+        soterm_obj: Cvterm,
+        ignore_residues: bool,
+    ) -> None:
+        """Write a feature whose residues are copied chunk by chunk.
+
+        seqlen and md5checksum are only known once all the residues are
+        copied, so they are set by an UPDATE afterwards.
+        """
+        dbxref_ids = self.store_dbxrefs([accession])
+        feature_id = reserve_ids("feature", "feature_id", 1)[0]
+        now = datetime.now(timezone.utc).isoformat()
+        # the residues go last, after the prefix written as COPY text
+        columns = [column for column in FEATURE_COLUMNS if column != "residues"]
+        values = {
+            "feature_id": feature_id,
+            "dbxref_id": dbxref_ids[accession],
+            "organism_id": self.organism.organism_id,
+            "name": title,
+            "uniquename": accession,
+            "seqlen": None,
+            "md5checksum": None,
+            "type_id": soterm_obj.cvterm_id,
+            "is_analysis": "f",
+            "is_obsolete": "f",
+            "timeaccessioned": now,
+            "timelastmodified": now,
+        }
+        checksum = md5()
+        seqlen = 0
+        statement = "COPY feature ({}, residues) FROM STDIN".format(", ".join(columns))
+        # the raw psycopg cursor is used, so its errors are wrapped as Django's
+        with connection.cursor() as cursor, connection.wrap_database_errors:
+            with cursor.cursor.copy(statement) as copy:
+                copy.write(
+                    "".join(
+                        "{}\t".format(copy_text(values[column])) for column in columns
+                    )
+                )
+                for chunk in chunks:
+                    checksum.update(chunk.encode())
+                    seqlen += len(chunk)
+                    if not ignore_residues:
+                        copy.write(copy_text(chunk))
+                copy.write("\n")
+            cursor.execute(
+                "UPDATE feature SET seqlen = %s, md5checksum = %s "
+                "WHERE feature_id = %s",
+                [seqlen, checksum.hexdigest(), feature_id],
+            )
+        self.store_feature_pubs([feature_id])
 
     def add_sequence_to_feature(self, seq_obj: SeqRecord, soterm: str) -> None:
         """Store Biopython SeqRecord."""
@@ -137,7 +353,67 @@ class SequenceLoader(object):
                 "Feature '{}' does not exist.".format(seq_obj.id), file=self.filename
             )
 
+        sequence = str(seq_obj.seq)
         feature_obj = Feature.objects.get(feature_id=feature_id)
-        feature_obj.md5 = md5(str(seq_obj.seq).encode()).hexdigest()
-        feature_obj.residues = seq_obj.seq
+        feature_obj.md5checksum = md5(sequence.encode()).hexdigest()
+        feature_obj.seqlen = len(sequence)
+        feature_obj.residues = sequence
         feature_obj.save()
+
+    def add_sequences_to_features(self, seq_objs: List[SeqRecord], soterm: str) -> None:
+        """Add the sequences of a batch to their existing features.
+
+        The features are resolved with the namespace maps and the sequences
+        are copied to a temporary table, applied by a single UPDATE. The ids
+        that match no feature are kept in unmatched.
+        """
+        sequences: Dict[int, str] = dict()
+        unmatched = list()
+        for seq_obj in seq_objs:
+            try:
+                feature_id = self.resolver.resolve(
+                    seq_obj.id, soterm, self.organism, query=False
+                )
+            except ObjectDoesNotExist:
+                unmatched.append(seq_obj.id)
+                continue
+            except MultipleObjectsReturned as e:
+                raise ImportingError(str(e), file=self.filename)
+            # a repeated sequence replaces the previous one, as in the row path
+            sequences[feature_id] = str(seq_obj.seq)
+        with self.lock:
+            self.unmatched.extend(unmatched)
+        if not sequences:
+            return None
+
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "CREATE TEMPORARY TABLE feature_sequence_staging ("
+                        "feature_id bigint PRIMARY KEY, residues text, "
+                        "seqlen bigint, md5checksum varchar(32))"
+                    )
+                copy_rows(
+                    "feature_sequence_staging",
+                    ("feature_id", "residues", "seqlen", "md5checksum"),
+                    (
+                        (
+                            feature_id,
+                            sequence,
+                            len(sequence),
+                            md5(sequence.encode()).hexdigest(),
+                        )
+                        for feature_id, sequence in sequences.items()
+                    ),
+                )
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "UPDATE feature f SET residues = s.residues, "
+                        "seqlen = s.seqlen, md5checksum = s.md5checksum "
+                        "FROM feature_sequence_staging s "
+                        "WHERE f.feature_id = s.feature_id"
+                    )
+                    cursor.execute("DROP TABLE feature_sequence_staging")
+        except (IntegrityError, DataError) as e:
+            raise ImportingError(str(e), file=self.filename)
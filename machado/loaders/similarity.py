@@ -7,21 +7,21 @@
 """Load similarity."""
 
 import warnings
-from datetime import datetime
-from time import time
-from typing import Optional
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 from Bio import BiopythonWarning
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Max
+from django.db import connection, transaction
 from django.db.utils import IntegrityError, DataError
 
 from machado.loaders.analysis import AnalysisLoader
-from machado.loaders.common import retrieve_feature_id, retrieve_organism
+from machado.loaders.bulk import copy_rows, reserve_ids
+from machado.loaders.common import AccessionResolver, ReferenceCache
+from machado.loaders.common import retrieve_organism
 from machado.loaders.exceptions import ImportingError
-from machado.models import Cvterm, Feature, Featureloc
-from machado.models import FeatureCvterm, FeatureCvtermprop
-from machado.models import FeatureRelationship, FeatureRelationshipprop
+from machado.models import Feature, Featureloc, Organism
 
 warnings.simplefilter("ignore", BiopythonWarning)
 with warnings.catch_warnings():
@@ -46,25 +46,32 @@ class SimilarityLoader(object):
         algorithm: str = None,
         name: str = None,
         description: str = None,
+        ignorenotfound: bool = False,
+        refcache: ReferenceCache = None,
     ) -> None:
         """Execute the init function."""
         self.filename = filename
+        self.ignorenotfound = ignorenotfound
+        self.refcache = ReferenceCache() if refcache is None else refcache
+        self.resolver = AccessionResolver()
+        self.match_part_counts: Dict[Tuple[int, int], int] = dict()
+        self.resolved: Dict[Tuple[Optional[str], str, int], Optional[int]] = dict()
+        self.unresolved: Set[Tuple[str, str]] = set()
+        self.lock = Lock()
         try:
             self.org_query = retrieve_organism(org_query)
             self.org_subject = retrieve_organism(org_subject)
             self.input_format = input_format
             self.so_query = so_query
             self.so_subject = so_subject
-            self.so_term_match_part = Cvterm.objects.get(
-                name="match_part", cv__name="sequence"
+            self.so_term_match_part = self.refcache.cvterm("match_part", "sequence")
+            self.ro_term_similarity = self.refcache.cvterm(
+                "in similarity relationship with", "relationship"
             )
-            self.ro_term_similarity = Cvterm.objects.get(
-                name="in similarity relationship with", cv__name="relationship"
+            self.cvterm_contained_in = self.refcache.cvterm(
+                "located in", "relationship"
             )
-            self.cvterm_contained_in = Cvterm.objects.get(
-                name="located in", cv__name="relationship"
-            )
-            self.analysis_loader = AnalysisLoader()
+            self.analysis_loader = AnalysisLoader(refcache=self.refcache)
             self.analysis = self.analysis_loader.store_analysis(
                 algorithm=algorithm,
                 name=name,
@@ -91,19 +98,43 @@ class SimilarityLoader(object):
                 pass
         return None
 
+    def resolve_feature_id(
+        self, accession: Optional[str], soterm: str, organism: Organism
+    ) -> int:
+        """Retrieve the feature_id of an accession, once per run.
+
+        The same query and hit ids repeat across many HSPs, so the results
+        are kept, including the accessions that don't match any feature.
+        """
+        key = (accession, soterm, organism.organism_id)
+        try:
+            feature_id = self.resolved[key]
+        except KeyError:
+            try:
+                feature_id = self.resolver.resolve(accession, soterm, organism)
+            except ObjectDoesNotExist:
+                feature_id = None
+            self.resolved[key] = feature_id
+        if feature_id is None:
+            raise ObjectDoesNotExist(
+                "Feature {} '{}' does not exist.".format(soterm, accession)
+            )
+        return feature_id
+
     def retrieve_query_from_hsp(self, hsp: hsp.HSP) -> int:
         """Retrieve the query feature from searchio hsp."""
         try:
-            query_feature_id = retrieve_feature_id(
-                accession=hsp.query_id, soterm=self.so_query, organism=self.org_query
+            query_feature_id = self.resolve_feature_id(
+                hsp.query_id, self.so_query, self.org_query
             )
         except ObjectDoesNotExist as e1:
             try:
                 query_id = self.retrieve_id_from_description(hsp.query_description)
-                query_feature_id = retrieve_feature_id(
-                    accession=query_id, soterm=self.so_query, organism=self.org_query
+                query_feature_id = self.resolve_feature_id(
+                    query_id, self.so_query, self.org_query
                 )
             except ObjectDoesNotExist as e2:
+                self.unresolved.add(("query", hsp.query_id))
                 raise ImportingError(
                     "Query feature '{}' ({}) not found.".format(
                         hsp.query_id, hsp.query_description
@@ -116,18 +147,17 @@ class SimilarityLoader(object):
     def retrieve_subject_from_hsp(self, hsp: hsp.HSP) -> int:
         """Retrieve the subject feature from searchio hsp."""
         try:
-            subject_feature_id = retrieve_feature_id(
-                accession=hsp.hit_id, soterm=self.so_subject, organism=self.org_subject
+            subject_feature_id = self.resolve_feature_id(
+                hsp.hit_id, self.so_subject, self.org_subject
             )
         except ObjectDoesNotExist as e1:
             try:
                 subject_id = self.retrieve_id_from_description(hsp.hit_description)
-                subject_feature_id = retrieve_feature_id(
-                    accession=subject_id,
-                    soterm=self.so_subject,
-                    organism=self.org_subject,
+                subject_feature_id = self.resolve_feature_id(
+                    subject_id, self.so_subject, self.org_subject
                 )
             except ObjectDoesNotExist as e2:
+                self.unresolved.add(("subject", hsp.hit_id))
                 raise ImportingError(
                     "Subject feature '{}' ({}) not found.".format(
                         hsp.hit_id, hsp.hit_description
@@ -137,6 +167,40 @@ class SimilarityLoader(object):
                 )
         return subject_feature_id
 
+    def retrieve_features_from_hsp(self, hsp: hsp.HSP) -> Optional[Tuple[int, int]]:
+        """Retrieve the query and subject features from searchio hsp.
+
+        With ignorenotfound, None is returned if either one is not found;
+        the ids are kept in unresolved.
+        """
+        try:
+            return (
+                self.retrieve_query_from_hsp(hsp),
+                self.retrieve_subject_from_hsp(hsp),
+            )
+        except ImportingError:
+            if self.ignorenotfound:
+                return None
+            raise
+
+    def get_match_part_uniquename(
+        self, query_feature_id: int, subject_feature_id: int
+    ) -> str:
+        """Return a uniquename for the next match_part of a query/subject pair.
+
+        The HSPs of a pair are numbered in the order they are stored, so a
+        file loaded again gets the same uniquenames.
+        """
+        key = (query_feature_id, subject_feature_id)
+        with self.lock:
+            self.match_part_counts[key] = self.match_part_counts.get(key, 0) + 1
+            return "match_part_{}_{}_{}_{}".format(
+                self.analysis.analysis_id,
+                query_feature_id,
+                subject_feature_id,
+                self.match_part_counts[key],
+            )
+
     def store_match_part(
         self,
         query_feature_id: int,
@@ -151,9 +215,8 @@ class SimilarityLoader(object):
         subject_end: int = None,
     ) -> None:
         """Store hsp record."""
-        # set id = auto# for match_part features
-        match_part_id = "match_part_{}{}{}".format(
-            str(time()), query_feature_id, subject_feature_id
+        match_part_id = self.get_match_part_uniquename(
+            query_feature_id, subject_feature_id
         )
         try:
             match_part_feature = Feature.objects.create(
@@ -162,8 +225,8 @@ class SimilarityLoader(object):
                 type=self.so_term_match_part,
                 is_analysis=True,
                 is_obsolete=False,
-                timeaccessioned=datetime.now(),
-                timelastmodified=datetime.now(),
+                timeaccessioned=datetime.now(timezone.utc),
+                timelastmodified=datetime.now(timezone.utc),
             )
             # Analysisfeature.objects.create(analysis=self.analysis,
             self.analysis_loader.store_analysisfeature(
@@ -204,79 +267,130 @@ class SimilarityLoader(object):
         self, query_feature_id: int, subject_feature_id: int
     ) -> None:
         """Store feature_relationship."""
-        feature_relation, create = FeatureRelationship.objects.get_or_create(
-            object_id=query_feature_id,
-            subject_id=subject_feature_id,
-            type=self.ro_term_similarity,
-            defaults={"rank": 0},
-        )
-        try:
-            rank = 0
-            FeatureRelationshipprop.objects.get_or_create(
-                feature_relationship=feature_relation,
-                type=self.cvterm_contained_in,
-                value=self.analysis.sourcename,
-                defaults={"rank": rank},
-            )
-        except IntegrityError:
-            rank = (
-                FeatureRelationshipprop.objects.filter(
-                    feature_relationship=feature_relation, type=self.cvterm_contained_in
-                )
-                .aggregate(Max("rank"))
-                .get("rank__max")
-            )
+        self.store_feature_relationships([(query_feature_id, subject_feature_id)])
 
-            rank += 1
-            FeatureRelationshipprop.objects.get_or_create(
-                feature_relationship=feature_relation,
-                type=self.cvterm_contained_in,
-                value=self.analysis.sourcename,
-                defaults={"rank": rank},
-            )
+    def store_feature_relationships(
+        self, feature_pairs: Iterable[Tuple[int, int]], parents: bool = False
+    ) -> None:
+        """Relate the (query, subject) pairs and copy the subjects' terms.
 
-        # ontology terms
-        subject_feature_cvterms = FeatureCvterm.objects.filter(
-            feature_id=subject_feature_id
-        )
-        for subject_feature_cvterm in subject_feature_cvterms:
-            query_feature_cvterm, c = FeatureCvterm.objects.get_or_create(
-                feature_id=query_feature_id,
-                cvterm=subject_feature_cvterm.cvterm,
-                pub=subject_feature_cvterm.pub,
-                is_not=subject_feature_cvterm.is_not,
-                rank=subject_feature_cvterm.rank,
-            )
-            try:
-                FeatureCvtermprop.objects.get_or_create(
-                    feature_cvterm=query_feature_cvterm,
-                    type=self.cvterm_contained_in,
-                    value=self.analysis.sourcename,
-                    defaults={"rank": 0},
-                )
-            except IntegrityError:
-                rank = (
-                    FeatureCvtermprop.objects.filter(
-                        feature_cvterm=query_feature_cvterm,
-                        type=self.cvterm_contained_in,
+        The pairs are staged in a temporary table and every step is a single
+        INSERT ... SELECT joined to it: the similarity relationships, their
+        "located in" props, the subjects' feature_cvterms copied to the
+        queries and the props of those. Rows already registered are kept, so
+        the transfer can be repeated. With parents, the pairs are also
+        applied to the features the queries are a translation_of (mRNA).
+        """
+        params = {
+            "similarity": self.ro_term_similarity.cvterm_id,
+            "contained_in": self.cvterm_contained_in.cvterm_id,
+            "sourcename": self.analysis.sourcename,
+        }
+        if parents:
+            params["translation_of"] = self.refcache.cvterm(
+                "translation_of", "sequence"
+            ).cvterm_id
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "CREATE TEMPORARY TABLE similarity_pair_staging ("
+                        "object_id bigint, subject_id bigint, "
+                        "PRIMARY KEY (object_id, subject_id))"
                     )
-                    .aggregate(Max("rank"))
-                    .get("rank__max")
-                )
-
-                rank += 1
-                FeatureCvtermprop.objects.get_or_create(
-                    feature_cvterm=query_feature_cvterm,
-                    type=self.cvterm_contained_in,
-                    value=self.analysis.sourcename,
-                    defaults={"rank": rank},
+                copy_rows(
+                    "similarity_pair_staging",
+                    ("object_id", "subject_id"),
+                    set(feature_pairs),
                 )
+                with connection.cursor() as cursor:
+                    if parents:
+                        cursor.execute(
+                            "INSERT INTO similarity_pair_staging "
+                            "SELECT fr.subject_id, p.subject_id "
+                            "FROM similarity_pair_staging p "
+                            "JOIN feature_relationship fr "
+                            "ON fr.object_id = p.object_id "
+                            "AND fr.type_id = %(translation_of)s "
+                            "ON CONFLICT DO NOTHING",
+                            params,
+                        )
+                    cursor.execute(
+                        "INSERT INTO feature_relationship "
+                        "(subject_id, object_id, type_id, rank) "
+                        "SELECT p.subject_id, p.object_id, %(similarity)s, 0 "
+                        "FROM similarity_pair_staging p "
+                        "WHERE NOT EXISTS (SELECT 1 FROM feature_relationship fr "
+                        "WHERE fr.subject_id = p.subject_id "
+                        "AND fr.object_id = p.object_id "
+                        "AND fr.type_id = %(similarity)s) "
+                        "ON CONFLICT DO NOTHING",
+                        params,
+                    )
+                    cursor.execute(
+                        "INSERT INTO feature_relationshipprop "
+                        "(feature_relationship_id, type_id, value, rank) "
+                        "SELECT fr.feature_relationship_id, %(contained_in)s, "
+                        "%(sourcename)s, COALESCE((SELECT max(x.rank) + 1 "
+                        "FROM feature_relationshipprop x "
+                        "WHERE x.feature_relationship_id = "
+                        "fr.feature_relationship_id "
+                        "AND x.type_id = %(contained_in)s), 0) "
+                        "FROM similarity_pair_staging p "
+                        "JOIN feature_relationship fr "
+                        "ON fr.subject_id = p.subject_id "
+                        "AND fr.object_id = p.object_id "
+                        "AND fr.type_id = %(similarity)s "
+                        "WHERE NOT EXISTS (SELECT 1 FROM feature_relationshipprop x "
+                        "WHERE x.feature_relationship_id = "
+                        "fr.feature_relationship_id "
+                        "AND x.type_id = %(contained_in)s "
+                        "AND x.value = %(sourcename)s) "
+                        "ON CONFLICT DO NOTHING",
+                        params,
+                    )
+                    cursor.execute(
+                        "INSERT INTO feature_cvterm "
+                        "(feature_id, cvterm_id, pub_id, is_not, rank) "
+                        "SELECT DISTINCT p.object_id, fc.cvterm_id, fc.pub_id, "
+                        "fc.is_not, fc.rank "
+                        "FROM similarity_pair_staging p "
+                        "JOIN feature_cvterm fc ON fc.feature_id = p.subject_id "
+                        "ON CONFLICT DO NOTHING"
+                    )
+                    cursor.execute(
+                        "INSERT INTO feature_cvtermprop "
+                        "(feature_cvterm_id, type_id, value, rank) "
+                        "SELECT q.feature_cvterm_id, %(contained_in)s, "
+                        "%(sourcename)s, COALESCE((SELECT max(x.rank) + 1 "
+                        "FROM feature_cvtermprop x "
+                        "WHERE x.feature_cvterm_id = q.feature_cvterm_id "
+                        "AND x.type_id = %(contained_in)s), 0) "
+                        "FROM (SELECT DISTINCT qfc.feature_cvterm_id "
+                        "FROM similarity_pair_staging p "
+                        "JOIN feature_cvterm sfc ON sfc.feature_id = p.subject_id "
+                        "JOIN feature_cvterm qfc ON qfc.feature_id = p.object_id "
+                        "AND qfc.cvterm_id = sfc.cvterm_id "
+                        "AND qfc.pub_id = sfc.pub_id AND qfc.rank = sfc.rank) q "
+                        "WHERE NOT EXISTS (SELECT 1 FROM feature_cvtermprop x "
+                        "WHERE x.feature_cvterm_id = q.feature_cvterm_id "
+                        "AND x.type_id = %(contained_in)s "
+                        "AND x.value = %(sourcename)s) "
+                        "ON CONFLICT DO NOTHING",
+                        params,
+                    )
+                    cursor.execute("DROP TABLE similarity_pair_staging")
+        except (IntegrityError, DataError) as e:
+            raise ImportingError(str(e), file=self.filename)
 
     def store_bio_searchio_query_result(self, query_result: query.QueryResult) -> None:
         """Store bio_searchio_query_result."""
+        feature_pairs = list()
         for hsp_item in query_result.hsps:
-            query_feature_id = self.retrieve_query_from_hsp(hsp_item)
-            subject_feature_id = self.retrieve_subject_from_hsp(hsp_item)
+            feature_ids = self.retrieve_features_from_hsp(hsp_item)
+            if feature_ids is None:
+                continue
+            query_feature_id, subject_feature_id = feature_ids
             if not hasattr(hsp_item, "ident_num"):
                 hsp_item.ident_num = None
             if not hasattr(hsp_item, "bitscore"):
@@ -297,20 +411,157 @@ class SimilarityLoader(object):
                 subject_start=hsp_item.hit_start,
                 subject_end=hsp_item.hit_end,
             )
-            if self.input_format == "interproscan-xml":
-                # protein functional annotation
-                self.store_feature_relationship(
-                    query_feature_id=query_feature_id,
-                    subject_feature_id=subject_feature_id,
-                )
-                # mRNA functional annotation
-                if self.so_query == "polypeptide":
-                    query_parent_feature_id = FeatureRelationship.objects.get(
-                        type__name="translation_of",
-                        type__cv__name="sequence",
-                        object_id=query_feature_id,
-                    ).subject_id
-                    self.store_feature_relationship(
-                        query_feature_id=query_parent_feature_id,
-                        subject_feature_id=subject_feature_id,
+            feature_pairs.append(feature_ids)
+        self.store_functional_annotations(feature_pairs)
+
+    def store_functional_annotations(
+        self, feature_pairs: List[Tuple[int, int]]
+    ) -> None:
+        """Transfer the subjects' annotation to the queries (InterproScan).
+
+        A polypeptide's annotation is transferred to its mRNA as well.
+        """
+        if self.input_format != "interproscan-xml" or not feature_pairs:
+            return None
+        self.store_feature_relationships(
+            feature_pairs, parents=self.so_query == "polypeptide"
+        )
+
+    def store_bio_searchio_query_results(
+        self, query_results: List[query.QueryResult]
+    ) -> None:
+        """Store the HSPs of many query results with a few COPY statements.
+
+        The match_part features, their analysisfeatures and featurelocs are
+        the same rows store_match_part writes, but the whole batch is written
+        in a single transaction.
+        """
+        match_parts = list()
+        for query_result in query_results:
+            for hsp_item in query_result.hsps:
+                feature_ids = self.retrieve_features_from_hsp(hsp_item)
+                if feature_ids is None:
+                    continue
+                match_parts.append(
+                    feature_ids
+                    + (
+                        getattr(hsp_item, "ident_num", None),
+                        getattr(hsp_item, "bitscore_raw", None),
+                        getattr(hsp_item, "bitscore", None),
+                        getattr(hsp_item, "evalue", None),
+                        hsp_item.query_start,
+                        hsp_item.query_end,
+                        hsp_item.hit_start,
+                        hsp_item.hit_end,
                     )
+                )
+        if not match_parts:
+            return None
+
+        try:
+            with transaction.atomic():
+                self.write_match_parts(match_parts)
+        except (IntegrityError, DataError) as e:
+            raise ImportingError(str(e), file=self.filename)
+
+        self.store_functional_annotations(
+            [match_part[:2] for match_part in match_parts]
+        )
+
+    def write_match_parts(self, match_parts: List[Tuple]) -> None:
+        """Write the match_part features of a batch and their dependent rows."""
+        feature_ids = reserve_ids("feature", "feature_id", len(match_parts))
+        now = datetime.now(timezone.utc)
+        organism_id = self.org_query.organism_id
+        type_id = self.so_term_match_part.cvterm_id
+        analysis_id = self.analysis.analysis_id
+        features = list()
+        analysisfeatures = list()
+        featurelocs = list()
+        for feature_id, match_part in zip(feature_ids, match_parts):
+            (
+                query_feature_id,
+                subject_feature_id,
+                identity,
+                rawscore,
+                normscore,
+                significance,
+                query_start,
+                query_end,
+                subject_start,
+                subject_end,
+            ) = match_part
+            uniquename = self.get_match_part_uniquename(
+                query_feature_id, subject_feature_id
+            )
+            features.append(
+                (feature_id, organism_id, uniquename, type_id, True, False, now, now)
+            )
+            analysisfeatures.append(
+                (feature_id, analysis_id, rawscore, normscore, significance, identity)
+            )
+            featurelocs.append(
+                (
+                    feature_id,
+                    query_feature_id,
+                    query_start,
+                    False,
+                    query_end,
+                    False,
+                    0,
+                    0,
+                )
+            )
+            featurelocs.append(
+                (
+                    feature_id,
+                    subject_feature_id,
+                    subject_start,
+                    False,
+                    subject_end,
+                    False,
+                    0,
+                    1,
+                )
+            )
+
+        copy_rows(
+            "feature",
+            (
+                "feature_id",
+                "organism_id",
+                "uniquename",
+                "type_id",
+                "is_analysis",
+                "is_obsolete",
+                "timeaccessioned",
+                "timelastmodified",
+            ),
+            features,
+        )
+        copy_rows(
+            "analysisfeature",
+            (
+                "feature_id",
+                "analysis_id",
+                "rawscore",
+                "normscore",
+                "significance",
+                "identity",
+            ),
+            analysisfeatures,
+        )
+        copy_rows(
+            "featureloc",
+            (
+                "feature_id",
+                "srcfeature_id",
+                "fmin",
+                "is_fmin_partial",
+                "fmax",
+                "is_fmax_partial",
+                "locgroup",
+                "rank",
+            ),
+            featurelocs,
+        )
@@ -0,0 +1,97 @@
+# Copyright 2026 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Parallel processing helpers shared by the loading commands."""
+
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple, Type
+
+from django.db import connections
+from tqdm import tqdm
+
+
+def process_pool(processes: int) -> ProcessPoolExecutor:
+    """Return a pool of forked worker processes.
+
+    A database connection can't be shared across processes, so the parent's
+    connections are closed before any worker is forked: every worker opens its
+    own on the first query, and the parent reconnects transparently once it
+    touches the database again. The parent must not query the database while
+    the pool is running, since workers are forked on demand.
+
+    Fork is requested explicitly (it is no longer the default start method in
+    recent Python versions) so workers inherit the configured Django settings.
+    """
+    connections.close_all()
+    return ProcessPoolExecutor(
+        max_workers=processes, mp_context=multiprocessing.get_context("fork")
+    )
+
+
+def run_batch(
+    function: Callable[..., Any],
+    batch: List[Sequence],
+    ignore: Tuple[Type[Exception], ...],
+) -> List[Exception]:
+    """Call function for each item of a batch, collecting ignored errors."""
+    ignored = list()
+    for args in batch:
+        try:
+            function(*args)
+        except ignore as e:
+            ignored.append(e)
+    return ignored
+
+
+def stream_tasks(
+    function: Callable[..., Any],
+    items: Iterable[Sequence],
+    cpu: int = 1,
+    batch_size: int = 100,
+    ignore: Tuple[Type[Exception], ...] = (),
+    total: int = None,
+    verbosity: int = 1,
+    weight: Callable[[Sequence], int] = None,
+) -> List[Exception]:
+    """Call function(*item) for each item with a pool of threads.
+
+    Items are consumed lazily and sent to the pool in batches of batch_size;
+    at most two batches per thread are pending, so reading the input waits
+    for the pool and memory doesn't grow with the input size. The first
+    error stops reading, cancels the pending batches and is raised once the
+    running ones finish. Errors of the ignore types don't stop the run, and
+    are returned instead.
+
+    Each item advances the progress bar by one, or by weight(item) when the
+    items are themselves batches of what total counts.
+    """
+    iterator = iter(items)
+    ignored: List[Exception] = list()
+    pending: Dict[Future, int] = dict()
+    progress = tqdm(total=total, disable=verbosity == 0)
+
+    def collect() -> None:
+        done = wait(pending, return_when=FIRST_COMPLETED).done
+        for task in done:
+            ignored.extend(task.result())
+            progress.update(pending.pop(task))
+
+    pool = ThreadPoolExecutor(max_workers=cpu)
+    try:
+        for batch in iter(lambda: list(islice(iterator, batch_size)), []):
+            if len(pending) >= cpu * 2:
+                collect()
+            size = len(batch) if weight is None else sum(map(weight, batch))
+            pending[pool.submit(run_batch, function, batch, ignore)] = size
+        while pending:
+            collect()
+    finally:
+        pool.shutdown(cancel_futures=True)
+        progress.close()
+    return ignored
@@ -7,7 +7,7 @@
 """Check IDs."""
 
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
-from machado.loaders.common import retrieve_feature_id, FileValidator, retrieve_organism
+from machado.loaders.common import AccessionResolver, FileValidator, retrieve_organism
 from django.core.management.base import BaseCommand
 from machado.management.commands._base import HistoryCommandMixin
 
@@ -48,15 +48,14 @@ class Command(HistoryCommandMixin, BaseCommand):
 
         FileValidator().validate(file)
         organism = retrieve_organism(organism)
+        resolver = AccessionResolver()
         f = open(file, "r+")
         for line in f.readlines():
             notfound = set()
             accession = line.split()[0]
             for soterm in soterms:
                 try:
-                    retrieve_feature_id(
-                        accession=accession, soterm=soterm, organism=organism
-                    )
+                    resolver.resolve(accession, soterm, organism)
                     break
                 except ObjectDoesNotExist:
                     notfound.add(soterm)
@@ -11,9 +11,12 @@ from machado.models import Cv, Db, Dbxref, Cvterm
 import os
 import re
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
+from typing import Iterator, List, TextIO, Tuple
 
 from django.core.management.base import BaseCommand, CommandError
 from machado.management.commands._base import HistoryCommandMixin
+from machado.management.commands._parallel import stream_tasks
 from django.db.utils import IntegrityError
 from tqdm import tqdm
 
@@ -56,6 +59,18 @@ class Command(HistoryCommandMixin, BaseCommand):
             default=1,
             type=int,
         )
+        parser.add_argument(
+            "--bulk",
+            help="Resolve the members of many clusters at once and write the "
+            "featureprops with COPY",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--batch-size",
+            help="Number of clusters per batch in --bulk mode (default: 5000)",
+            default=5000,
+            type=int,
+        )
 
     def handle(
         self,
@@ -63,6 +78,8 @@ class Command(HistoryCommandMixin, BaseCommand):
         organism: str,
         soterm: str = "mRNA",
         cpu: int = 1,
+        bulk: bool = False,
+        batch_size: int = 5000,
         verbosity: int = 0,
         **options,
     ):
@@ -102,10 +119,53 @@ class Command(HistoryCommandMixin, BaseCommand):
             source=source, filename=filename, organism=organism
         )
 
-        pool = ThreadPoolExecutor(max_workers=cpu)
+        if bulk:
+            records = self.read_clusters(clusters)
+            stream_tasks(
+                featureloader.store_feature_group_batch,
+                (
+                    (batch, cvterm_cluster.cvterm_id, soterm, organism)
+                    for batch in iter(lambda: list(islice(records, batch_size)), [])
+                ),
+                cpu=cpu,
+                batch_size=1,
+                verbosity=verbosity,
+            )
+            clusters.close()
+        else:
+            pool = ThreadPoolExecutor(max_workers=cpu)
+            for name, members in tqdm(
+                self.read_clusters(clusters),
+                total=get_num_lines(file),
+                disable=verbosity == 0,
+            ):
+                tasks.append(
+                    pool.submit(
+                        featureloader.store_feature_groups,
+                        group=members,
+                        organism=organism,
+                        soterm=soterm,
+                        term=cvterm_cluster.cvterm_id,
+                        value=name,
+                    )
+                )
+            if verbosity > 0:
+                self.stdout.write("Loading data...")
+            for task in tqdm(
+                as_completed(tasks), total=len(tasks), disable=verbosity == 0
+            ):
+                if task.result():
+                    raise (task.result())
+            pool.shutdown()
+        if verbosity > 0:
+            self.stdout.write(
+                self.style.SUCCESS("Successfully processed {}".format(filename))
+            )
+
+    def read_clusters(self, clusters: TextIO) -> Iterator[Tuple[str, List[str]]]:
+        """Read the (name, members) groups of a clusters file."""
         # each line is an coexpression cluster group
-        for line in tqdm(clusters, total=get_num_lines(file), disable=verbosity == 0):
-            name = ""
+        for line in clusters:
             fields = re.split(r"\s+", line.strip())
             nfields = len(fields)
             FieldsValidator().validate(nfields, fields)
@@ -115,25 +175,4 @@ class Command(HistoryCommandMixin, BaseCommand):
             else:
                 raise CommandError("Invalid cluster identification format in file.")
             # remove cluster name before loading
-            fields.pop(0)
-            # get cvterm for correlation
-            tasks.append(
-                pool.submit(
-                    featureloader.store_feature_groups,
-                    group=fields,
-                    organism=organism,
-                    soterm=soterm,
-                    term=cvterm_cluster.cvterm_id,
-                    value=name,
-                )
-            )
-        if verbosity > 0:
-            self.stdout.write("Loading data...")
-        for task in tqdm(as_completed(tasks), total=len(tasks), disable=verbosity == 0):
-            if task.result():
-                raise (task.result())
-        pool.shutdown()
-        if verbosity > 0:
-            self.stdout.write(
-                self.style.SUCCESS("Successfully processed {}".format(filename))
-            )
+            yield name, fields[1:]
@@ -11,13 +11,18 @@ from machado.models import Cvterm
 import os
 import re
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
+from typing import Iterator, List, TextIO, Tuple
 
+import numpy as np
 from django.core.management.base import BaseCommand
 from machado.management.commands._base import HistoryCommandMixin
+from machado.management.commands._parallel import stream_tasks
 from tqdm import tqdm
 
 from machado.loaders.common import FileValidator, FieldsValidator, retrieve_organism
 from machado.loaders.common import get_num_lines
+from machado.loaders.exceptions import ImportingError
 from machado.loaders.feature import FeatureLoader
 
 
@@ -50,6 +55,18 @@ class Command(HistoryCommandMixin, BaseCommand):
             default=1,
             type=int,
         )
+        parser.add_argument(
+            "--bulk",
+            help="Stream the pairs in batches written with COPY instead of one "
+            "pair at a time",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--batch-size",
+            help="Number of pairs per batch in --bulk mode (default: 50000)",
+            default=50000,
+            type=int,
+        )
 
     def handle(
         self,
@@ -57,6 +74,8 @@ class Command(HistoryCommandMixin, BaseCommand):
         organism: str,
         cpu: int = 1,
         soterm: str = "mRNA",
+        bulk: bool = False,
+        batch_size: int = 50000,
         verbosity: int = 0,
         **options,
     ):
@@ -67,7 +86,7 @@ class Command(HistoryCommandMixin, BaseCommand):
 
         FileValidator().validate(file)
         organism = retrieve_organism(organism)
-        pairs = open(file, "r")
+        pairs_file = open(file, "r")
         # retrieve only the file name
 
         cvterm_corel = Cvterm.objects.get(
@@ -78,38 +97,90 @@ class Command(HistoryCommandMixin, BaseCommand):
         featureloader = FeatureLoader(
             source=source, filename=filename, organism=organism
         )
-        size = get_num_lines(file)
-        # every cpu should be able to handle 5 tasks
-        chunk = cpu * 5
-        with ThreadPoolExecutor(max_workers=cpu) as pool:
-            tasks = list()
-            for line in tqdm(pairs, total=size, disable=verbosity == 0):
-                nfields = 3
-                fields = re.split(r"\s+", line.rstrip())
-                FieldsValidator().validate(nfields, fields)
-                # get corrected PCC value (last item from fields list)
-                value = float(fields.pop()) + 0.7
-                tasks.append(
-                    pool.submit(
-                        featureloader.store_feature_pairs,
-                        pair=fields,
-                        soterm=soterm,
-                        term=cvterm_corel,
-                        value=value,
+        if bulk:
+            stream_tasks(
+                featureloader.store_feature_pair_batch,
+                (
+                    (pairs, values, cvterm_corel, soterm)
+                    for pairs, values in self.read_pairs(pairs_file, batch_size)
+                ),
+                cpu=cpu,
+                batch_size=1,
+                verbosity=verbosity,
+            )
+            pairs_file.close()
+            unresolved = featureloader.unresolved_relationships
+            if unresolved:
+                self.stdout.write(
+                    self.style.WARNING(
+                        "{} pairs not stored, feature not registered:".format(
+                            len(unresolved)
+                        )
                     )
                 )
-                if len(tasks) >= chunk:
+                for subject_id, object_id in unresolved[:20]:
+                    self.stdout.write("  {}/{}".format(subject_id, object_id))
+                if len(unresolved) > 20:
+                    self.stdout.write("  ... and {} more".format(len(unresolved) - 20))
+        else:
+            size = get_num_lines(file)
+            # every cpu should be able to handle 5 tasks
+            chunk = cpu * 5
+            with ThreadPoolExecutor(max_workers=cpu) as pool:
+                tasks = list()
+                for line in tqdm(pairs_file, total=size, disable=verbosity == 0):
+                    nfields = 3
+                    fields = re.split(r"\s+", line.rstrip())
+                    FieldsValidator().validate(nfields, fields)
+                    # get corrected PCC value (last item from fields list)
+                    value = float(fields.pop()) + 0.7
+                    tasks.append(
+                        pool.submit(
+                            featureloader.store_feature_pairs,
+                            pair=fields,
+                            soterm=soterm,
+                            term=cvterm_corel,
+                            value=value,
+                        )
+                    )
+                    if len(tasks) >= chunk:
+                        for task in as_completed(tasks):
+                            if task.result():
+                                raise (task.result())
+                        tasks.clear()
+                else:
                     for task in as_completed(tasks):
                         if task.result():
                             raise (task.result())
                     tasks.clear()
-            else:
-                for task in as_completed(tasks):
-                    if task.result():
-                        raise (task.result())
-                tasks.clear()
-            pool.shutdown()
+                pool.shutdown()
         if verbosity > 0:
             self.stdout.write(
                 self.style.SUCCESS("Successfully processed {}".format(filename))
             )
+
+    def read_pairs(
+        self, pairs_file: TextIO, batch_size: int
+    ) -> Iterator[Tuple[List[Tuple[str, str]], np.ndarray]]:
+        """Read the pairs in batches, with their corrected PCC values."""
+        line = 0
+        for lines in iter(lambda: list(islice(pairs_file, batch_size)), []):
+            pairs = list()
+            values = list()
+            for text in lines:
+                line += 1
+                fields = re.split(r"\s+", text.rstrip())
+                try:
+                    FieldsValidator().validate(3, fields)
+                except ImportingError as e:
+                    raise ImportingError(
+                        e.message, file=os.path.basename(pairs_file.name), line=line
+                    )
+                pairs.append((fields[0], fields[1]))
+                values.append(fields[2])
+            try:
+                pcc = np.array(values, dtype=np.float64)
+            except ValueError as e:
+                raise ImportingError(str(e), file=os.path.basename(pairs_file.name))
+            # the file has PCC - 0.7 values
+            yield pairs, pcc + 0.7
@@ -0,0 +1,47 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Load cvtermpath."""
+
+from django.core.management.base import BaseCommand
+from machado.management.commands._base import HistoryCommandMixin
+
+from machado.loaders.ontology import store_cvtermpath
+from machado.models import Cv, CvtermRelationship
+
+
+class Command(HistoryCommandMixin, BaseCommand):
+    """Load cvtermpath."""
+
+    help = "Store the transitive closure of the ontology terms (cvtermpath)"
+
+    def add_arguments(self, parser):
+        """Define the arguments."""
+        parser.add_argument(
+            "--name",
+            help="Name of the ontology (cv.name); default: every ontology "
+            "with relationships",
+            required=False,
+            action="append",
+        )
+
+    def handle(self, name: list = None, verbosity: int = 1, **options):
+        """Execute the main function."""
+        if not name:
+            name = Cv.objects.filter(
+                Cvterm_cv_Cv__in=CvtermRelationship.objects.values("subject_id")
+            ).values_list("name", flat=True)
+        name = sorted(set(name))
+
+        if verbosity > 0:
+            self.stdout.write("Computing paths: {}...".format(", ".join(name)))
+
+        count = store_cvtermpath(name)
+
+        if verbosity > 0:
+            self.stdout.write(
+                self.style.SUCCESS("Successfully stored {} paths.".format(count))
+            )
@@ -7,11 +7,12 @@
 """Load FASTA file."""
 
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
 
 from Bio import SeqIO
 from django.core.management.base import BaseCommand
 from machado.management.commands._base import HistoryCommandMixin
+from machado.management.commands._parallel import stream_tasks
 from tqdm import tqdm
 
 from machado.loaders.common import FileValidator, retrieve_organism
@@ -52,6 +53,19 @@ class Command(HistoryCommandMixin, BaseCommand):
             default=1,
             type=int,
         )
+        parser.add_argument(
+            "--batch-size",
+            help="Number of sequences stored per batch (default: 500)",
+            default=500,
+            type=int,
+        )
+        parser.add_argument(
+            "--stream",
+            help="Read the sequences in fixed-size blocks and copy them to the "
+            "database while reading, so long chromosomes don't need to fit in "
+            "memory (--cpu and --batch-size are ignored)",
+            action="store_true",
+        )
         parser.add_argument(
             "--description",
             help="Source description for the FASTA source",
@@ -76,6 +90,8 @@ class Command(HistoryCommandMixin, BaseCommand):
         soterm: str,
         nosequence: bool = False,
         cpu: int = 1,
+        batch_size: int = 500,
+        stream: bool = False,
         description: str = None,
         url: str = None,
         doi: str = None,
@@ -97,22 +113,34 @@ class Command(HistoryCommandMixin, BaseCommand):
             url=url,
             doi=doi,
         )
-        fasta_sequences = SeqIO.parse(open(file), "fasta")
-
-        pool = ThreadPoolExecutor(max_workers=cpu)
-        tasks = list()
-        for fasta in fasta_sequences:
-            tasks.append(
-                pool.submit(
-                    sequence_file.store_biopython_seq_record, fasta, soterm, nosequence
-                )
-            )
         if verbosity > 0:
             self.stdout.write("Loading data...")
-        for task in tqdm(as_completed(tasks), total=len(tasks), disable=verbosity == 0):
-            if task.result():
-                raise (task.result())
-        pool.shutdown()
+        with open(file) as fasta_file:
+            total = None
+            if verbosity > 0:
+                total = sum(1 for line in fasta_file if line.startswith(">"))
+                fasta_file.seek(0)
+            if stream:
+                for _ in tqdm(
+                    sequence_file.store_fasta_stream(fasta_file, soterm, nosequence),
+                    total=total,
+                    disable=verbosity == 0,
+                ):
+                    pass
+            else:
+                records = SeqIO.parse(fasta_file, "fasta")
+                stream_tasks(
+                    sequence_file.store_biopython_seq_records,
+                    (
+                        (batch, soterm, nosequence)
+                        for batch in iter(lambda: list(islice(records, batch_size)), [])
+                    ),
+                    cpu=cpu,
+                    batch_size=1,
+                    total=total,
+                    verbosity=verbosity,
+                    weight=lambda args: len(args[0]),
+                )
 
         if verbosity > 0:
             self.stdout.write(
@@ -7,12 +7,11 @@
 """Load feature annotation file."""
 
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.management.base import BaseCommand, CommandError
 from machado.management.commands._base import HistoryCommandMixin
-from tqdm import tqdm
+from machado.management.commands._parallel import stream_tasks
 
 from machado.loaders.common import FileValidator, retrieve_organism
 from machado.loaders.exceptions import ImportingError
@@ -95,40 +94,29 @@ class Command(HistoryCommandMixin, BaseCommand):
         feature_file = FeatureLoader(
             filename=filename, source="GFF_source", organism=organism
         )
-        pool = ThreadPoolExecutor(max_workers=cpu)
-        tasks = list()
-        not_found = list()
-
-        # Load the annotation file
-        with open(file) as tab_file:
-            for line in tab_file:
-                if line.startswith("#"):
-                    continue
-                feature, annotation = line.strip().split("\t")
-                tasks.append(
-                    pool.submit(
-                        feature_file.store_feature_annotation,
-                        feature,
-                        soterm,
-                        cvterm,
-                        annotation,
-                        doi,
-                    )
-                )
-
         if verbosity > 0:
             self.stdout.write("Loading data...")
 
-        for task in tqdm(as_completed(tasks), total=len(tasks), disable=verbosity == 0):
+        # Load the annotation file
+        with open(file) as tab_file:
+            rows = (
+                line.strip().split("\t")
+                for line in tab_file
+                if not line.startswith("#")
+            )
             try:
-                task.result()
-            except ObjectDoesNotExist as e:
-                not_found.append(e)
-                if not ignorenotfound:
-                    raise CommandError(e)
-            except ImportingError as e:
+                not_found = stream_tasks(
+                    feature_file.store_feature_annotation,
+                    (
+                        (feature, soterm, cvterm, annotation, doi)
+                        for feature, annotation in rows
+                    ),
+                    cpu=cpu,
+                    ignore=(ObjectDoesNotExist,) if ignorenotfound else (),
+                    verbosity=verbosity,
+                )
+            except (ObjectDoesNotExist, ImportingError) as e:
                 raise CommandError(e)
-        pool.shutdown()
 
         if verbosity > 0:
             self.stdout.write("List of features not found:")
@@ -7,12 +7,12 @@
 """Load feature sequence file."""
 
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
 
 from Bio import SeqIO
 from django.core.management.base import BaseCommand
 from machado.management.commands._base import HistoryCommandMixin
-from tqdm import tqdm
+from machado.management.commands._parallel import stream_tasks
 
 from machado.loaders.common import FileValidator, retrieve_organism
 from machado.loaders.sequence import SequenceLoader
@@ -46,6 +46,18 @@ class Command(HistoryCommandMixin, BaseCommand):
             default=1,
             type=int,
         )
+        parser.add_argument(
+            "--bulk",
+            help="Apply the sequences in batches with a single UPDATE each, "
+            "reporting the ids that match no feature instead of failing",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--batch-size",
+            help="Number of sequences per batch in --bulk mode (default: 1000)",
+            default=1000,
+            type=int,
+        )
 
     def handle(
         self,
@@ -54,6 +66,8 @@ class Command(HistoryCommandMixin, BaseCommand):
         organism: str,
         verbosity: int = 1,
         cpu: int = 1,
+        bulk: bool = False,
+        batch_size: int = 1000,
         **options,
     ):
         """Execute the main function."""
@@ -65,20 +79,42 @@ class Command(HistoryCommandMixin, BaseCommand):
         if verbosity > 0:
             self.stdout.write("Processing file: {}".format(filename))
 
-        fasta_sequences = SeqIO.parse(open(file), "fasta")
-        pool = ThreadPoolExecutor(max_workers=cpu)
-        tasks = list()
-        for fasta in fasta_sequences:
-            tasks.append(
-                pool.submit(sequence_file.add_sequence_to_feature, fasta, soterm)
-            )
         if verbosity > 0:
             self.stdout.write("Loading data...")
-        for task in tqdm(as_completed(tasks), total=len(tasks), disable=verbosity == 0):
-            if task.result():
-                e = task.result()
-                raise (e)
-        pool.shutdown()
+        with open(file) as fasta_file:
+            records = SeqIO.parse(fasta_file, "fasta")
+            if bulk:
+                stream_tasks(
+                    sequence_file.add_sequences_to_features,
+                    (
+                        (batch, soterm)
+                        for batch in iter(lambda: list(islice(records, batch_size)), [])
+                    ),
+                    cpu=cpu,
+                    batch_size=1,
+                    verbosity=verbosity,
+                )
+            else:
+                stream_tasks(
+                    sequence_file.add_sequence_to_feature,
+                    ((fasta, soterm) for fasta in records),
+                    cpu=cpu,
+                    verbosity=verbosity,
+                )
+
+        unmatched = sequence_file.unmatched
+        if unmatched:
+            self.stdout.write(
+                self.style.WARNING(
+                    "{} sequences not stored, feature not registered:".format(
+                        len(unmatched)
+                    )
+                )
+            )
+            for accession in unmatched[:20]:
+                self.stdout.write("  {}".format(accession))
+            if len(unmatched) > 20:
+                self.stdout.write("  ... and {} more".format(len(unmatched) - 20))
 
         if verbosity > 0:
             self.stdout.write(
@@ -6,16 +6,15 @@
 
 """Load Gene Ontology."""
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from multiprocessing import Lock
 
 from django.core.management.base import BaseCommand
 from machado.management.commands._base import HistoryCommandMixin
+from machado.management.commands._parallel import stream_tasks
 from obonet import read_obo
-from tqdm import tqdm
 
 from machado.loaders.common import FileValidator
-from machado.loaders.ontology import OntologyLoader
+from machado.loaders.ontology import OntologyLoader, store_cvtermpath
 
 
 class Command(HistoryCommandMixin, BaseCommand):
@@ -38,8 +37,28 @@ class Command(HistoryCommandMixin, BaseCommand):
             default=1,
             type=int,
         )
+        parser.add_argument(
+            "--bulk",
+            help="Store all the terms and relationships with a few multi-row "
+            "statements instead of one term at a time",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--cvtermpath",
+            help="Store the transitive closure of the terms (cvtermpath) "
+            "after loading",
+            action="store_true",
+        )
 
-    def handle(self, file: str, cpu: int = 1, verbosity: int = 1, **options):
+    def handle(
+        self,
+        file: str,
+        cpu: int = 1,
+        bulk: bool = False,
+        cvtermpath: bool = False,
+        verbosity: int = 1,
+        **options,
+    ):
         """Execute the main function."""
         FileValidator().validate(file)
         # Load the ontology file
@@ -64,37 +83,58 @@ class Command(HistoryCommandMixin, BaseCommand):
         if verbosity > 0:
             self.stdout.write("Loading typedefs ({} threads)...".format(cpu))
 
-        pool = ThreadPoolExecutor(max_workers=cpu)
-        tasks = list()
-        for typedef in G.graph["typedefs"]:
-            tasks.append(pool.submit(ontology.store_type_def, typedef))
-        for task in tqdm(as_completed(tasks), total=len(tasks), disable=verbosity == 0):
-            if task.result():
-                raise (task.result())
+        stream_tasks(
+            ontology.store_type_def,
+            ((typedef,) for typedef in G.graph["typedefs"]),
+            cpu=cpu,
+            total=len(G.graph["typedefs"]),
+            verbosity=verbosity,
+        )
 
-        # Load the cvterms
-        if verbosity > 0:
-            self.stdout.write("Loading terms ({} threads)...".format(cpu))
+        if bulk:
+            if verbosity > 0:
+                self.stdout.write("Loading terms...")
+            ontology.store_terms(G.nodes(data=True))
+            if verbosity > 0:
+                self.stdout.write("Loading relationships...")
+            ontology.store_relationships(G.edges(keys=True))
+        else:
+            # Load the cvterms
+            if verbosity > 0:
+                self.stdout.write("Loading terms ({} threads)...".format(cpu))
+
+            lock = Lock()
+            stream_tasks(
+                ontology.store_term,
+                ((n, data, lock) for n, data in G.nodes(data=True)),
+                cpu=cpu,
+                total=G.number_of_nodes(),
+                verbosity=verbosity,
+            )
 
-        lock = Lock()
-        tasks = list()
-        for n, data in G.nodes(data=True):
-            tasks.append(pool.submit(ontology.store_term, n, data, lock))
-        for task in tqdm(as_completed(tasks), total=len(tasks), disable=verbosity == 0):
-            if task.result():
-                raise (task.result())
+            # Load the relationship between cvterms
+            if verbosity > 0:
+                self.stdout.write("Loading relationships ({} threads)...".format(cpu))
 
-        # Load the relationship between cvterms
-        if verbosity > 0:
-            self.stdout.write("Loading relationships ({} threads)...".format(cpu))
-
-        tasks = list()
-        for u, v, type in G.edges(keys=True):
-            tasks.append(pool.submit(ontology.store_relationship, u, v, type))
-        for task in tqdm(as_completed(tasks), total=len(tasks), disable=verbosity == 0):
-            if task.result():
-                raise (task.result())
-        pool.shutdown()
+            stream_tasks(
+                ontology.store_relationship,
+                G.edges(keys=True),
+                cpu=cpu,
+                total=G.number_of_edges(),
+                verbosity=verbosity,
+            )
+
+        if cvtermpath:
+            if verbosity > 0:
+                self.stdout.write("Loading paths...")
+            store_cvtermpath(
+                [
+                    "biological_process",
+                    "molecular_function",
+                    "cellular_component",
+                    "external",
+                ]
+            )
 
         if verbosity > 0:
             self.stdout.write(
@@ -8,15 +8,63 @@
 
 import os
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Set, Tuple
 
 import pysam
 from django.core.management.base import BaseCommand
 from machado.management.commands._base import HistoryCommandMixin
+from machado.management.commands._parallel import process_pool
 from tqdm import tqdm
 
-from machado.loaders.common import FileValidator, get_num_lines, retrieve_organism
+from machado.loaders.common import FileValidator, ReferenceCache
+from machado.loaders.common import get_num_lines, retrieve_organism
 from machado.loaders.exceptions import ImportingError
-from machado.loaders.feature import FeatureLoader
+from machado.loaders.feature import FeatureIdMap, FeatureLoader
+from machado.loaders.featurebulk import FeatureBulkLoader
+from machado.models import Organism
+
+
+def store_contig_features(
+    file: str,
+    index_file: str,
+    contig: str,
+    organism: Organism,
+    doi: str,
+    ignore: List[str],
+    qtl: bool,
+    bulk: bool,
+    batch_size: int,
+    refcache: ReferenceCache = None,
+) -> Tuple[List[Dict[str, str]], Set[str], FeatureIdMap]:
+    """Load the features of a single contig in a worker process."""
+    loader_class = FeatureBulkLoader if bulk else FeatureLoader
+    feature_file = loader_class(
+        filename=os.path.basename(file),
+        source="GFF_SOURCE",
+        organism=organism,
+        doi=doi,
+        refcache=refcache,
+    )
+    batch = list()
+    tbx = pysam.TabixFile(filename=file, index=index_file)
+    for row in tbx.fetch(contig, parser=pysam.asGTF()):
+        if ignore is not None and row.feature in ignore:
+            continue
+        if bulk:
+            batch.append((None, row))
+            if len(batch) >= batch_size:
+                feature_file.store_tabix_GFF_features(batch, qtl)
+                batch = list()
+        else:
+            feature_file.store_tabix_GFF_feature(row, qtl)
+    if batch:
+        feature_file.store_tabix_GFF_features(batch, qtl)
+    tbx.close()
+    return (
+        feature_file.relationships,
+        feature_file.ignored_attrs,
+        feature_file.feature_ids,
+    )
 
 
 class Command(HistoryCommandMixin, BaseCommand):
@@ -64,6 +112,26 @@ class Command(HistoryCommandMixin, BaseCommand):
             default=1,
             type=int,
         )
+        parser.add_argument(
+            "--bulk",
+            help="Load the features in batches written with COPY instead of "
+            "one row at a time",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--batch-size",
+            help="Number of GFF rows per batch in --bulk mode, and of "
+            "relationships per insert (default: 5000)",
+            default=5000,
+            type=int,
+        )
+        parser.add_argument(
+            "--processes",
+            help="Number of worker processes; each one loads whole contigs "
+            "(default: 1)",
+            default=1,
+            type=int,
+        )
 
     def handle(
         self,
@@ -73,6 +141,9 @@ class Command(HistoryCommandMixin, BaseCommand):
         ignore: str = None,
         qtl: bool = False,
         cpu: int = 1,
+        bulk: bool = False,
+        batch_size: int = 5000,
+        processes: int = 1,
         verbosity: int = 1,
         **options,
     ):
@@ -96,12 +167,117 @@ class Command(HistoryCommandMixin, BaseCommand):
                 raise ImportingError(
                     "Required Tabix index file (.tbi or .csi) not found.", file=file
                 )
-        feature_file = FeatureLoader(
+        loader_class = FeatureBulkLoader if bulk else FeatureLoader
+        feature_file = loader_class(
             filename=filename, source="GFF_SOURCE", organism=organism, doi=doi
         )
+        if processes > 1:
+            # Tabix reads each reference sequence on its own, so the contigs
+            # are loaded in parallel by worker processes
+            with open(file) as tbx_file:
+                contigs = pysam.TabixFile(
+                    filename=tbx_file.name, index=index_file
+                ).contigs
+            pool = process_pool(processes)
+            tasks = [
+                pool.submit(
+                    store_contig_features,
+                    file,
+                    index_file,
+                    contig,
+                    organism,
+                    doi,
+                    ignore,
+                    qtl,
+                    bulk,
+                    batch_size,
+                    feature_file.refcache,
+                )
+                for contig in contigs
+            ]
+            try:
+                for task in tqdm(
+                    as_completed(tasks), total=len(tasks), disable=verbosity == 0
+                ):
+                    relationships, ignored_attrs, feature_ids = task.result()
+                    feature_file.relationships.extend(relationships)
+                    feature_file.ignored_attrs.update(ignored_attrs)
+                    feature_file.feature_ids.update(feature_ids)
+            finally:
+                pool.shutdown(cancel_futures=True)
+        else:
+            self.store_features(
+                feature_file,
+                file,
+                index_file,
+                ignore,
+                qtl,
+                cpu,
+                bulk,
+                batch_size,
+                verbosity,
+            )
+
+        if verbosity > 0:
+            self.stdout.write("Loading relationships...")
+
+        feature_file.feature_ids.sort()
         pool = ThreadPoolExecutor(max_workers=cpu)
         tasks = list()
 
+        relationships = feature_file.relationships
+        for start in range(0, len(relationships), batch_size):
+            end = start + batch_size
+            tasks.append(
+                pool.submit(feature_file.store_relationships, relationships[start:end])
+            )
+
+        for task in tqdm(as_completed(tasks), total=len(tasks), disable=verbosity == 0):
+            task.result()
+        pool.shutdown()
+
+        unresolved = feature_file.unresolved_relationships
+        if unresolved:
+            self.stdout.write(
+                self.style.WARNING(
+                    "{} relationships not stored, Parent/Feature not registered "
+                    "or ambiguous:".format(len(unresolved))
+                )
+            )
+            for object_id, subject_id in unresolved[:20]:
+                self.stdout.write("  {}/{}".format(object_id, subject_id))
+            if len(unresolved) > 20:
+                self.stdout.write("  ... and {} more".format(len(unresolved) - 20))
+
+        if feature_file.ignored_attrs is not None:
+            self.stdout.write(
+                self.style.WARNING(
+                    "Ignored attributes: {}".format(feature_file.ignored_attrs)
+                )
+            )
+
+        if verbosity > 0:
+            self.stdout.write(
+                self.style.SUCCESS("Successfully processed {}".format(filename))
+            )
+
+    def store_features(
+        self,
+        feature_file: FeatureLoader,
+        file: str,
+        index_file: str,
+        ignore: List[str],
+        qtl: bool,
+        cpu: int,
+        bulk: bool,
+        batch_size: int,
+        verbosity: int,
+    ) -> None:
+        """Load the GFF rows with a pool of threads."""
+        pool = ThreadPoolExecutor(max_workers=cpu)
+        tasks = list()
+        batch = list()
+
         chunk_size = cpu * 2
 
         # Load the GFF3 file
@@ -114,50 +290,32 @@ class Command(HistoryCommandMixin, BaseCommand):
             ):
                 if ignore is not None and row.feature in ignore:
                     continue
-                tasks.append(
-                    pool.submit(
-                        feature_file.store_tabix_GFF_feature, row, qtl, line=i + 1
+                if bulk:
+                    batch.append((i + 1, row))
+                    if len(batch) < batch_size:
+                        continue
+                    tasks.append(
+                        pool.submit(feature_file.store_tabix_GFF_features, batch, qtl)
+                    )
+                    batch = list()
+                else:
+                    tasks.append(
+                        pool.submit(
+                            feature_file.store_tabix_GFF_feature, row, qtl, line=i + 1
+                        )
                     )
-                )
 
                 if len(tasks) >= chunk_size:
                     for task in as_completed(tasks):
                         task.result()
                     tasks.clear()
             else:
+                if batch:
+                    tasks.append(
+                        pool.submit(feature_file.store_tabix_GFF_features, batch, qtl)
+                    )
                 for task in as_completed(tasks):
                     task.result()
                 tasks.clear()
 
         pool.shutdown()
-
-        if verbosity > 0:
-            self.stdout.write("Loading relationships...")
-
-        pool = ThreadPoolExecutor(max_workers=cpu)
-        tasks = list()
-
-        for item in feature_file.relationships:
-            tasks.append(
-                pool.submit(
-                    feature_file.store_relationship,
-                    item["subject_id"],
-                    item["object_id"],
-                )
-            )
-
-        for task in tqdm(as_completed(tasks), total=len(tasks), disable=verbosity == 0):
-            task.result()
-        pool.shutdown()
-
-        if feature_file.ignored_attrs is not None:
-            self.stdout.write(
-                self.style.WARNING(
-                    "Ignored attributes: {}".format(feature_file.ignored_attrs)
-                )
-            )
-
-        if verbosity > 0:
-            self.stdout.write(
-                self.style.SUCCESS("Successfully processed {}".format(filename))
-            )
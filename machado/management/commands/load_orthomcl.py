@@ -9,11 +9,12 @@
 from machado.models import Cv, Db, Dbxref, Cvterm
 import os
 import re
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
+from typing import Iterator, List, TextIO, Tuple
 
 from django.core.management.base import BaseCommand, CommandError
 from machado.management.commands._base import HistoryCommandMixin
-from tqdm import tqdm
+from machado.management.commands._parallel import stream_tasks
 
 from machado.loaders.common import FileValidator
 from machado.loaders.feature import MultispeciesFeatureLoader
@@ -35,17 +36,34 @@ class Command(HistoryCommandMixin, BaseCommand):
             default=1,
             type=int,
         )
+        parser.add_argument(
+            "--bulk",
+            help="Resolve the members of many groups at once and write the "
+            "featureprops with COPY",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--batch-size",
+            help="Number of groups per batch in --bulk mode (default: 5000)",
+            default=5000,
+            type=int,
+        )
 
-    def handle(self, file: str, cpu: int = 1, verbosity: int = 0, **options):
+    def handle(
+        self,
+        file: str,
+        cpu: int = 1,
+        bulk: bool = False,
+        batch_size: int = 5000,
+        verbosity: int = 0,
+        **options,
+    ):
         """Execute the main function."""
         FileValidator().validate(file)
         filename = os.path.basename(file)
         if verbosity > 0:
             self.stdout.write("Processing file: {}".format(filename))
         groups = open(file, "r")
-        # retrieve only the file name
-        pool = ThreadPoolExecutor(max_workers=cpu)
-        tasks = list()
         cv, created = Cv.objects.get_or_create(name="feature_property")
         ortho_db, created = Db.objects.get_or_create(name="ORTHOMCL_SOURCE")
         ortho_dbxref, created = Dbxref.objects.get_or_create(
@@ -64,41 +82,47 @@ class Command(HistoryCommandMixin, BaseCommand):
 
         source = "null"
         featureloader = MultispeciesFeatureLoader(source=source, filename=filename)
+        if verbosity > 0:
+            self.stdout.write("Loading data...")
+        if bulk:
+            records = self.read_groups(groups)
+            stream_tasks(
+                featureloader.store_feature_group_batch,
+                (
+                    (batch, cvterm_cluster.cvterm_id, soterm)
+                    for batch in iter(lambda: list(islice(records, batch_size)), [])
+                ),
+                cpu=cpu,
+                batch_size=1,
+                verbosity=verbosity,
+            )
+        else:
+            stream_tasks(
+                featureloader.store_feature_groups,
+                (
+                    (members, cvterm_cluster.cvterm_id, soterm, name)
+                    for name, members in self.read_groups(groups)
+                ),
+                cpu=cpu,
+                verbosity=verbosity,
+            )
+        groups.close()
+        if verbosity > 0:
+            self.stdout.write(
+                self.style.SUCCESS("Successfully processed {}".format(filename))
+            )
+
+    def read_groups(self, groups: TextIO) -> Iterator[Tuple[str, List[str]]]:
+        """Read the (name, members) orthologous groups of a cluster file."""
         # each line is an orthologous group
         for line in groups:
-            members = []
-            name = ""
             fields = re.split(r"\s+", line.strip())
 
             # cluster must have at least two fields, one cluster ID (name) and at least one member ID.
-            if len(fields) > 1:
-                name = fields[0]
-                fields.pop(0)
-                for field in fields:
-                    members.append(field)
-            else:
+            if len(fields) < 2:
                 raise CommandError(
                     "Invalid cluster file format. Please check the input file."
                 )
             # only orthologous groups with 2 or more members allowed
-            if len(members) > 1:
-                tasks.append(
-                    pool.submit(
-                        featureloader.store_feature_groups,
-                        soterm=soterm,
-                        group=members,
-                        term=cvterm_cluster.cvterm_id,
-                        value=name,
-                    )
-                )
-        if verbosity > 0:
-            self.stdout.write("Loading data...")
-        for task in tqdm(as_completed(tasks), total=len(tasks), disable=verbosity == 0):
-            if task.result():
-                e = task.result()
-                raise (e)
-        pool.shutdown()
-        if verbosity > 0:
-            self.stdout.write(
-                self.style.SUCCESS("Successfully processed {}".format(filename))
-            )
+            if len(fields) > 2:
+                yield fields[0], fields[1:]
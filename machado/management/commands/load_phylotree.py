@@ -49,18 +49,35 @@ class Command(HistoryCommandMixin, BaseCommand):
             default=1,
             type=int,
         )
+        parser.add_argument(
+            "--bulk",
+            help="Write all the nodes with COPY instead of one node at a time",
+            action="store_true",
+        )
 
     def walktree(self, node_id: int):
-        """Walk the tree setting left_idx and right_idx."""
+        """Walk the tree setting left_idx and right_idx.
+
+        The walk keeps its own stack of the nodes whose children are being
+        visited, so the depth of the tree isn't bound to the recursion limit.
+        """
         self.ctr += 1
         self.nodes[node_id]["left_idx"] = self.ctr
-        for child_id in self.nodes[node_id]["children"]:
-            if node_id == child_id:
-                self.nodes[node_id]["parent_id"] = None
-                continue
-            self.walktree(child_id)
-        self.ctr += 1
-        self.nodes[node_id]["right_idx"] = self.ctr
+        stack = [(node_id, iter(self.nodes[node_id]["children"]))]
+        while stack:
+            node_id, children = stack[-1]
+            for child_id in children:
+                if node_id == child_id:
+                    self.nodes[node_id]["parent_id"] = None
+                    continue
+                self.ctr += 1
+                self.nodes[child_id]["left_idx"] = self.ctr
+                stack.append((child_id, iter(self.nodes[child_id]["children"])))
+                break
+            else:
+                stack.pop()
+                self.ctr += 1
+                self.nodes[node_id]["right_idx"] = self.ctr
 
     def handle(
         self,
@@ -69,6 +86,7 @@ class Command(HistoryCommandMixin, BaseCommand):
         organismdb: str,
         verbosity: int = 1,
         cpu: int = 1,
+        bulk: bool = False,
         **options,
     ):
         """Execute the main function."""
@@ -110,53 +128,64 @@ class Command(HistoryCommandMixin, BaseCommand):
         if verbosity > 0:
             self.stdout.write("Loading data...")
 
-        pool = ThreadPoolExecutor(max_workers=cpu)
-        tasks = list()
-        # By setting the parent_id to None it's possible to load the
-        # nodes randomly and using threads.
-        try:
+        if bulk:
+            try:
+                phylotree.store_phylonodes(self.nodes)
+            except KeyError as e:
+                raise CommandError(
+                    "Could not calculate {}. Ensure the tree "
+                    "structure is valid and traversable.".format(e)
+                )
+        else:
+            pool = ThreadPoolExecutor(max_workers=cpu)
+            tasks = list()
+            # By setting the parent_id to None it's possible to load the
+            # nodes randomly and using threads.
+            try:
+                for key, data in self.nodes.items():
+                    tasks.append(
+                        pool.submit(
+                            phylotree.store_phylonode_record,
+                            tax_id=key,
+                            parent_id=None,
+                            level=data["level"],
+                            left_idx=data["left_idx"],
+                            right_idx=data["right_idx"],
+                        )
+                    )
+                for task in tqdm(
+                    as_completed(tasks), total=len(tasks), disable=verbosity == 0
+                ):
+                    if task.result():
+                        tax_id, phylonode = task.result()
+                        self.nodes[tax_id]["phylonode_id"] = phylonode.phylonode_id
+            except KeyError as e:
+                raise CommandError(
+                    "Could not calculate {}. Ensure the tree "
+                    "structure is valid and traversable.".format(e)
+                )
+
+            if verbosity > 0:
+                self.stdout.write("Loading node relationships...")
+            tasks = list()
+            # Load the nodes relationship info
             for key, data in self.nodes.items():
+                if data.get("parent_id") is None:
+                    continue
                 tasks.append(
                     pool.submit(
-                        phylotree.store_phylonode_record,
-                        tax_id=key,
-                        parent_id=None,
-                        level=data["level"],
-                        left_idx=data["left_idx"],
-                        right_idx=data["right_idx"],
+                        phylotree.update_parent_phylonode_id,
+                        data["phylonode_id"],
+                        data["parent_id"],
                     )
                 )
             for task in tqdm(
                 as_completed(tasks), total=len(tasks), disable=verbosity == 0
             ):
                 if task.result():
-                    tax_id, phylonode = task.result()
-                    self.nodes[tax_id]["phylonode_id"] = phylonode.phylonode_id
-        except KeyError as e:
-            raise CommandError(
-                "Could not calculate {}. Ensure the tree "
-                "structure is valid and traversable.".format(e)
-            )
-
-        if verbosity > 0:
-            self.stdout.write("Loading node relationships...")
-        tasks = list()
-        # Load the nodes relationship info
-        for key, data in self.nodes.items():
-            if data.get("parent_id") is None:
-                continue
-            tasks.append(
-                pool.submit(
-                    phylotree.update_parent_phylonode_id,
-                    data["phylonode_id"],
-                    data["parent_id"],
-                )
-            )
-        for task in tqdm(as_completed(tasks), total=len(tasks), disable=verbosity == 0):
-            if task.result():
-                e = task.result()
-                raise (e)
-        pool.shutdown()
+                    e = task.result()
+                    raise (e)
+            pool.shutdown()
 
         if verbosity > 0:
             self.stdout.write(self.style.SUCCESS("Operation completed successfully."))
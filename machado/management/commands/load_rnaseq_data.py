@@ -8,16 +8,20 @@
 
 import os
 import re
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
+from typing import Iterator, List, Optional, TextIO, Tuple
 
+import numpy as np
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.management.base import BaseCommand, CommandError
 from machado.management.commands._base import HistoryCommandMixin
-from tqdm import tqdm
+from machado.management.commands._parallel import stream_tasks
 
 from machado.loaders.analysis import AnalysisLoader
 from machado.loaders.common import FileValidator, FieldsValidator
+from machado.loaders.common import retrieve_organism
 from machado.loaders.exceptions import ImportingError
+from machado.models import Analysis
 
 
 class Command(HistoryCommandMixin, BaseCommand):
@@ -86,6 +90,18 @@ class Command(HistoryCommandMixin, BaseCommand):
             default=1,
             type=int,
         )
+        parser.add_argument(
+            "--bulk",
+            help="Read the matrix in blocks of rows and write the non-zero "
+            "scores with COPY instead of one cell at a time",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--batch-size",
+            help="Number of matrix rows per block in --bulk mode (default: 1000)",
+            default=1000,
+            type=int,
+        )
 
     def handle(
         self,
@@ -102,6 +118,8 @@ class Command(HistoryCommandMixin, BaseCommand):
         cpu: int = 1,
         verbosity: int = 0,
         ignorenotfound: bool = False,
+        bulk: bool = False,
+        batch_size: int = 1000,
         **options,
     ):
         """Execute the main function."""
@@ -112,80 +130,74 @@ class Command(HistoryCommandMixin, BaseCommand):
         # start reading file
         rnaseq_data = open(file, "r")
         # retrieve only the file name
-        header = 1
-        # analysis_list = defaultdict(list)
         analysis_list = list()
         # instantiate Loader
         analysis_file = AnalysisLoader()
-        pool = ThreadPoolExecutor(max_workers=cpu)
-        tasks = list()
-        not_found = list()
-        for line in rnaseq_data:
-            fields = re.split("\t", line.rstrip())
-            nfields = len(fields)
-            # validate fields within line
-            FieldsValidator().validate(nfields, fields)
-            if header:
-                # first element is the string "gene" - need to be removed
-                fields.pop(0)
-                for i in range(len(fields)):
-                    # parse field to get SRA ID. e.g.: SRR5167848.htseq
-                    # try to remove ".htseq" part of string
-                    string = re.match(r"(\w+)\.(\w+)", fields[i])
-                    assay = string.group(1)
-                    # store analysis
-                    analysis = analysis_file.store_analysis(
-                        program=program,
-                        sourcename=fields[i],
-                        programversion=programversion,
-                        timeexecuted=timeexecuted,
-                        algorithm=algorithm,
-                        name=assay,
-                        description=description,
-                        filename=filename,
-                    )
-                    # store quantification
-                    analysis_file.store_quantification(
-                        analysis=analysis, assayacc=assay, assaydb=assaydb
-                    )
-                    # finally, store each analysis in a list.
-                    analysis_list.insert(i, analysis)
-                header = 0
-            else:
-                # first element is the feature acc. "e.g.: AT2G44195.1.TAIR10"
-                feature_name = fields.pop(0)
-                for i in range(len(fields)):
-                    if norm:
-                        normscore = fields[i]
-                        rawscore = None
-                    else:
-                        normscore = None
-                        rawscore = fields[i]
-                    # store analysis feature for each value
-                    tasks.append(
-                        pool.submit(
-                            analysis_file.store_analysisfeature,
-                            analysis_list[i],
-                            feature_name,
-                            organism,
-                            rawscore,
-                            normscore,
-                        )
-                    )
+        fields = re.split("\t", rnaseq_data.readline().rstrip())
+        # validate fields within line
+        FieldsValidator().validate(len(fields), fields)
+        # first element is the string "gene" - need to be removed
+        fields.pop(0)
+        for i in range(len(fields)):
+            # parse field to get SRA ID. e.g.: SRR5167848.htseq
+            # try to remove ".htseq" part of string
+            string = re.match(r"(\w+)\.(\w+)", fields[i])
+            assay = string.group(1)
+            # store analysis
+            analysis = analysis_file.store_analysis(
+                program=program,
+                sourcename=fields[i],
+                programversion=programversion,
+                timeexecuted=timeexecuted,
+                algorithm=algorithm,
+                name=assay,
+                description=description,
+                filename=filename,
+            )
+            # store quantification
+            analysis_file.store_quantification(
+                analysis=analysis, assayacc=assay, assaydb=assaydb
+            )
+            # finally, store each analysis in a list.
+            analysis_list.insert(i, analysis)
 
         if verbosity > 0:
             self.stdout.write("Loading data...")
 
-        for task in tqdm(as_completed(tasks), total=len(tasks), disable=verbosity == 0):
-            try:
-                task.result()
-            except ObjectDoesNotExist as e:
-                not_found.append(e)
-                if not ignorenotfound:
-                    raise CommandError(e)
-            except ImportingError as e:
-                raise CommandError(e)
-        pool.shutdown()
+        try:
+            if bulk:
+                organism_obj = retrieve_organism(organism)
+                stream_tasks(
+                    analysis_file.store_analysisfeature_matrix,
+                    (
+                        (
+                            analysis_list,
+                            features,
+                            organism_obj,
+                            scores,
+                            norm,
+                            ignorenotfound,
+                        )
+                        for features, scores in self.read_blocks(
+                            rnaseq_data, len(analysis_list), batch_size, filename
+                        )
+                    ),
+                    cpu=cpu,
+                    batch_size=1,
+                    verbosity=verbosity,
+                )
+                not_found = analysis_file.not_found
+            else:
+                not_found = stream_tasks(
+                    analysis_file.store_analysisfeature,
+                    self.read_scores(rnaseq_data, analysis_list, organism, norm),
+                    cpu=cpu,
+                    ignore=(ObjectDoesNotExist,) if ignorenotfound else (),
+                    verbosity=verbosity,
+                )
+        except (ObjectDoesNotExist, ImportingError) as e:
+            raise CommandError(e)
+        rnaseq_data.close()
 
         if verbosity > 0:
             self.stdout.write("List of features not found:")
@@ -196,3 +208,55 @@ class Command(HistoryCommandMixin, BaseCommand):
             self.stdout.write(
                 self.style.SUCCESS("Successfully processed {}".format(filename))
             )
+
+    def read_scores(
+        self,
+        rnaseq_data: TextIO,
+        analysis_list: List[Analysis],
+        organism: str,
+        norm: int,
+    ) -> Iterator[Tuple[Analysis, str, str, Optional[str], Optional[str]]]:
+        """Read the analysisfeature arguments of each cell of the matrix."""
+        for line in rnaseq_data:
+            fields = re.split("\t", line.rstrip())
+            # validate fields within line
+            FieldsValidator().validate(len(fields), fields)
+            # first element is the feature acc. "e.g.: AT2G44195.1.TAIR10"
+            feature_name = fields.pop(0)
+            for i in range(len(fields)):
+                if norm:
+                    normscore = fields[i]
+                    rawscore = None
+                else:
+                    normscore = None
+                    rawscore = fields[i]
+                # store analysis feature for each value
+                yield analysis_list[i], feature_name, organism, rawscore, normscore
+
+    def read_blocks(
+        self, rnaseq_data: TextIO, nscores: int, batch_size: int, filename: str
+    ) -> Iterator[Tuple[List[str], np.ndarray]]:
+        """Read the matrix in blocks of rows.
+
+        Each block is yielded as the feature accessions and an array of their
+        scores, a row per feature and a column per sample.
+        """
+        line = 1
+        for lines in iter(lambda: list(islice(rnaseq_data, batch_size)), []):
+            features = list()
+            rows = list()
+            for text in lines:
+                line += 1
+                fields = re.split("\t", text.rstrip())
+                try:
+                    # the feature accession plus a score per sample
+                    FieldsValidator().validate(nscores + 1, fields)
+                except ImportingError as e:
+                    raise ImportingError(e.message, file=filename, line=line)
+                features.append(fields[0])
+                rows.append(fields[1:])
+            try:
+                scores = np.array(rows, dtype=np.float64)
+            except ValueError as e:
+                raise ImportingError(str(e), file=filename)
+            yield features, scores
@@ -12,7 +12,7 @@ from machado.management.commands._base import HistoryCommandMixin
 from tqdm import tqdm
 
 from machado.loaders.common import FileValidator
-from machado.loaders.ontology import OntologyLoader
+from machado.loaders.ontology import OntologyLoader, store_cvtermpath
 
 
 class Command(HistoryCommandMixin, BaseCommand):
@@ -29,8 +29,27 @@ class Command(HistoryCommandMixin, BaseCommand):
             required=True,
             type=str,
         )
+        parser.add_argument(
+            "--bulk",
+            help="Store all the terms and relationships with a few multi-row "
+            "statements instead of one term at a time",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--cvtermpath",
+            help="Store the transitive closure of the terms (cvtermpath) "
+            "after loading",
+            action="store_true",
+        )
 
-    def handle(self, file: str, verbosity: int = 1, **options):
+    def handle(
+        self,
+        file: str,
+        bulk: bool = False,
+        cvtermpath: bool = False,
+        verbosity: int = 1,
+        **options,
+    ):
         """Execute the main function."""
         FileValidator().validate(file)
         # Load the ontology file
@@ -58,18 +77,29 @@ class Command(HistoryCommandMixin, BaseCommand):
         if verbosity > 0:
             self.stdout.write("Loading terms...")
 
-        for n, data in tqdm(
-            G.nodes(data=True), disable=False if verbosity > 0 else True
-        ):
-            ontology.store_term(n, data)
+        if bulk:
+            ontology.store_terms(G.nodes(data=True))
+        else:
+            for n, data in tqdm(
+                G.nodes(data=True), disable=False if verbosity > 0 else True
+            ):
+                ontology.store_term(n, data)
 
         if verbosity > 0:
             self.stdout.write("Loading relationships...")
 
-        for u, v, type in tqdm(
-            G.edges(keys=True), disable=False if verbosity > 0 else True
-        ):
-            ontology.store_relationship(u, v, type)
+        if bulk:
+            ontology.store_relationships(G.edges(keys=True))
+        else:
+            for u, v, type in tqdm(
+                G.edges(keys=True), disable=False if verbosity > 0 else True
+            ):
+                ontology.store_relationship(u, v, type)
+
+        if cvtermpath:
+            if verbosity > 0:
+                self.stdout.write("Loading paths...")
+            store_cvtermpath([cv_name])
 
         if verbosity > 0:
             self.stdout.write(
@@ -7,12 +7,12 @@
 """Load similarity file."""
 
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
 
 from Bio import SearchIO
 from django.core.management.base import BaseCommand, CommandError
 from machado.management.commands._base import HistoryCommandMixin
-from tqdm import tqdm
+from machado.management.commands._parallel import stream_tasks
 
 from machado.loaders.common import FileValidator
 from machado.loaders.similarity import SimilarityLoader
@@ -78,6 +78,24 @@ class Command(HistoryCommandMixin, BaseCommand):
             default=1,
             type=int,
         )
+        parser.add_argument(
+            "--ignorenotfound",
+            help="Skip the HSPs whose query or subject feature is not found, "
+            "listing their ids at the end",
+            required=False,
+            action="store_true",
+        )
+        parser.add_argument(
+            "--bulk",
+            help="Store the HSPs of many query results at once, with COPY",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--batch-size",
+            help="Number of query results per batch in --bulk mode (default: 100)",
+            default=100,
+            type=int,
+        )
 
     def handle(
         self,
@@ -93,6 +111,9 @@ class Command(HistoryCommandMixin, BaseCommand):
         description: str = None,
         algorithm: str = None,
         cpu: int = 1,
+        ignorenotfound: bool = False,
+        bulk: bool = False,
+        batch_size: int = 100,
         verbosity: int = 1,
         **options,
     ):
@@ -121,25 +142,47 @@ class Command(HistoryCommandMixin, BaseCommand):
                 program=program,
                 programversion=programversion,
                 input_format=format,
+                ignorenotfound=ignorenotfound,
             )
             similarity_records = SearchIO.parse(file, format)
         except ValueError as e:
             raise CommandError(e)
 
-        pool = ThreadPoolExecutor(max_workers=cpu)
-        tasks = list()
         if verbosity > 0:
             self.stdout.write("Processing file: {}".format(filename))
-        for record in similarity_records:
-            if len(record.hsps) > 0:
-                tasks.append(
-                    pool.submit(similarity_file.store_bio_searchio_query_result, record)
+        records = (record for record in similarity_records if len(record.hsps) > 0)
+        if bulk:
+            stream_tasks(
+                similarity_file.store_bio_searchio_query_results,
+                (
+                    (batch,)
+                    for batch in iter(lambda: list(islice(records, batch_size)), [])
+                ),
+                cpu=cpu,
+                batch_size=1,
+                verbosity=verbosity,
+            )
+        else:
+            stream_tasks(
+                similarity_file.store_bio_searchio_query_result,
+                ((record,) for record in records),
+                cpu=cpu,
+                verbosity=verbosity,
+            )
+
+        unresolved = sorted(similarity_file.unresolved)
+        if unresolved:
+            self.stdout.write(
+                self.style.WARNING(
+                    "{} query/subject ids not found, HSPs skipped:".format(
+                        len(unresolved)
+                    )
                 )
-        if verbosity > 0:
-            self.stdout.write("Loading data...")
-        for task in tqdm(as_completed(tasks), total=len(tasks), disable=verbosity == 0):
-            task.result()
-        pool.shutdown()
+            )
+            for role, accession in unresolved[:20]:
+                self.stdout.write("  {} {}".format(role, accession))
+            if len(unresolved) > 20:
+                self.stdout.write("  ... and {} more".format(len(unresolved) - 20))
 
         if verbosity > 0:
             self.stdout.write(
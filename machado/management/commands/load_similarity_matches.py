@@ -8,13 +8,15 @@
 
 import os
 import warnings
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
+from typing import Iterable, Iterator, Tuple
 
 from Bio import BiopythonWarning
 from Bio import SearchIO
+from Bio.SearchIO._model import Hit, QueryResult
 from django.core.management.base import BaseCommand, CommandError
 from machado.management.commands._base import HistoryCommandMixin
-from tqdm import tqdm
+from machado.management.commands._parallel import stream_tasks
 
 from machado.loaders.common import FileValidator
 from machado.loaders.feature import MultispeciesFeatureLoader
@@ -24,6 +26,28 @@ warnings.simplefilter("ignore", BiopythonWarning)
 #     from Bio.SearchIO._model import query, hsp
 
 
+def distinct_hits(
+    records: Iterable[QueryResult], feature_file: MultispeciesFeatureLoader
+) -> Iterator[Tuple[Hit, str]]:
+    """Yield the (hit, target) pairs of the records, skipping repeated hits.
+
+    A hit is repeated when its db, id and dbxrefs were already yielded: the
+    same signature shows up for every protein it matches.
+    """
+    seen = set()
+    for record in records:
+        for searchio_hit in record.hits:
+            key = (
+                feature_file.retrieve_hit_db(searchio_hit, record.target).db_id,
+                searchio_hit.id,
+                frozenset(searchio_hit.dbxrefs),
+            )
+            if key in seen:
+                continue
+            seen.add(key)
+            yield searchio_hit, record.target
+
+
 class Command(HistoryCommandMixin, BaseCommand):
     """Load similarity multispecies matches."""
 
@@ -46,9 +70,28 @@ class Command(HistoryCommandMixin, BaseCommand):
             default=1,
             type=int,
         )
+        parser.add_argument(
+            "--bulk",
+            help="Store the distinct hits in batches written with a few upserts "
+            "instead of one hit at a time",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--batch-size",
+            help="Number of distinct hits per batch in --bulk mode (default: 1000)",
+            default=1000,
+            type=int,
+        )
 
     def handle(
-        self, file: str, format: str, cpu: int = 1, verbosity: int = 1, **options
+        self,
+        file: str,
+        format: str,
+        cpu: int = 1,
+        bulk: bool = False,
+        batch_size: int = 1000,
+        verbosity: int = 1,
+        **options,
     ):
         """Execute the main function."""
         # retrieve only the file name
@@ -73,18 +116,27 @@ class Command(HistoryCommandMixin, BaseCommand):
         except ValueError as e:
             return CommandError(e)
 
-        pool = ThreadPoolExecutor(max_workers=cpu)
-        tasks = list()
-        for record in records:
-            for hit in record.hits:
-                tasks.append(
-                    pool.submit(feature_file.store_bio_searchio_hit, hit, record.target)
-                )
         if verbosity > 0:
             self.stdout.write("Loading data...")
-        for task in tqdm(as_completed(tasks), total=len(tasks), disable=verbosity == 0):
-            task.result()
-        pool.shutdown()
+        hits = distinct_hits(records, feature_file)
+        if bulk:
+            stream_tasks(
+                feature_file.store_bio_searchio_hits,
+                (
+                    (batch,)
+                    for batch in iter(lambda: list(islice(hits, batch_size)), [])
+                ),
+                cpu=cpu,
+                batch_size=1,
+                verbosity=verbosity,
+            )
+        else:
+            stream_tasks(
+                feature_file.store_bio_searchio_hit,
+                hits,
+                cpu=cpu,
+                verbosity=verbosity,
+            )
 
         if len(feature_file.ignored_goterms) > 0:
             self.stdout.write(
@@ -12,11 +12,49 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 import pysam
 from django.core.management.base import BaseCommand
 from machado.management.commands._base import HistoryCommandMixin
+from machado.management.commands._parallel import process_pool
 from tqdm import tqdm
 
-from machado.loaders.common import FileValidator, get_num_lines, retrieve_organism
+from machado.loaders.common import FileValidator, ReferenceCache
+from machado.loaders.common import get_num_lines, retrieve_organism
 from machado.loaders.exceptions import ImportingError
 from machado.loaders.feature import FeatureLoader
+from machado.loaders.featurebulk import FeatureBulkLoader
+from machado.models import Organism
+
+
+def store_contig_variants(
+    file: str,
+    index_file: str,
+    contig: str,
+    organism: Organism,
+    doi: str,
+    bulk: bool,
+    batch_size: int,
+    refcache: ReferenceCache = None,
+) -> None:
+    """Load the variants of a single contig in a worker process."""
+    loader_class = FeatureBulkLoader if bulk else FeatureLoader
+    feature_file = loader_class(
+        filename=os.path.basename(file),
+        source="VCF_SOURCE",
+        organism=organism,
+        doi=doi,
+        refcache=refcache,
+    )
+    batch = list()
+    tbx = pysam.TabixFile(filename=file, index=index_file)
+    for row in tbx.fetch(contig, parser=pysam.asVCF()):
+        if bulk:
+            batch.append((None, row))
+            if len(batch) >= batch_size:
+                feature_file.store_tabix_VCF_features(batch)
+                batch = list()
+        else:
+            feature_file.store_tabix_VCF_feature(row)
+    if batch:
+        feature_file.store_tabix_VCF_features(batch)
+    tbx.close()
 
 
 class Command(HistoryCommandMixin, BaseCommand):
@@ -52,6 +90,25 @@ class Command(HistoryCommandMixin, BaseCommand):
             default=1,
             type=int,
         )
+        parser.add_argument(
+            "--bulk",
+            help="Load the variants in batches written with COPY instead of "
+            "one row at a time",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--batch-size",
+            help="Number of VCF rows per batch in --bulk mode (default: 5000)",
+            default=5000,
+            type=int,
+        )
+        parser.add_argument(
+            "--processes",
+            help="Number of worker processes; each one loads whole contigs "
+            "(default: 1)",
+            default=1,
+            type=int,
+        )
 
     def handle(
         self,
@@ -59,6 +116,9 @@ class Command(HistoryCommandMixin, BaseCommand):
         organism: str,
         doi: str = None,
         cpu: int = 1,
+        bulk: bool = False,
+        batch_size: int = 5000,
+        processes: int = 1,
         verbosity: int = 1,
         **options,
     ):
@@ -80,15 +140,67 @@ class Command(HistoryCommandMixin, BaseCommand):
                 FileValidator().validate(index_file)
             except ImportingError:
                 raise ImportingError("No tabix index found (.tbi or .csi)", file=file)
-        feature_file = FeatureLoader(
+        loader_class = FeatureBulkLoader if bulk else FeatureLoader
+        feature_file = loader_class(
             filename=filename, source="VCF_SOURCE", organism=organism, doi=doi
         )
+        if processes > 1:
+            # Tabix reads each reference sequence on its own, so the contigs
+            # are loaded in parallel by worker processes
+            with open(file) as tbx_file:
+                contigs = pysam.TabixFile(
+                    filename=tbx_file.name, index=index_file
+                ).contigs
+            pool = process_pool(processes)
+            tasks = [
+                pool.submit(
+                    store_contig_variants,
+                    file,
+                    index_file,
+                    contig,
+                    organism,
+                    doi,
+                    bulk,
+                    batch_size,
+                    feature_file.refcache,
+                )
+                for contig in contigs
+            ]
+            try:
+                for task in tqdm(
+                    as_completed(tasks), total=len(tasks), disable=verbosity == 0
+                ):
+                    task.result()
+            finally:
+                pool.shutdown(cancel_futures=True)
+        else:
+            self.store_variants(
+                feature_file, file, index_file, cpu, bulk, batch_size, verbosity
+            )
+
+        if verbosity > 0:
+            self.stdout.write(
+                self.style.SUCCESS("Successfully processed {}".format(filename))
+            )
+
+    def store_variants(
+        self,
+        feature_file: FeatureLoader,
+        file: str,
+        index_file: str,
+        cpu: int,
+        bulk: bool,
+        batch_size: int,
+        verbosity: int,
+    ) -> None:
+        """Load the VCF rows with a pool of threads."""
         pool = ThreadPoolExecutor(max_workers=cpu)
         tasks = list()
+        batch = list()
 
         chunk_size = cpu * 2
 
-        # Load the GFF3 file
+        # Load the VCF file
         with open(file) as tbx_file:
             tbx = pysam.TabixFile(filename=tbx_file.name, index=index_file)
             for i, row in tqdm(
@@ -96,22 +208,32 @@ class Command(HistoryCommandMixin, BaseCommand):
                 total=get_num_lines(file),
                 disable=verbosity == 0,
             ):
-                tasks.append(
-                    pool.submit(feature_file.store_tabix_VCF_feature, row, line=i + 1)
-                )
+                if bulk:
+                    batch.append((i + 1, row))
+                    if len(batch) < batch_size:
+                        continue
+                    tasks.append(
+                        pool.submit(feature_file.store_tabix_VCF_features, batch)
+                    )
+                    batch = list()
+                else:
+                    tasks.append(
+                        pool.submit(
+                            feature_file.store_tabix_VCF_feature, row, line=i + 1
+                        )
+                    )
 
                 if len(tasks) >= chunk_size:
                     for task in as_completed(tasks):
                         task.result()
                     tasks.clear()
             else:
+                if batch:
+                    tasks.append(
+                        pool.submit(feature_file.store_tabix_VCF_features, batch)
+                    )
                 for task in as_completed(tasks):
                     task.result()
                 tasks.clear()
 
         pool.shutdown()
-
-        if verbosity > 0:
-            self.stdout.write(
-                self.style.SUCCESS("Successfully processed {}".format(filename))
-            )
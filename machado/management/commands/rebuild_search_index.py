@@ -10,6 +10,12 @@ Usage:
     python manage.py rebuild_search_index [--batch-size 2000]
     python manage.py rebuild_search_index --resume
     python manage.py rebuild_search_index --restart
+    python manage.py rebuild_search_index --incremental
+    python manage.py rebuild_search_index --workers 8
+    python manage.py rebuild_search_index --shadow
+    python manage.py rebuild_search_index --rollback
+    python manage.py rebuild_search_index --organism "Genus species"
+    python manage.py rebuild_search_index --types gene mRNA
 
 Populates ``FeatureSearchIndex`` with denormalised data from the Chado
 schema. ``search_vector`` is a generated column maintained by PostgreSQL, so
@@ -18,15 +24,44 @@ no separate tsvector pass is required.
 Related data is fetched in batches (a fixed number of queries per chunk of
 features rather than per feature), which is what makes a multi-million-row
 rebuild practical.
+
+``--incremental`` rebuilds only the entries of the features queued in
+``FeatureSearchIndexQueue`` by the database triggers of migration 0009, so
+a load that touches existing features doesn't call for a full rebuild.
+It refuses to run while another run writes the index, which the other
+modes wait for instead.
+
+``--workers`` splits the features to index into ranges of ``--batch-size``
+features and indexes them in worker processes, each with its own database
+connection and ``IndexRunCache``.
+
+A full rebuild drops the secondary indexes of the table, writes the entries
+with COPY and builds the indexes again at the end: building a GIN index in
+bulk is several times faster than updating it row by row, and gives a
+smaller index.
+
+``--shadow`` builds into a copy of the table while the live one keeps
+serving searches, then swaps the two in a single transaction. The previous
+table is kept, and ``--rollback`` swaps it back.
+
+``--organism`` and ``--types`` scope a rebuild: only the entries of the
+matching features are deleted and built again.
 """
 
+import json
+from concurrent.futures import as_completed
+from contextlib import contextmanager
+
+from django.core.exceptions import ObjectDoesNotExist
 from django.core.management.base import BaseCommand, CommandError
-from django.db import connection
-from django.db.models import Max
+from django.db import IntegrityError, connection, connections, models, transaction
 from tqdm import tqdm
 
 from machado.management.commands._base import HistoryCommandMixin
-from machado.models import Feature, FeatureSearchIndex
+from machado.loaders.bulk import copy_rows
+from machado.loaders.common import retrieve_organism
+from machado.management.commands._parallel import process_pool
+from machado.models import Feature, FeatureSearchIndex, FeatureSearchIndexQueue
 from machado.searchindex import (
     IndexConfig,
     IndexRunCache,
@@ -34,6 +69,94 @@ from machado.searchindex import (
     prefetch_chunk,
 )
 
+#: Suffixes of the table built by --shadow, of the table it retires, and of
+#: the live table while --rollback swaps the two. Its indexes carry them too.
+SHADOW_SUFFIX = "_shadow"
+RETIRED_SUFFIX = "_old"
+SWAP_SUFFIX = "_swap"
+
+#: Key ("mach" in ASCII) of the session advisory lock held by every run that
+#: writes the index.
+INDEX_LOCK = 0x6D616368
+
+#: IndexRunCache of a --workers process, created on its first range. The
+#: parent process never sets it, so it isn't inherited by the workers.
+_worker_cache = None
+
+
+def copy_entries(entries, table):
+    """Write index entries to a table with COPY and return the number written.
+
+    The JSON arrays are serialized here, once, and the generated
+    ``search_vector`` is left out for PostgreSQL to compute. COPY can't skip
+    conflicting rows, so this is only for a table known not to hold them.
+    """
+    fields = [
+        field
+        for field in FeatureSearchIndex._meta.concrete_fields
+        if not field.generated
+    ]
+    json_fields = {
+        field.attname for field in fields if isinstance(field, models.JSONField)
+    }
+    return copy_rows(
+        table,
+        [field.column for field in fields],
+        (
+            [
+                (
+                    json.dumps(getattr(entry, field.attname))
+                    if field.attname in json_fields
+                    else getattr(entry, field.attname)
+                )
+                for field in fields
+            ]
+            for entry in entries
+        ),
+    )
+
+
+def index_chunk(chunk, config, cache, batch_size, table=None):
+    """Index a chunk of features and return the number of entries written.
+
+    Given a table, the entries are written to it with COPY; otherwise they
+    are inserted in the index, skipping the features already there.
+    """
+    ctx = prefetch_chunk([feature.feature_id for feature in chunk], config, cache=cache)
+    entries = build_entries(chunk, ctx, config)
+    if table is not None:
+        return copy_entries(entries, table)
+    FeatureSearchIndex.objects.bulk_create(
+        entries, batch_size=batch_size, ignore_conflicts=True
+    )
+    return len(entries)
+
+
+def index_range(
+    first_id, last_id, config, batch_size, table=None, scope=None, cache=None
+):
+    """Index the eligible features of a planned range in a worker process.
+
+    Every range holds at most ``batch_size`` features, so it is a single
+    chunk, written with a single statement: a range is either fully indexed
+    or not at all, which is what lets ``--resume`` find what is left.
+    """
+    global _worker_cache
+    if cache is None:
+        if _worker_cache is None:
+            _worker_cache = IndexRunCache()
+        cache = _worker_cache
+    command = Command()
+    command.scope = scope
+    chunk = list(
+        command.base_queryset(config).filter(
+            feature_id__gte=first_id, feature_id__lte=last_id
+        )
+    )
+    if not chunk:
+        return 0
+    return index_chunk(chunk, config, cache, batch_size, table)
+
 
 class Command(HistoryCommandMixin, BaseCommand):
     """Rebuild the PostgreSQL full-text search index for features."""
@@ -44,6 +167,10 @@ class Command(HistoryCommandMixin, BaseCommand):
     #: caller instantiates Command() and reaches a helper without handle().
     verbosity = 1
 
+    #: Feature filters of a rebuild scoped by --organism or --types, set in
+    #: handle(); a range of ids planned under a scope holds other features too.
+    scope = None
+
     def add_arguments(self, parser):
         """Define the command arguments."""
         parser.add_argument(
@@ -67,6 +194,62 @@ class Command(HistoryCommandMixin, BaseCommand):
             action="store_true",
             help="Clear the index and rebuild from scratch (the default).",
         )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help=(
+                "Rebuild only the entries of the features changed since the "
+                "last run, as queued by the database triggers, and remove "
+                "the entries of features no longer eligible."
+            ),
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help=(
+                "Number of worker processes, each indexing ranges of "
+                "--batch-size features on its own connection (default: 1)."
+            ),
+        )
+        parser.add_argument(
+            "--shadow",
+            action="store_true",
+            help=(
+                "Build into a copy of the index table and swap it in once "
+                "complete, so searches keep working during the rebuild. The "
+                "previous table is kept for --rollback."
+            ),
+        )
+        parser.add_argument(
+            "--rollback",
+            action="store_true",
+            help="Swap back the index table retired by the last --shadow run.",
+        )
+        parser.add_argument(
+            "--organism",
+            help=(
+                "Rebuild only the entries of this organism's features "
+                '(e.g., "Homo sapiens").'
+            ),
+        )
+        parser.add_argument(
+            "--types",
+            nargs="+",
+            action="extend",
+            help=(
+                "Rebuild only the entries of the features of these types, "
+                "from MACHADO_VALID_TYPES (e.g., gene mRNA, or gene,mRNA)."
+            ),
+        )
+        parser.add_argument(
+            "--maintenance-work-mem",
+            default="1GB",
+            help=(
+                "maintenance_work_mem of the session building the indexes "
+                "at the end of a full rebuild (default: 1GB)."
+            ),
+        )
         parser.add_argument(
             "--max-features",
             type=int,
@@ -94,67 +277,188 @@ class Command(HistoryCommandMixin, BaseCommand):
         resume = bool(options.get("resume"))
         restart = bool(options.get("restart"))
         limit = options.get("max_features")
+        incremental = bool(options.get("incremental"))
+        workers = int(options.get("workers") or 1)
+        maintenance_work_mem = options.get("maintenance_work_mem") or "1GB"
+        shadow = bool(options.get("shadow"))
+        rollback = bool(options.get("rollback"))
+        organism = options.get("organism")
+        types = options.get("types")
 
         if resume and restart:
             raise CommandError("--resume and --restart are mutually exclusive.")
+        if incremental and (resume or restart):
+            raise CommandError(
+                "--incremental can't be combined with --resume or --restart."
+            )
+        if (shadow or rollback) and (resume or incremental):
+            raise CommandError(
+                "--shadow and --rollback can't be combined with --resume or "
+                "--incremental."
+            )
+        if shadow and rollback:
+            raise CommandError("--shadow and --rollback are mutually exclusive.")
+        if (organism or types) and (shadow or rollback or incremental):
+            raise CommandError(
+                "--organism and --types can't be combined with --shadow, "
+                "--rollback or --incremental."
+            )
         if batch_size < 1:
             raise CommandError("--batch-size must be at least 1.")
+        if workers < 1:
+            raise CommandError("--workers must be at least 1.")
+        if workers > 1 and limit is not None:
+            raise CommandError("--max-features can't be combined with --workers.")
 
         config = IndexConfig.from_settings()
 
-        start_after = 0
-        if resume:
-            start_after = (
-                FeatureSearchIndex.objects.aggregate(Max("feature_id"))[
-                    "feature_id__max"
-                ]
-                or 0
+        with self.index_lock(wait=not incremental):
+            if incremental:
+                self.rebuild_queued(config, batch_size)
+                return
+            if rollback:
+                self.rollback_index()
+                return
+
+            self.scope = dict()
+            if organism:
+                try:
+                    self.scope["organism_id"] = retrieve_organism(organism).organism_id
+                except ObjectDoesNotExist as e:
+                    raise CommandError(str(e))
+            if types:
+                types = [name for value in types for name in value.split(",") if name]
+                invalid = sorted(set(types) - set(config.valid_types))
+                if invalid:
+                    raise CommandError(
+                        "Not in MACHADO_VALID_TYPES: {}".format(", ".join(invalid))
+                    )
+                self.scope["type__name__in"] = types
+
+            # A parallel run indexes its ranges out of order, so an interrupted
+            # run leaves gaps below the highest indexed feature_id: --resume plans
+            # the ranges of the features missing from the index instead of
+            # continuing after a watermark.
+            ranges = None
+            if resume:
+                ranges = self.plan_ranges(config, batch_size)
+                total = sum(count for _, _, count in ranges)
+                indexed_before = FeatureSearchIndex.objects.count()
+                if indexed_before:
+                    self.report(f"Resuming with {indexed_before} features indexed.")
+                # conflicting rows are skipped by bulk_create
+                table = None
+            else:
+                # an empty table holds no conflicting rows, so it's written with
+                # COPY, and its secondary indexes are built once it's filled
+                if shadow:
+                    table = self.create_shadow()
+                elif self.scope:
+                    self.clear_scope()
+                    table = FeatureSearchIndex._meta.db_table
+                else:
+                    self.clear_index()
+                    self.drop_indexes()
+                    table = FeatureSearchIndex._meta.db_table
+                if workers > 1:
+                    ranges = self.plan_ranges(config, batch_size, table)
+                    total = sum(count for _, _, count in ranges)
+                else:
+                    total = self.count_remaining(config, 0)
+            if limit is not None:
+                total = min(total, limit)
+            self.report(f"Indexing {total} features...")
+
+            # tqdm defaults to sys.stderr, which a caller redirecting this command's
+            # stdout does not capture -- so a test passing stdout=StringIO() still
+            # got a progress bar on the terminal. Point the bar at the command's own
+            # stream instead, and let disable=None auto-disable it when that stream
+            # is not a terminal (test capture, a pipe, cron). verbosity 0 disables
+            # it outright.
+            #
+            # The stream is unwrapped from Django's OutputWrapper deliberately:
+            # OutputWrapper.isatty() inherits TextIOBase's hardcoded False, so
+            # tqdm would never see a terminal, and its write() appends a newline to
+            # every chunk, which would turn the \r-redrawn bar into one line per
+            # update.
+            stream = getattr(self.stdout, "_out", self.stdout)
+            progress = tqdm(
+                total=total,
+                file=stream,
+                disable=True if verbosity == 0 else None,
+                desc="Building index",
             )
-            if start_after:
-                self.report(f"Resuming after feature_id {start_after}.")
-        else:
-            self.clear_index()
-
-        total = self.count_remaining(config, start_after)
-        if limit is not None:
-            total = min(total, limit)
-        self.report(f"Indexing {total} features...")
-
-        # tqdm defaults to sys.stderr, which a caller redirecting this command's
-        # stdout does not capture -- so a test passing stdout=StringIO() still
-        # got a progress bar on the terminal. Point the bar at the command's own
-        # stream instead, and let disable=None auto-disable it when that stream
-        # is not a terminal (test capture, a pipe, cron). verbosity 0 disables
-        # it outright.
-        #
-        # The stream is unwrapped from Django's OutputWrapper deliberately:
-        # OutputWrapper.isatty() inherits TextIOBase's hardcoded False, so
-        # tqdm would never see a terminal, and its write() appends a newline to
-        # every chunk, which would turn the \r-redrawn bar into one line per
-        # update.
-        stream = getattr(self.stdout, "_out", self.stdout)
-        progress = tqdm(
-            total=total,
-            file=stream,
-            disable=True if verbosity == 0 else None,
-            desc="Building index",
-        )
+            try:
+                if workers > 1:
+                    indexed = self.index_parallel(
+                        config, batch_size, ranges, workers, progress, table
+                    )
+                else:
+                    indexed = self.index_serial(
+                        config, batch_size, ranges, limit, progress, table
+                    )
+            finally:
+                # also after a failed run, so searches never go without them; a
+                # failed --shadow run leaves the live table untouched instead
+                if not shadow:
+                    self.restore_indexes(maintenance_work_mem)
+            if shadow:
+                self.restore_indexes(maintenance_work_mem, SHADOW_SUFFIX)
+                self.swap_index(SHADOW_SUFFIX)
+                self.report("Swapped in the rebuilt index table.")
+
+            self.report(
+                self.style.SUCCESS(
+                    "Search index rebuild completed. "
+                    "Indexed {} features.".format(indexed)
+                )
+            )
+
+    @contextmanager
+    def index_lock(self, wait):
+        """Hold the advisory lock serializing the runs that write the index.
+
+        --incremental inserts its entries without skipping conflicting rows,
+        which a full rebuild may have copied in meanwhile, and would update
+        the live table a --shadow run is about to swap out. It refuses to run
+        while another run holds the lock; the other modes wait for it. The
+        lock is held on a connection of its own, since --workers closes the
+        command's connections before forking.
+        """
+        lock = connections.create_connection(connection.alias)
+        try:
+            with lock.cursor() as cursor:
+                cursor.execute("SELECT pg_try_advisory_lock(%s)", [INDEX_LOCK])
+                if not cursor.fetchone()[0]:
+                    if not wait:
+                        raise CommandError(
+                            "Another rebuild_search_index run is writing the "
+                            "index, try again once it has finished."
+                        )
+                    self.report("Waiting for another rebuild_search_index run...")
+                    cursor.execute("SELECT pg_advisory_lock(%s)", [INDEX_LOCK])
+            yield
+        finally:
+            # closing the session releases the lock
+            lock.close()
+
+    def index_serial(self, config, batch_size, ranges, limit, progress, table):
+        """Index the features in this process, chunk after chunk."""
         indexed = 0
-        last_id = start_after
+        last_id = 0
         # Created here, and only here, so the memoised chunk-independent
         # lookups live exactly as long as this run.
         cache = IndexRunCache()
+        if ranges is None:
+            chunks = self.iter_chunks(config, batch_size, 0, limit)
+        else:
+            chunks = self.iter_planned(config, ranges, limit)
         try:
-            for chunk in self.iter_chunks(config, batch_size, start_after, limit):
-                ids = [feature.feature_id for feature in chunk]
-                ctx = prefetch_chunk(ids, config, cache=cache)
-                entries = build_entries(chunk, ctx, config)
-                FeatureSearchIndex.objects.bulk_create(
-                    entries, batch_size=batch_size, ignore_conflicts=True
-                )
-                indexed += len(entries)
-                last_id = ids[-1]
-                progress.update(len(entries))
+            for chunk in chunks:
+                count = index_chunk(chunk, config, cache, batch_size, table)
+                indexed += count
+                last_id = chunk[-1].feature_id
+                progress.update(count)
         except KeyboardInterrupt:
             raise CommandError(
                 f"Interrupted after feature_id {last_id} "
@@ -172,11 +476,113 @@ class Command(HistoryCommandMixin, BaseCommand):
             raise
         finally:
             progress.close()
+        return indexed
+
+    def index_parallel(self, config, batch_size, ranges, workers, progress, table):
+        """Index the planned ranges with a pool of worker processes.
+
+        The ranges are handed out one at a time, so a worker that draws
+        features with little related data simply takes more of them, and the
+        progress bar advances in the parent as each one completes.
+        """
+        indexed = 0
+        pool = process_pool(workers)
+        try:
+            tasks = [
+                pool.submit(
+                    index_range,
+                    first_id,
+                    last_id,
+                    config,
+                    batch_size,
+                    table,
+                    self.scope,
+                )
+                for first_id, last_id, _ in ranges
+            ]
+            for task in as_completed(tasks):
+                count = task.result()
+                indexed += count
+                progress.update(count)
+        except KeyboardInterrupt:
+            raise CommandError(
+                f"Interrupted ({indexed} features indexed). "
+                "Re-run with --resume to continue."
+            )
+        except Exception:
+            self.stderr.write(
+                f"Failed while indexing ({indexed} features indexed). "
+                "Re-run with --resume to continue from there."
+            )
+            raise
+        finally:
+            pool.shutdown(cancel_futures=True)
+            progress.close()
+        return indexed
+
+    def rebuild_queued(self, config, batch_size):
+        """Rebuild the index entries of the queued features.
+
+        Each batch is taken off the queue, its stale entries deleted and the
+        eligible features re-indexed in a single transaction, so an
+        interrupted run loses nothing: the batches already committed are off
+        the queue, and the rest is still there for the next run. Features
+        that were deleted, made obsolete or are not of a valid type only have
+        their entries deleted.
+
+        ``FOR UPDATE SKIP LOCKED`` lets a loader queue features while this
+        runs. A feature changed again by a transaction that commits after
+        its batch was read is queued again, and picked up by the next run.
+        """
+        queue_table = connection.ops.quote_name(FeatureSearchIndexQueue._meta.db_table)
+        total = FeatureSearchIndexQueue.objects.count()
+        self.report(f"Updating {total} queued features...")
+
+        stream = getattr(self.stdout, "_out", self.stdout)
+        progress = tqdm(
+            total=total,
+            file=stream,
+            disable=True if self.verbosity == 0 else None,
+            desc="Updating index",
+        )
+        indexed = 0
+        cache = IndexRunCache()
+        try:
+            while True:
+                with transaction.atomic():
+                    with connection.cursor() as cursor:
+                        cursor.execute(
+                            f"DELETE FROM {queue_table} WHERE feature_id IN ("
+                            f"SELECT feature_id FROM {queue_table} "
+                            "ORDER BY feature_id LIMIT %s FOR UPDATE SKIP LOCKED"
+                            ") RETURNING feature_id",
+                            [batch_size],
+                        )
+                        ids = [row[0] for row in cursor.fetchall()]
+                    if not ids:
+                        break
+                    FeatureSearchIndex.objects.filter(feature_id__in=ids).delete()
+                    chunk = list(self.base_queryset(config).filter(feature_id__in=ids))
+                    ctx = prefetch_chunk(
+                        [feature.feature_id for feature in chunk], config, cache=cache
+                    )
+                    entries = build_entries(chunk, ctx, config)
+                    FeatureSearchIndex.objects.bulk_create(
+                        entries, batch_size=batch_size
+                    )
+                indexed += len(entries)
+                progress.update(len(ids))
+        except KeyboardInterrupt:
+            raise CommandError(
+                f"Interrupted ({indexed} features indexed). "
+                "Re-run with --incremental to continue."
+            )
+        finally:
+            progress.close()
 
         self.report(
             self.style.SUCCESS(
-                "Search index rebuild completed. "
-                "Indexed {} features.".format(indexed)
+                "Search index update completed. Indexed {} features.".format(indexed)
             )
         )
 
@@ -190,6 +596,10 @@ class Command(HistoryCommandMixin, BaseCommand):
         Nothing references ``FeatureSearchIndex``, so there is no cascade to
         honour and TRUNCATE is safe here. The count is taken first, purely for
         the operator-facing message.
+
+        The queue of ``--incremental`` is emptied along with it: the rebuild
+        covers every feature changed so far, and whatever changes while it
+        runs is queued again by the triggers.
         """
         stale = FeatureSearchIndex.objects.count()
         # Postgres refuses to TRUNCATE a table with pending deferred FK
@@ -201,14 +611,196 @@ class Command(HistoryCommandMixin, BaseCommand):
         connection.check_constraints()
         with connection.cursor() as cursor:
             cursor.execute(
-                'TRUNCATE TABLE "{}"'.format(FeatureSearchIndex._meta.db_table)
+                'TRUNCATE TABLE "{}", "{}"'.format(
+                    FeatureSearchIndex._meta.db_table,
+                    FeatureSearchIndexQueue._meta.db_table,
+                )
             )
         if stale:
             self.report(f"  Cleared {stale} stale index entries.")
 
+    def clear_scope(self):
+        """Delete the index entries of the features in the scope of the run.
+
+        The features are matched whether or not they're still eligible, so
+        the entries of the ones made obsolete are deleted as well.
+        """
+        stale, _ = FeatureSearchIndex.objects.filter(
+            feature_id__in=Feature.objects.filter(**self.scope).values("feature_id")
+        ).delete()
+        if stale:
+            self.report(f"  Cleared {stale} stale index entries.")
+
+    def drop_indexes(self):
+        """Drop the secondary indexes of the index table.
+
+        The primary key is kept: it is what ``--resume`` and the planning of
+        the ranges look up. ``restore_indexes`` builds the others again.
+        """
+        with connection.schema_editor(collect_sql=True, atomic=False) as editor:
+            for index in FeatureSearchIndex._meta.indexes:
+                editor.remove_index(FeatureSearchIndex, index)
+        with connection.cursor() as cursor:
+            cursor.execute("\n".join(editor.collected_sql))
+
+    def restore_indexes(self, maintenance_work_mem, suffix=""):
+        """Build the missing secondary indexes and analyze the index table.
+
+        The indexes are looked up rather than remembered, so a run that
+        follows one killed before this point builds them as well. With a
+        suffix, they're built on the --shadow table, named after it.
+        """
+        live = FeatureSearchIndex._meta.db_table
+        table = live + suffix
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT indexname FROM pg_indexes WHERE tablename = %s", [table]
+            )
+            existing = {row[0] for row in cursor.fetchall()}
+        missing = [
+            index
+            for index in FeatureSearchIndex._meta.indexes
+            if index.name + suffix not in existing
+        ]
+        if missing:
+            self.report(f"Building {len(missing)} indexes...")
+            statements = list()
+            with connection.schema_editor(collect_sql=True, atomic=False) as editor:
+                for index in missing:
+                    index = index.clone()
+                    index.name += suffix
+                    statement = index.create_sql(FeatureSearchIndex, editor)
+                    statement.rename_table_references(live, table)
+                    statements.append("{};".format(statement))
+            # pending deferred FK checks block CREATE INDEX as they block
+            # TRUNCATE, see clear_index
+            connection.check_constraints()
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT set_config('maintenance_work_mem', %s, false)",
+                    [maintenance_work_mem],
+                )
+                try:
+                    cursor.execute("\n".join(statements))
+                finally:
+                    cursor.execute("RESET maintenance_work_mem")
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE {}".format(connection.ops.quote_name(table)))
+
+    def create_shadow(self):
+        """Create the empty copy of the index table that --shadow builds into.
+
+        It has the columns, defaults and generated column of the live table,
+        and its primary key; the secondary indexes are built once it's
+        filled, and the foreign keys just before the swap. A copy left by a
+        failed run is dropped first. Unlike ``clear_index``, this leaves the
+        queue of --incremental alone: the live table its features are stale
+        in serves searches until the swap, and after a failed run. The next
+        --incremental run reindexes them once more after the swap.
+        """
+        live = FeatureSearchIndex._meta.db_table
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {qn(live + SHADOW_SUFFIX)}")
+            cursor.execute(
+                f"CREATE TABLE {qn(live + SHADOW_SUFFIX)} "
+                f"(LIKE {qn(live)} INCLUDING ALL EXCLUDING INDEXES)"
+            )
+            cursor.execute(
+                f"ALTER TABLE {qn(live + SHADOW_SUFFIX)} "
+                f"ADD CONSTRAINT {qn(live + '_pkey' + SHADOW_SUFFIX)} "
+                "PRIMARY KEY (feature_id)"
+            )
+        return live + SHADOW_SUFFIX
+
+    def rollback_index(self):
+        """Swap back the index table retired by the last --shadow run.
+
+        The table rolled back from is retired in turn, so a second rollback
+        undoes the first.
+        """
+        live = FeatureSearchIndex._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s)", [live + RETIRED_SUFFIX])
+            if cursor.fetchone()[0] is None:
+                raise CommandError("There is no retired index table to roll back to.")
+        self.swap_index(RETIRED_SUFFIX)
+        self.report(self.style.SUCCESS("Rolled back to the retired index table."))
+
+    def swap_index(self, suffix):
+        """Make the table of the suffix the live index table.
+
+        The live table's foreign keys are added to the incoming table first,
+        while the live one still serves searches. They are added NOT VALID,
+        which doesn't scan the table, so from then on a feature can't be
+        deleted from under an entry; the entries of the features deleted
+        before are then dropped, and the keys validated without blocking
+        writes to ``feature``. Validation is retried once, should a feature
+        deleted as the keys were added have been missed. The renames then
+        take a single short transaction. The outgoing table, and its
+        indexes, get the retired suffix, replacing any retired one.
+        """
+        live = FeatureSearchIndex._meta.db_table
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE conrelid = %s::regclass AND contype = 'f'",
+                [live],
+            )
+            foreign_keys = cursor.fetchall()
+            for name, definition in foreign_keys:
+                cursor.execute(
+                    f"ALTER TABLE {qn(live + suffix)} "
+                    f"ADD CONSTRAINT {qn(name)} {definition} NOT VALID"
+                )
+        for attempt in range(2):
+            try:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute(
+                        f"DELETE FROM {qn(live + suffix)} incoming WHERE NOT EXISTS "
+                        "(SELECT 1 FROM feature "
+                        "WHERE feature_id = incoming.feature_id)"
+                    )
+                    for name, _ in foreign_keys:
+                        cursor.execute(
+                            f"ALTER TABLE {qn(live + suffix)} "
+                            f"VALIDATE CONSTRAINT {qn(name)}"
+                        )
+                break
+            except IntegrityError:
+                if attempt:
+                    raise
+
+        with transaction.atomic():
+            # pending deferred FK checks block ALTER TABLE, see clear_index
+            connection.check_constraints()
+            with connection.cursor() as cursor:
+                for name, _ in foreign_keys:
+                    cursor.execute(f"ALTER TABLE {qn(live)} DROP CONSTRAINT {qn(name)}")
+                self.rename_index(cursor, "", SWAP_SUFFIX)
+                self.rename_index(cursor, suffix, "")
+                cursor.execute(f"DROP TABLE IF EXISTS {qn(live + RETIRED_SUFFIX)}")
+                self.rename_index(cursor, SWAP_SUFFIX, RETIRED_SUFFIX)
+
+    def rename_index(self, cursor, old_suffix, new_suffix):
+        """Rename an index table and its indexes from one suffix to another."""
+        live = FeatureSearchIndex._meta.db_table
+        qn = connection.ops.quote_name
+        names = [live + "_pkey"]
+        names.extend(index.name for index in FeatureSearchIndex._meta.indexes)
+        for name in names:
+            cursor.execute(
+                f"ALTER INDEX IF EXISTS {qn(name + old_suffix)} "
+                f"RENAME TO {qn(name + new_suffix)}"
+            )
+        cursor.execute(
+            f"ALTER TABLE {qn(live + old_suffix)} RENAME TO {qn(live + new_suffix)}"
+        )
+
     def base_queryset(self, config):
         """Return the queryset of features eligible for indexing."""
-        return (
+        queryset = (
             Feature.objects.filter(
                 type__name__in=config.valid_types,
                 type__cv__name="sequence",
@@ -217,11 +809,65 @@ class Command(HistoryCommandMixin, BaseCommand):
             .select_related("organism", "type")
             .order_by("feature_id")
         )
+        if self.scope:
+            queryset = queryset.filter(**self.scope)
+        return queryset
 
     def count_remaining(self, config, start_after):
         """Count features still to be indexed."""
         return self.base_queryset(config).filter(feature_id__gt=start_after).count()
 
+    def plan_ranges(self, config, batch_size, table=None):
+        """Split the eligible features missing from an index table into ranges.
+
+        Returns (first_id, last_id, count) tuples, in feature_id order, each
+        covering at most ``batch_size`` features and no indexed feature. The
+        features are numbered with window functions in a single scan: the
+        running count of indexed features is constant along a gap, and the
+        running count of missing ones cuts the gaps into ranges. The table
+        defaults to the live one.
+        """
+        eligible, params = (
+            self.base_queryset(config)
+            .order_by()
+            .values("feature_id")
+            .query.sql_with_params()
+        )
+        index_table = connection.ops.quote_name(
+            table or FeatureSearchIndex._meta.db_table
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT min(feature_id), max(feature_id), count(*) FROM ("
+                "SELECT eligible.feature_id, i.feature_id IS NULL AS missing, "
+                "count(i.feature_id) OVER w AS gap, "
+                "count(*) FILTER (WHERE i.feature_id IS NULL) OVER w AS position "
+                f"FROM ({eligible}) eligible "
+                f"LEFT JOIN {index_table} i ON i.feature_id = eligible.feature_id "
+                "WINDOW w AS (ORDER BY eligible.feature_id)"
+                ") planned WHERE missing "
+                "GROUP BY gap, (position - 1) / %s ORDER BY 1",
+                [*params, batch_size],
+            )
+            return cursor.fetchall()
+
+    def iter_planned(self, config, ranges, limit=None):
+        """Yield the features of the planned ranges, one chunk per range."""
+        produced = 0
+        for first_id, last_id, _ in ranges:
+            queryset = self.base_queryset(config).filter(
+                feature_id__gte=first_id, feature_id__lte=last_id
+            )
+            if limit is not None:
+                remaining = limit - produced
+                if remaining <= 0:
+                    return
+                queryset = queryset[:remaining]
+            chunk = list(queryset)
+            if chunk:
+                yield chunk
+                produced += len(chunk)
+
     def iter_chunks(self, config, batch_size, start_after, limit=None):
         """Yield lists of features using keyset pagination on the PK."""
         last_id = start_after
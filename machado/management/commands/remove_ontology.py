@@ -11,6 +11,7 @@ from machado.models import (
     Cvterm,
     CvtermDbxref,
     Cvtermprop,
+    Cvtermpath,
     Cvtermsynonym,
     CvtermRelationship,
     Dbxref,
@@ -55,6 +56,8 @@ class Command(HistoryCommandMixin, BaseCommand):
                 CvtermDbxref.objects.filter(cvterm_id__in=cvterm_ids).delete()
                 Cvtermsynonym.objects.filter(cvterm_id__in=cvterm_ids).delete()
                 Cvtermprop.objects.filter(cvterm_id__in=cvterm_ids).delete()
+                Cvtermpath.objects.filter(object_id__in=cvterm_ids).delete()
+                Cvtermpath.objects.filter(subject_id__in=cvterm_ids).delete()
                 CvtermRelationship.objects.filter(object_id__in=cvterm_ids).delete()
                 CvtermRelationship.objects.filter(subject_id__in=cvterm_ids).delete()
                 Cvterm.objects.filter(cvterm_id__in=cvterm_ids).delete()
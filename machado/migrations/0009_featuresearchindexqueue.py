@@ -0,0 +1,107 @@
+# Copyright 2026 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Queue the features whose search index entries are stale.
+
+Hand-written for the same reason as 0008: ``makemigrations`` would also emit
+state-only operations for the unmanaged Chado tables.
+
+The queue is filled by statement-level triggers on every Chado table the
+index is built from. They read the statement's transition table, so a COPY
+or a multi-row INSERT of a million rows queues its distinct feature ids with
+one INSERT ... SELECT instead of firing a million row-level triggers.
+"""
+
+from django.db import migrations, models
+
+#: Chado table -> columns holding the feature_ids whose index entry it feeds.
+QUEUED_TABLES = {
+    "feature": ["feature_id"],
+    "featureprop": ["feature_id"],
+    "feature_cvterm": ["feature_id"],
+    "feature_dbxref": ["feature_id"],
+    "feature_pub": ["feature_id"],
+    # srcfeature_id: match_part locations feed the analyses facet
+    "featureloc": ["feature_id", "srcfeature_id"],
+    "feature_relationship": ["subject_id", "object_id"],
+    "analysisfeature": ["feature_id"],
+}
+
+QUEUE_FUNCTION = """
+CREATE OR REPLACE FUNCTION machado_queue_search_index() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    column_name text;
+BEGIN
+    FOREACH column_name IN ARRAY TG_ARGV LOOP
+        EXECUTE format(
+            'INSERT INTO machado_featuresearchindexqueue (feature_id) '
+            'SELECT DISTINCT %1$I FROM changed_rows WHERE %1$I IS NOT NULL '
+            'ON CONFLICT DO NOTHING',
+            column_name
+        );
+    END LOOP;
+    RETURN NULL;
+END;
+$$;
+"""
+
+EVENTS = {"insert": "NEW", "update": "NEW", "delete": "OLD"}
+
+
+def create_triggers():
+    """Return the statements creating the queue triggers."""
+    statements = [QUEUE_FUNCTION]
+    for table, columns in QUEUED_TABLES.items():
+        for event, transition in EVENTS.items():
+            statements.append(
+                "CREATE TRIGGER machado_queue_search_index_{event} "
+                "AFTER {event} ON {table} "
+                "REFERENCING {transition} TABLE AS changed_rows "
+                "FOR EACH STATEMENT "
+                "EXECUTE FUNCTION machado_queue_search_index({columns});".format(
+                    event=event,
+                    table=table,
+                    transition=transition,
+                    columns=", ".join("'{}'".format(c) for c in columns),
+                )
+            )
+    return statements
+
+
+def drop_triggers():
+    """Return the statements dropping the queue triggers."""
+    statements = [
+        "DROP TRIGGER IF EXISTS machado_queue_search_index_{} ON {};".format(
+            event, table
+        )
+        for table in QUEUED_TABLES
+        for event in EVENTS
+    ]
+    statements.append("DROP FUNCTION IF EXISTS machado_queue_search_index();")
+    return statements
+
+
+class Migration(migrations.Migration):
+    """Add the search index queue and the triggers that fill it."""
+
+    dependencies = [
+        ("machado", "0008_search_vector_generated"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FeatureSearchIndexQueue",
+            fields=[
+                ("feature_id", models.BigIntegerField(primary_key=True)),
+            ],
+            options={
+                "db_table": "machado_featuresearchindexqueue",
+                "managed": True,
+            },
+        ),
+        migrations.RunSQL(sql=create_triggers(), reverse_sql=drop_triggers()),
+    ]
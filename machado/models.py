@@ -4439,3 +4439,23 @@ class FeatureSearchIndex(models.Model):
     def __str__(self):
         """Return a string representation of the search index."""
         return f"SearchIndex({self.uniquename})"
+
+
+class FeatureSearchIndexQueue(models.Model):
+    """Features whose search index entries are stale.
+
+    Filled by database triggers on the tables the index is built from (see
+    migration 0009) and drained by ``rebuild_search_index --incremental``.
+    ``feature_id`` is deliberately not a foreign key: the ids of deleted
+    features must stay queued so their index entries can be removed.
+    """
+
+    feature_id = models.BigIntegerField(primary_key=True)
+
+    class Meta:
+        managed = True
+        db_table = "machado_featuresearchindexqueue"
+
+    def __str__(self):
+        """Return a string representation of the queue entry."""
+        return f"SearchIndexQueue({self.feature_id})"
@@ -0,0 +1,89 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Tests for the parallel processing helpers of the commands."""
+
+from unittest.mock import patch
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.test import SimpleTestCase
+
+from machado.management.commands._parallel import stream_tasks
+
+
+class StreamTasksTest(SimpleTestCase):
+    """Test suite for stream_tasks."""
+
+    def setUp(self):
+        """Set up test context."""
+        self.consumed = 0
+        self.calls = list()
+
+    def items(self, count):
+        """Yield count items, keeping track of how many were read."""
+        for i in range(count):
+            self.consumed += 1
+            yield (i,)
+
+    def test_stream_tasks(self):
+        """Test every item is processed while the input is read lazily."""
+
+        def function(i):
+            self.calls.append((i, self.consumed))
+
+        stream_tasks(function, self.items(1000), cpu=1, batch_size=10, verbosity=0)
+        self.assertEqual(sorted(i for i, consumed in self.calls), list(range(1000)))
+        # at most two batches are pending per thread
+        self.assertLessEqual(max(consumed - i for i, consumed in self.calls), 30)
+
+    def test_stream_tasks_weight(self):
+        """Test the progress bar advances by the weight of the items."""
+        with patch("machado.management.commands._parallel.tqdm") as progress:
+            stream_tasks(
+                lambda batch: None,
+                ((list(range(i)),) for i in [3, 1, 2]),
+                batch_size=2,
+                total=6,
+                weight=lambda args: len(args[0]),
+            )
+        progress.assert_called_once_with(total=6, disable=False)
+        self.assertEqual(
+            sorted(call.args[0] for call in progress.return_value.update.mock_calls),
+            [2, 4],
+        )
+
+    def test_stream_tasks_error(self):
+        """Test the first error stops reading the input."""
+
+        def function(i):
+            if i == 5:
+                raise ValueError("item {}".format(i))
+
+        with self.assertRaisesRegex(ValueError, "item 5"):
+            stream_tasks(function, self.items(1000), cpu=2, batch_size=2, verbosity=0)
+        self.assertLess(self.consumed, 20)
+
+    def test_stream_tasks_ignore(self):
+        """Test ignored errors are returned and don't stop the run."""
+
+        def function(i):
+            self.calls.append(i)
+            if i % 2:
+                raise ObjectDoesNotExist("item {}".format(i))
+
+        ignored = stream_tasks(
+            function,
+            self.items(10),
+            cpu=2,
+            batch_size=3,
+            ignore=(ObjectDoesNotExist,),
+            verbosity=0,
+        )
+        self.assertEqual(sorted(self.calls), list(range(10)))
+        self.assertEqual(
+            sorted(str(e) for e in ignored),
+            ["item {}".format(i) for i in range(1, 10, 2)],
+        )
@@ -0,0 +1,125 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Tests for the per-contig load_gff worker."""
+
+import os
+import pickle
+import tempfile
+from datetime import datetime, timezone
+
+import pysam
+from django.test import TestCase
+
+from machado.loaders.exceptions import ImportingError
+from machado.management.commands.load_gff import store_contig_features
+from machado.models import Cv, Cvterm, Db, Dbxref, Feature, Organism
+
+GFF = """\
+chr1\t.\tgene\t10\t90\t.\t+\t.\tID=gene1
+chr1\t.\texon\t10\t50\t.\t+\t.\tID=exon1;Parent=gene1
+chr2\t.\tgene\t10\t90\t.\t-\t.\tID=gene2
+"""
+
+
+class StoreContigFeaturesTest(TestCase):
+    """Test suite for store_contig_features."""
+
+    def setUp(self):
+        """Set up test context."""
+        db_internal = Db.objects.create(name="internal")
+        db_fasta = Db.objects.get_or_create(name="FASTA_SOURCE")[0]
+        cv_seq = Cv.objects.get_or_create(name="sequence")[0]
+        cv_rel = Cv.objects.get_or_create(name="relationship")[0]
+        cv_synonym = Cv.objects.get_or_create(name="synonym_type")[0]
+        terms = dict()
+        for name, cv in [
+            ("located in", cv_rel),
+            ("exact", cv_synonym),
+            ("polypeptide", cv_seq),
+            ("protein_match", cv_seq),
+            ("chromosome", cv_seq),
+            ("gene", cv_seq),
+            ("exon", cv_seq),
+        ]:
+            terms[name] = Cvterm.objects.create(
+                name=name,
+                cv=cv,
+                dbxref=Dbxref.objects.create(db=db_internal, accession=name),
+                definition="",
+                is_obsolete=0,
+                is_relationshiptype=0,
+            )
+        self.organism = Organism.objects.create(genus="Contig", species="test")
+        for contig in ["chr1", "chr2"]:
+            Feature.objects.create(
+                organism=self.organism,
+                uniquename=contig,
+                type=terms["chromosome"],
+                dbxref=Dbxref.objects.create(db=db_fasta, accession=contig),
+                is_analysis=False,
+                is_obsolete=False,
+                timeaccessioned=datetime.now(timezone.utc),
+                timelastmodified=datetime.now(timezone.utc),
+            )
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        gff = os.path.join(self.tmpdir.name, "contigs.gff3")
+        with open(gff, "w") as handle:
+            handle.write(GFF)
+        self.file = pysam.tabix_index(gff, preset="gff")
+        self.index_file = "{}.tbi".format(self.file)
+
+    def tearDown(self):
+        """Remove the temporary GFF file."""
+        self.tmpdir.cleanup()
+
+    def test_store_contig_features(self):
+        """Test only the rows of the contig are loaded."""
+        for bulk in [False, True]:
+            with self.subTest(bulk=bulk):
+                organism = Organism.objects.create(
+                    genus="Contig", species="bulk" if bulk else "row"
+                )
+                Feature.objects.filter(type__name="chromosome").update(
+                    organism=organism
+                )
+                relationships, ignored_attrs, feature_ids = store_contig_features(
+                    self.file,
+                    self.index_file,
+                    "chr1",
+                    organism,
+                    None,
+                    None,
+                    False,
+                    bulk,
+                    1,
+                )
+                self.assertEqual(
+                    relationships, [{"object_id": "exon1", "subject_id": "gene1"}]
+                )
+                self.assertEqual(ignored_attrs, set())
+                self.assertEqual(
+                    feature_ids.get("gene1"),
+                    Feature.objects.get(
+                        organism=organism, uniquename="gene1"
+                    ).feature_id,
+                )
+                self.assertEqual(
+                    sorted(
+                        Feature.objects.filter(organism=organism)
+                        .exclude(type__name="chromosome")
+                        .values_list("uniquename", flat=True)
+                    ),
+                    ["exon1", "gene1"],
+                )
+
+    def test_importing_error_survives_pickling(self):
+        """Test worker errors keep their context in the parent process."""
+        error = pickle.loads(
+            pickle.dumps(ImportingError("Failed", file="contigs.gff3", line=3))
+        )
+        self.assertEqual(str(error), "Line 3: File: contigs.gff3 - Failed")
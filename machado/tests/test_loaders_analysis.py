@@ -6,6 +6,8 @@
 
 """Tests for analysis loader."""
 
+import numpy as np
+from django.core.exceptions import ObjectDoesNotExist
 from django.test import TestCase
 from machado.loaders.analysis import AnalysisLoader
 
@@ -195,3 +197,62 @@ class AnalysisLoaderTest(TestCase):
             Analysisfeature.objects.get(analysis=analysis, identity=95.0).feature,
             feature,
         )
+
+    def test_store_analysisfeature_matrix(self):
+        """Test store analysisfeature matrix."""
+        org = Organism.objects.create(genus="Matrix", species="species")
+        features = [
+            Feature.objects.create(
+                organism=org,
+                uniquename="matrix{}".format(i),
+                type=self.type_mrna,
+                is_analysis=False,
+                is_obsolete=False,
+                timeaccessioned="2023-01-01T00:00:00Z",
+                timelastmodified="2023-01-01T00:00:00Z",
+            )
+            for i in range(2)
+        ]
+        analyses = [
+            Analysis.objects.create(
+                program="p",
+                sourcename="sample{}".format(i),
+                programversion="v",
+                timeexecuted="2023-01-01T00:00:00Z",
+            )
+            for i in range(3)
+        ]
+        scores = np.array(
+            [[1.5, 0.0, np.nan], [0.0, 2.25, 3.0], [4.0, 5.0, 6.0]],
+        )
+
+        with self.assertRaises(ObjectDoesNotExist):
+            self.loader.store_analysisfeature_matrix(
+                analyses, ["matrix0", "matrix1", "missing"], org, scores
+            )
+        self.loader.store_analysisfeature_matrix(
+            analyses,
+            ["matrix0", "matrix1", "missing"],
+            org,
+            scores,
+            norm=False,
+            ignorenotfound=True,
+        )
+
+        self.assertEqual(
+            sorted(
+                Analysisfeature.objects.filter(feature__in=features).values_list(
+                    "feature__uniquename", "analysis__sourcename", "rawscore"
+                )
+            ),
+            [
+                ("matrix0", "sample0", 1.5),
+                ("matrix1", "sample1", 2.25),
+                ("matrix1", "sample2", 3.0),
+            ],
+        )
+        self.assertFalse(
+            Analysisfeature.objects.filter(normscore__isnull=False).exists()
+        )
+        self.assertEqual(len(self.loader.not_found), 1)
+        self.assertIn("missing", self.loader.not_found[0])
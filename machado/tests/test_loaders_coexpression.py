@@ -8,8 +8,10 @@
 
 from datetime import datetime
 
+import numpy as np
 from django.test import TestCase
 
+from machado.loaders.exceptions import ImportingError
 from machado.loaders.feature import FeatureLoader, MultispeciesFeatureLoader
 from machado.models import Cv, Cvterm, Db, Dbxref, Organism
 from machado.models import Feature, Featureprop
@@ -425,3 +427,74 @@ class CoexpressionTest(TestCase):
                 value=test_cluster3_name,
             ).exists()
         )
+
+    def test_store_feature_pair_batch(self):
+        """Test the batch of pairs matches the pair by pair rows."""
+        organism = Organism.objects.create(genus="Coexpression", species="batch")
+        db = Db.objects.create(name="SO")
+        cv_seq = Cv.objects.create(name="sequence")
+        cv_rel = Cv.objects.create(name="relationship")
+        terms = dict()
+        for name, cv in [
+            ("located in", cv_rel),
+            ("correlated with", cv_rel),
+            ("mRNA", cv_seq),
+            ("polypeptide", cv_seq),
+            ("protein_match", cv_seq),
+        ]:
+            terms[name] = Cvterm.objects.create(
+                name=name,
+                cv=cv,
+                dbxref=Dbxref.objects.create(db=db, accession=name),
+                is_obsolete=0,
+                is_relationshiptype=0,
+            )
+        for i in range(3):
+            Feature.objects.create(
+                organism=organism,
+                uniquename="GENE{}".format(i),
+                is_analysis=False,
+                type=terms["mRNA"],
+                is_obsolete=False,
+                timeaccessioned=datetime.now(),
+                timelastmodified=datetime.now(),
+            )
+        pairs = [("GENE0", "GENE1"), ("GENE0", "MISSING"), ("GENE2", "GENE0")]
+        values = np.array([0.1818928687089519, 0.1, -0.05]) + 0.7
+
+        loader = FeatureLoader(source="null", filename="row.txt", organism=organism)
+        for pair, value in zip(pairs, values.tolist()):
+            loader.store_feature_pairs(
+                pair=list(pair), term=terms["correlated with"], value=value
+            )
+        row_pairs = list(
+            FeatureRelationship.objects.values_list(
+                "subject__uniquename", "object__uniquename", "value", "rank"
+            )
+        )
+        FeatureRelationship.objects.all().delete()
+
+        loader = FeatureLoader(source="null", filename="batch.txt", organism=organism)
+        loader.store_feature_pair_batch(pairs, values, terms["correlated with"])
+
+        self.assertEqual(
+            sorted(
+                FeatureRelationship.objects.values_list(
+                    "subject__uniquename", "object__uniquename", "value", "rank"
+                )
+            ),
+            sorted(row_pairs),
+        )
+        self.assertEqual(len(row_pairs), 2)
+        self.assertEqual(
+            sorted(
+                FeatureRelationshipprop.objects.values_list(
+                    "feature_relationship__subject__uniquename", "value", "rank"
+                )
+            ),
+            [("GENE0", "batch.txt", 0), ("GENE2", "batch.txt", 0)],
+        )
+        self.assertEqual(loader.unresolved_relationships, [("GENE0", "MISSING")])
+        with self.assertRaisesRegex(ImportingError, "feature_relationship_c1"):
+            loader.store_feature_pair_batch(pairs[:1], values[:1], terms["mRNA"])
+            loader.store_feature_pair_batch(pairs[:1], values[:1], terms["mRNA"])
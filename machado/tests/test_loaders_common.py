@@ -8,12 +8,15 @@
 
 import os
 import gzip
+import pickle
 import tempfile
 from django.test import TestCase
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
 from machado.loaders.common import (
+    AccessionResolver,
     FileValidator,
     FieldsValidator,
+    ReferenceCache,
     get_num_lines,
     insert_organism,
     retrieve_organism,
@@ -30,6 +33,7 @@ from machado.models import (
     Db,
     FeatureDbxref,
     Cvtermsynonym,
+    Pub,
 )
 
 
@@ -244,6 +248,112 @@ class FeatureUtilsTest(TestCase):
         with self.assertRaisesRegex(ObjectDoesNotExist, "does not exist"):
             retrieve_feature_id("unknown", "gene", self.org)
 
+    def test_accession_resolver(self):
+        """Test the resolver follows the retrieve_feature_id steps."""
+        dbxref2 = Dbxref.objects.create(db=self.db, accession="acc2", version="1")
+        FeatureDbxref.objects.create(
+            feature=self.feature, dbxref=dbxref2, is_current=True
+        )
+        resolver = AccessionResolver()
+        for accession in ["feat1", "FEAT ONE", "ACC1", "acc2"]:
+            with self.subTest(accession=accession):
+                self.assertEqual(
+                    resolver.resolve(accession, "gene", self.org),
+                    self.feature.feature_id,
+                )
+        with self.assertNumQueries(0):
+            resolver.resolve("feat1", "gene", self.org)
+        with self.assertRaisesRegex(ObjectDoesNotExist, "does not exist"):
+            resolver.resolve("unknown", "gene", self.org)
+
+    def test_accession_resolver_ambiguous(self):
+        """Test ambiguous keys raise unless the organism is not given."""
+        other = Organism.objects.create(genus="Other", species="species")
+        for organism, uniquename in [(self.org, "feat2"), (other, "feat1")]:
+            Feature.objects.create(
+                organism=organism,
+                uniquename=uniquename,
+                name="Feat One",
+                type=self.type_gene,
+                is_analysis=False,
+                is_obsolete=False,
+                timeaccessioned="2023-01-01T00:00:00Z",
+                timelastmodified="2023-01-01T00:00:00Z",
+            )
+        resolver = AccessionResolver()
+        with self.assertRaises(MultipleObjectsReturned):
+            resolver.resolve("Feat One", "gene", self.org)
+        self.assertEqual(resolver.resolve("acc1", "gene"), self.feature.feature_id)
+
+    def test_accession_resolver_stored_later(self):
+        """Test features stored after the namespace is read are found."""
+        resolver = AccessionResolver()
+        resolver.resolve("feat1", "gene", self.org)
+        feature = Feature.objects.create(
+            organism=self.org,
+            uniquename="feat3",
+            type=self.type_gene,
+            is_analysis=False,
+            is_obsolete=False,
+            timeaccessioned="2023-01-01T00:00:00Z",
+            timelastmodified="2023-01-01T00:00:00Z",
+        )
+        with self.assertRaises(ObjectDoesNotExist):
+            resolver.resolve("feat3", "gene", self.org, query=False)
+        self.assertEqual(
+            resolver.resolve("feat3", "gene", self.org), feature.feature_id
+        )
+
+    def test_accession_resolver_resolve_batch(self):
+        """Test resolve_batch gives the feature_ids resolve gives."""
+        dbxref2 = Dbxref.objects.create(db=self.db, accession="acc2", version="1")
+        FeatureDbxref.objects.create(
+            feature=self.feature, dbxref=dbxref2, is_current=True
+        )
+        other = Organism.objects.create(genus="Other", species="species")
+        for organism, uniquename in [
+            (self.org, "gene-feat4"),
+            (self.org, "feat5"),
+            (other, "feat1"),
+        ]:
+            Feature.objects.create(
+                organism=organism,
+                uniquename=uniquename,
+                name="Feat Five" if uniquename == "feat5" else "Feat Two",
+                type=self.type_gene,
+                is_analysis=False,
+                is_obsolete=False,
+                timeaccessioned="2023-01-01T00:00:00Z",
+                timelastmodified="2023-01-01T00:00:00Z",
+            )
+        accessions = [
+            "feat1",
+            "feat4",
+            "FEAT ONE",
+            "feat two",
+            "ACC1",
+            "acc2",
+            "feat five",
+            "unknown",
+        ]
+        for organism in [self.org, None]:
+            with self.subTest(organism=organism):
+                expected = dict()
+                for accession in accessions:
+                    try:
+                        expected[accession] = AccessionResolver().resolve(
+                            accession, "gene", organism
+                        )
+                    except (ObjectDoesNotExist, MultipleObjectsReturned):
+                        pass
+                with self.assertNumQueries(5):
+                    resolved = AccessionResolver().resolve_batch(
+                        accessions, "gene", organism
+                    )
+                self.assertEqual(resolved, expected)
+        self.assertNotIn("feat1", resolved)
+        self.assertEqual(len(resolved), 5)
+
 
 class CvtermUtilsTest(TestCase):
     """Test suite for CvtermUtils."""
@@ -278,3 +388,65 @@ class CvtermUtilsTest(TestCase):
             ImportingError, r"\(test_cv\).*Ontology term 'unknown' not found"
         ):
             retrieve_cvterm("test_cv", "unknown")
+
+
+class ReferenceCacheTest(TestCase):
+    """Test suite for ReferenceCache."""
+
+    def setUp(self):
+        """Set up test context."""
+        self.db = Db.objects.create(name="GO")
+        self.cv = Cv.objects.create(name="biological_process")
+        self.term = Cvterm.objects.create(
+            name="go term",
+            cv=self.cv,
+            dbxref=Dbxref.objects.create(db=self.db, accession="0000001"),
+            is_obsolete=0,
+            is_relationshiptype=0,
+        )
+        self.cache = ReferenceCache()
+
+    def test_memoize(self):
+        """Test lookups run once per key."""
+        calls = list()
+
+        def lookup():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(self.cache.memoize(("key",), lookup), 1)
+        self.assertEqual(self.cache.memoize(("key",), lookup), 1)
+        self.assertEqual(len(calls), 1)
+
+    def test_cvterm(self):
+        """Test cvterm."""
+        self.assertEqual(self.cache.cvterm("go term", "biological_process"), self.term)
+        with self.assertNumQueries(0):
+            self.cache.cvterm("go term", "biological_process")
+        with self.assertRaises(ObjectDoesNotExist):
+            self.cache.cvterm("missing", "biological_process")
+
+    def test_ontology_term(self):
+        """Test missing ontology terms are cached as None."""
+        self.assertEqual(self.cache.ontology_term("GO", "0000001"), self.term)
+        self.assertIsNone(self.cache.ontology_term("GO", "9999999"))
+        self.assertIn(("ontology_term", "GO", "9999999"), self.cache.items)
+
+    def test_null_pub_and_property_cvterm(self):
+        """Test reference rows are created once."""
+        pub = self.cache.null_pub()
+        self.assertEqual(pub, Pub.objects.get(uniquename="null"))
+        self.assertEqual(pub.type, Cvterm.objects.get(name="null", cv__name="null"))
+        cvterm = self.cache.property_cvterm("note")
+        self.assertEqual(cvterm.cv.name, "feature_property")
+        self.assertEqual(cvterm.dbxref.db.name, "null")
+        self.assertEqual(self.cache.property_cvterm("note"), cvterm)
+        self.assertEqual(
+            Cvterm.objects.filter(name="note", cv__name="feature_property").count(), 1
+        )
+
+    def test_pickle(self):
+        """Test the cached values are copied into worker processes."""
+        self.cache.db("GO")
+        cache = pickle.loads(pickle.dumps(self.cache))
+        self.assertEqual(cache.items, self.cache.items)
@@ -6,12 +6,14 @@
 
 """Tests for feature loader."""
 
+import pickle
 from datetime import datetime, timezone
 from django.test import TestCase
 from django.db.utils import IntegrityError
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.exceptions import MultipleObjectsReturned, ObjectDoesNotExist
 from unittest.mock import MagicMock, patch, PropertyMock
 from machado.loaders.feature import (
+    FeatureIdMap,
     FeatureLoaderBase,
     FeatureLoader,
     MultispeciesFeatureLoader,
@@ -322,6 +324,53 @@ class FeatureLoaderTest(TestCase):
         loader = FeatureLoader("GFF_REL_NF", "test.gff", self.org)
         self.ensure_cvterm("part_of", self.cv_seq)
         loader.store_relationship("nonexistent_rel1", "nonexistent_rel2")
+        self.assertEqual(
+            loader.unresolved_relationships,
+            [("nonexistent_rel2", "nonexistent_rel1")],
+        )
+
+    def test_store_relationships(self):
+        """Test store relationships from the run map and the database."""
+        loader = FeatureLoader("GFF_RELS", "test.gff", self.org)
+        part_of = self.ensure_cvterm("part_of", self.cv_seq)
+        gene_type = self.ensure_cvterm("gene", self.cv_seq)
+        mrna_type = self.ensure_cvterm("mRNA", self.cv_seq)
+        gene = self.create_feat("rels_gene", gene_type)
+        mrna = self.create_feat("rels_mrna", mrna_type)
+        self.create_feat("rels_mrna", self.cvterm_poly, dbxref=mrna.dbxref)
+        loader.feature_ids.add("rels_mrna", mrna.feature_id)
+        loader.store_relationships(
+            [
+                {"subject_id": "rels_gene", "object_id": "rels_mrna"},
+                {"subject_id": "rels_gene", "object_id": "rels_mrna"},
+                {"subject_id": "rels_mrna", "object_id": "rels_missing"},
+            ]
+        )
+        self.assertEqual(
+            FeatureRelationship.objects.filter(
+                subject=gene, object=mrna, type=part_of, rank=0
+            ).count(),
+            1,
+        )
+        self.assertEqual(
+            loader.unresolved_relationships, [("rels_missing", "rels_mrna")]
+        )
+
+    def test_feature_id_map(self):
+        """Test feature id map."""
+        feature_ids = FeatureIdMap()
+        feature_ids.add("b", 2)
+        feature_ids.add("a", 1)
+        other = FeatureIdMap()
+        other.add("c", 3)
+        other.add("a", 4)
+        self.assertEqual(feature_ids.get("b"), 2)
+        self.assertIsNone(feature_ids.get("c"))
+        feature_ids.update(pickle.loads(pickle.dumps(other)))
+        self.assertEqual(len(feature_ids), 4)
+        self.assertEqual(feature_ids.get("c"), 3)
+        with self.assertRaises(MultipleObjectsReturned):
+            feature_ids.get("a")
 
     def test_store_feature_dbxref(self):
         """Test store feature dbxref."""
@@ -476,6 +525,60 @@ class FeatureLoaderTest(TestCase):
             FeatureDbxref.objects.filter(feature=feat, dbxref__accession="O1").exists()
         )
 
+    def test_multispecies_store_bio_searchio_hits(self):
+        """Test the bulk hit path writes the same rows as the row path."""
+        db_go = Db.objects.get_or_create(name="GO")[0]
+        Cvterm.objects.get_or_create(
+            name="term bulk",
+            cv=self.cv_seq,
+            dbxref=Dbxref.objects.get_or_create(db=db_go, accession="0002")[0],
+            is_obsolete=0,
+            is_relationshiptype=0,
+        )
+
+        def hits(prefix):
+            items = list()
+            for i, dbxrefs in enumerate(
+                [["GO:0002", "PANTHER:P1"], ["GO:0002", "GO:8888"], ["PANTHER:P1"]]
+            ):
+                hit_mock = MagicMock()
+                hit_mock.id = "{}_{}".format(prefix, i)
+                hit_mock.accession = "ACC_{}".format(i)
+                hit_mock.attributes = {"Target": "Pfam"}
+                hit_mock.dbxrefs = dbxrefs
+                items.append((hit_mock, "InterPro"))
+            return items
+
+        def snapshot(prefix):
+            start = len(prefix)
+            features = Feature.objects.filter(uniquename__startswith=prefix)
+            return (
+                sorted(
+                    (f.uniquename[start:], f.name, f.dbxref.db.name) for f in features
+                ),
+                sorted(
+                    (fc.feature.uniquename[start:], fc.cvterm.name)
+                    for fc in FeatureCvterm.objects.filter(feature__in=features)
+                ),
+                sorted(
+                    (fd.feature.uniquename[start:], fd.dbxref.accession)
+                    for fd in FeatureDbxref.objects.filter(feature__in=features)
+                ),
+            )
+
+        loader = MultispeciesFeatureLoader("INTERPROSCAN_SOURCE", "test.xml")
+        for hit_mock, target in hits("ROW"):
+            loader.store_bio_searchio_hit(hit_mock, target)
+        bulk_hits = hits("BULK")
+        bulk_loader = MultispeciesFeatureLoader("INTERPROSCAN_SOURCE", "test.xml")
+        bulk_loader.store_bio_searchio_hits(bulk_hits[:2] + bulk_hits[:1])
+        bulk_loader.store_bio_searchio_hits(bulk_hits[1:])
+
+        self.assertEqual(snapshot("ROW"), snapshot("BULK"))
+        self.assertEqual(len(snapshot("BULK")[2]), 2)
+        self.assertEqual(bulk_loader.ignored_goterms, {"GO:8888"})
+        self.assertEqual(Db.objects.filter(name="PFAM").count(), 1)
+
     def test_store_feature_publication(self):
         """Test store feature publication."""
         loader = FeatureLoader("GFF_PUB", "test.gff", self.org)
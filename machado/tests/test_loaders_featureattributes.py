@@ -10,6 +10,7 @@ from datetime import datetime, timezone
 
 from django.test import TestCase
 
+from machado.loaders.common import ReferenceCache
 from machado.loaders.feature import FeatureLoader
 from machado.loaders.featureattributes import FeatureAttributesLoader
 from machado.models import Cv, Cvterm, Db, Dbxref, Organism
@@ -27,6 +28,19 @@ class FeatureTest(TestCase):
         self.assertEqual("1", test_attrs.get("id"))
         self.assertEqual("feat1", test_attrs.get("name"))
 
+    def test_shared_reference_cache(self):
+        """Tests - attributes loaders sharing a reference cache."""
+        refcache = ReferenceCache()
+        test_attrs_file = FeatureAttributesLoader(
+            filecontent="genome", refcache=refcache
+        )
+        with self.assertNumQueries(0):
+            other_attrs_file = FeatureAttributesLoader(
+                filecontent="polymorphism", refcache=refcache
+            )
+        self.assertEqual(test_attrs_file.pub, other_attrs_file.pub)
+        self.assertEqual("null", other_attrs_file.pub.uniquename)
+
     def test_process_attributes(self):
         """Tests - get attributes."""
         test_organism = Organism.objects.create(genus="Mus", species="musculus")
@@ -0,0 +1,317 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Tests for bulk feature loader."""
+
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+from django.test import TestCase
+
+from machado.loaders.exceptions import ImportingError
+from machado.loaders.feature import FeatureLoader
+from machado.loaders.featurebulk import FeatureBulkLoader
+from machado.models import (
+    Cv,
+    Cvterm,
+    Db,
+    Dbxref,
+    Dbxrefprop,
+    Feature,
+    FeatureCvterm,
+    FeatureDbxref,
+    Featureloc,
+    Featureprop,
+    FeatureRelationship,
+    FeatureSynonym,
+    Organism,
+)
+
+GFF_ROWS = [
+    ("gene", "ID=GENE1;Name=gene one;Note=first%20gene", 100, 900, "+", "."),
+    (
+        "mRNA",
+        "ID=MRNA1;Parent=GENE1;Dbxref=PFAM:PF00001,pacid:1;"
+        "Ontology_term=GO:0000001,GO:9999999;Alias=mrna-one",
+        100,
+        900,
+        "+",
+        ".",
+    ),
+    ("exon", "Parent=MRNA1", 100, 300, "+", "0"),
+    ("CDS", "ID=CDS1;Parent=MRNA1;display=cds", 150, 300, "-", "1"),
+]
+
+
+VCF_ROWS = [
+    ("rs1", 99, "A", "T,G", "50", "VC=SNV;AF=0.5"),
+    ("rs2", 199, "C", "T", ".", "TSA=SNV"),
+]
+
+
+class FeatureBulkLoaderTest(TestCase):
+    """Test suite for FeatureBulkLoader."""
+
+    def setUp(self):
+        """Set up test context."""
+        self.db_internal = Db.objects.get_or_create(name="internal")[0]
+        cv_rel = Cv.objects.get_or_create(name="relationship")[0]
+        self.cv_seq = Cv.objects.get_or_create(name="sequence")[0]
+        cv_synonym = Cv.objects.get_or_create(name="synonym_type")[0]
+        self.ensure_cvterm("located in", cv_rel)
+        self.ensure_cvterm("exact", cv_synonym)
+        for name in [
+            "polypeptide",
+            "protein_match",
+            "chromosome",
+            "gene",
+            "mRNA",
+            "exon",
+            "CDS",
+            "translation_of",
+            "part_of",
+            "SNV",
+            "quality_value",
+        ]:
+            self.ensure_cvterm(name, self.cv_seq)
+        db_go = Db.objects.get_or_create(name="GO")[0]
+        go_dbxref = Dbxref.objects.create(db=db_go, accession="0000001")
+        Cvterm.objects.create(
+            name="go term",
+            cv=Cv.objects.get_or_create(name="biological_process")[0],
+            dbxref=go_dbxref,
+            definition="",
+            is_obsolete=0,
+            is_relationshiptype=0,
+        )
+
+    def ensure_cvterm(self, name, cv):
+        """ensure_cvterm."""
+        dbxref, created = Dbxref.objects.get_or_create(
+            db=self.db_internal, accession=f"acc_{name}"
+        )
+        return Cvterm.objects.get_or_create(
+            name=name,
+            cv=cv,
+            is_obsolete=0,
+            defaults={
+                "dbxref": dbxref,
+                "is_relationshiptype": 0,
+                "definition": "",
+            },
+        )[0]
+
+    def create_organism(self, species):
+        """Create an organism with its own reference sequence."""
+        organism = Organism.objects.create(genus="Genus", species=species)
+        db_fasta = Db.objects.get_or_create(name="FASTA_SOURCE")[0]
+        dbxref = Dbxref.objects.create(db=db_fasta, accession=f"CHR_{species}")
+        Feature.objects.create(
+            organism=organism,
+            uniquename=f"CHR_{species}",
+            type=Cvterm.objects.get(name="chromosome", cv=self.cv_seq),
+            dbxref=dbxref,
+            is_analysis=False,
+            is_obsolete=False,
+            timeaccessioned=datetime.now(timezone.utc),
+            timelastmodified=datetime.now(timezone.utc),
+        )
+        return organism
+
+    def tabix_rows(self, contig):
+        """Return the GFF rows as tabix-like objects."""
+        rows = list()
+        for feature, attributes, start, end, strand, frame in GFF_ROWS:
+            row = MagicMock()
+            row.feature = feature
+            row.attributes = attributes
+            row.contig = contig
+            row.start = start
+            row.end = end
+            row.strand = strand
+            row.frame = frame
+            rows.append(row)
+        return rows
+
+    def snapshot(self, organism):
+        """Return the rows attached to an organism's features."""
+        features = Feature.objects.filter(organism=organism).exclude(
+            uniquename__startswith="CHR_"
+        )
+
+        def key(feature):
+            if feature.uniquename.startswith("auto"):
+                return ("auto", feature.type.name)
+            return (feature.uniquename, feature.type.name)
+
+        return {
+            "features": sorted(
+                key(f)
+                + (f.name, f.dbxref.accession.startswith("auto") or f.dbxref.accession)
+                for f in features
+            ),
+            "featurelocs": sorted(
+                key(loc.feature)
+                + (
+                    loc.srcfeature.organism_id == organism.organism_id,
+                    loc.fmin,
+                    loc.fmax,
+                    loc.strand,
+                    loc.phase,
+                )
+                for loc in Featureloc.objects.filter(feature__in=features)
+            ),
+            "featureprops": sorted(
+                key(prop.feature) + (prop.type.name, prop.value, prop.rank)
+                for prop in Featureprop.objects.filter(feature__in=features)
+            ),
+            "cvterms": sorted(
+                key(fc.feature) + (fc.cvterm.name, fc.pub.uniquename)
+                for fc in FeatureCvterm.objects.filter(feature__in=features)
+            ),
+            "dbxrefs": sorted(
+                key(fd.feature) + (fd.dbxref.db.name, fd.dbxref.accession)
+                for fd in FeatureDbxref.objects.filter(feature__in=features)
+            ),
+            "synonyms": sorted(
+                key(fs.feature) + (fs.synonym.name, fs.synonym.type.name)
+                for fs in FeatureSynonym.objects.filter(feature__in=features)
+            ),
+            "relationships": sorted(
+                key(fr.subject) + key(fr.object) + (fr.type.name, fr.rank)
+                for fr in FeatureRelationship.objects.filter(subject__in=features)
+            ),
+        }
+
+    def test_store_tabix_GFF_features_matches_row_by_row(self):
+        """Test the bulk path writes the same rows as the row-by-row path."""
+        org_row = self.create_organism("row")
+        org_bulk = self.create_organism("bulk")
+
+        loader = FeatureLoader("GFF_SOURCE", "row.gff", org_row)
+        for i, row in enumerate(self.tabix_rows("CHR_row")):
+            loader.store_tabix_GFF_feature(row, qtl=False, line=i + 1)
+        for item in loader.relationships:
+            loader.store_relationship(item["subject_id"], item["object_id"])
+
+        bulk_loader = FeatureBulkLoader("GFF_SOURCE", "bulk.gff", org_bulk)
+        rows = list(enumerate(self.tabix_rows("CHR_bulk"), start=1))
+        bulk_loader.store_tabix_GFF_features(rows[:3], qtl=False)
+        bulk_loader.store_tabix_GFF_features(rows[3:], qtl=False)
+        for item in bulk_loader.relationships:
+            bulk_loader.store_relationship(item["subject_id"], item["object_id"])
+
+        self.assertEqual(self.snapshot(org_row), self.snapshot(org_bulk))
+        self.assertEqual(
+            [item["subject_id"] for item in loader.relationships],
+            [item["subject_id"] for item in bulk_loader.relationships],
+        )
+        self.assertIn("GO:9999999", bulk_loader.ignored_goterms)
+        self.assertTrue(
+            Dbxrefprop.objects.filter(
+                dbxref__accession="MRNA1",
+                dbxref__version="bulk.gff",
+                value="bulk.gff",
+            ).exists()
+        )
+
+    def test_store_tabix_GFF_features_already_registered(self):
+        """Test store tabix GFF features already registered."""
+        organism = self.create_organism("dup")
+        loader = FeatureBulkLoader("GFF_SOURCE", "dup.gff", organism)
+        rows = list(enumerate(self.tabix_rows("CHR_dup")[:1], start=1))
+        loader.store_tabix_GFF_features(rows, qtl=False)
+        with self.assertRaisesRegex(ImportingError, "'GENE1' is already registered"):
+            loader.store_tabix_GFF_features(rows, qtl=False)
+        self.assertEqual(
+            Feature.objects.filter(organism=organism, uniquename="GENE1").count(), 1
+        )
+
+    def test_store_tabix_GFF_features_contig_fail(self):
+        """Test store tabix GFF features contig fail."""
+        organism = self.create_organism("contig")
+        loader = FeatureBulkLoader("GFF_SOURCE", "contig.gff", organism)
+        row = self.tabix_rows("CHR_contig")[0]
+        row.contig = "MISSING_CONTIG"
+        with self.assertRaisesRegex(ImportingError, "FASTA_SOURCE MISSING_CONTIG"):
+            loader.store_tabix_GFF_features([(1, row)], qtl=False)
+        self.assertFalse(Feature.objects.filter(uniquename="GENE1").exists())
+
+    def vcf_snapshot(self, organism):
+        """Return the rows attached to an organism's variants."""
+        features = Feature.objects.filter(organism=organism, type__name="SNV")
+        return {
+            "features": sorted(
+                (f.uniquename, f.name, f.dbxref.accession) for f in features
+            ),
+            "featurelocs": sorted(
+                (
+                    loc.feature.uniquename,
+                    loc.srcfeature_id is not None,
+                    loc.fmin,
+                    loc.fmax,
+                    loc.residue_info,
+                    loc.rank,
+                )
+                for loc in Featureloc.objects.filter(feature__in=features)
+            ),
+            "featureprops": sorted(
+                (prop.feature.uniquename, prop.type.name, prop.value, prop.rank)
+                for prop in Featureprop.objects.filter(feature__in=features)
+            ),
+        }
+
+    def test_store_tabix_VCF_features_matches_row_by_row(self):
+        """Test the bulk VCF path writes the same rows as the row path."""
+        org_row = self.create_organism("vcfrow")
+        org_bulk = self.create_organism("vcfbulk")
+        rows = dict()
+        for species in ["vcfrow", "vcfbulk"]:
+            rows[species] = list()
+            for uniquename, pos, ref, alt, qual, info in VCF_ROWS:
+                row = MagicMock()
+                row.id = "{}_{}".format(uniquename, species)
+                row.contig = "CHR_{}".format(species)
+                row.pos = pos
+                row.ref = ref
+                row.alt = alt
+                row.qual = qual
+                row.info = info
+                rows[species].append(row)
+
+        loader = FeatureLoader("VCF_SOURCE", "row.vcf", org_row)
+        for row in rows["vcfrow"]:
+            loader.store_tabix_VCF_feature(row)
+        bulk_loader = FeatureBulkLoader("VCF_SOURCE", "bulk.vcf", org_bulk)
+        bulk_loader.store_tabix_VCF_features(list(enumerate(rows["vcfbulk"], 1)))
+
+        snapshots = [self.vcf_snapshot(org_row), self.vcf_snapshot(org_bulk)]
+        for snapshot, species in zip(snapshots, ["vcfrow", "vcfbulk"]):
+            for key, values in snapshot.items():
+                snapshot[key] = [
+                    tuple(
+                        (
+                            value.replace("_" + species, "")
+                            if isinstance(value, str)
+                            else value
+                        )
+                        for value in item
+                    )
+                    for item in values
+                ]
+        self.assertEqual(snapshots[0], snapshots[1])
+        self.assertEqual(len(snapshots[1]["featurelocs"]), 5)
+        self.assertEqual(
+            snapshots[1]["featureprops"], [("rs1", "quality_value", "50", 0)]
+        )
+
+        with self.assertRaisesRegex(ImportingError, "'rs1_vcfbulk' is already"):
+            bulk_loader.store_tabix_VCF_features(
+                list(enumerate(rows["vcfbulk"][:1], 1))
+            )
+        rows["vcfbulk"][0].info = "AF=0.5"
+        with self.assertRaisesRegex(ImportingError, "Line 1: .*variation type"):
+            bulk_loader.store_tabix_VCF_features([(1, rows["vcfbulk"][0])])
@@ -6,13 +6,18 @@
 
 """Tests for ontology loader."""
 
+from os.path import dirname, join
+
+import obonet
+from django.db import transaction
 from django.test import TestCase
-from machado.loaders.ontology import OntologyLoader
+from machado.loaders.ontology import OntologyLoader, store_cvtermpath
 from machado.loaders.exceptions import ImportingError
 from machado.models import (
     Cvterm,
     Cvtermprop,
     CvtermDbxref,
+    Cvtermpath,
     Cvtermsynonym,
     CvtermRelationship,
 )
@@ -189,3 +194,131 @@ class OntologyLoaderTest(TestCase):
         self.assertTrue(
             CvtermDbxref.objects.filter(cvterm=cvterm, dbxref__db__name="URL").exists()
         )
+
+    def snapshot(self):
+        """Return the rows written by the ontology loader."""
+        return {
+            "cvterms": sorted(
+                Cvterm.objects.values_list(
+                    "cv__name",
+                    "name",
+                    "definition",
+                    "dbxref__db__name",
+                    "dbxref__accession",
+                    "is_relationshiptype",
+                )
+            ),
+            "dbxrefs": sorted(
+                CvtermDbxref.objects.values_list(
+                    "cvterm__name",
+                    "dbxref__db__name",
+                    "dbxref__accession",
+                    "is_for_definition",
+                )
+            ),
+            "props": sorted(
+                Cvtermprop.objects.values_list(
+                    "cvterm__name", "type__name", "value", "rank"
+                )
+            ),
+            "synonyms": sorted(
+                Cvtermsynonym.objects.values_list(
+                    "cvterm__name", "synonym", "type__name"
+                )
+            ),
+            "relationships": sorted(
+                CvtermRelationship.objects.values_list(
+                    "subject__name", "object__name", "type__name"
+                )
+            ),
+        }
+
+    def load_so_fake(self, bulk):
+        """Load so_fake.obo and return the snapshot, rolling it back."""
+        with open(join(dirname(__file__), "data", "so_fake.obo")) as obo_file:
+            G = obonet.read_obo(obo_file)
+        with transaction.atomic():
+            for typedef in G.graph["typedefs"]:
+                self.loader.store_type_def(typedef)
+            if bulk:
+                self.loader.store_terms(G.nodes(data=True))
+                self.loader.store_relationships(G.edges(keys=True))
+            else:
+                for n, data in G.nodes(data=True):
+                    self.loader.store_term(n, data)
+                for u, v, type in G.edges(keys=True):
+                    self.loader.store_relationship(u, v, type)
+            snapshot = self.snapshot()
+            if bulk:
+                # storing the same terms again doesn't add any row
+                self.loader.store_terms(G.nodes(data=True))
+                self.loader.store_relationships(G.edges(keys=True))
+                self.assertEqual(snapshot, self.snapshot())
+            transaction.set_rollback(True)
+        return snapshot
+
+    def test_store_terms(self):
+        """Test store terms stores the same rows as store term."""
+        snapshot = self.load_so_fake(bulk=True)
+        self.assertEqual(self.load_so_fake(bulk=False), snapshot)
+        self.assertIn(
+            ("scRNA", "scRNA_primary_transcript", "derives_from"),
+            snapshot["relationships"],
+        )
+        self.assertIn(
+            ("scRNA", "URL", 'http://web.site/FakeData "wiki"', 0),
+            snapshot["dbxrefs"],
+        )
+        self.assertIn(("scRNA", "SO", "ke", 1), snapshot["dbxrefs"])
+        self.assertIn(
+            ("scRNA_primary_transcript", "small_cytoplasmic_RNA", "related"),
+            snapshot["synonyms"],
+        )
+
+    def test_store_terms_fail(self):
+        """Test store terms fail."""
+        with self.assertRaisesRegex(ImportingError, "Failed to load ontology term"):
+            self.loader.store_terms([("SO:0001", {"namespace": "sequence"})])
+        self.loader.store_terms([("SO:0001", {"name": "gene"})])
+        with self.assertRaisesRegex(ImportingError, "registered to the cvterm 'gene'"):
+            self.loader.store_terms([("SO:0001", {"name": "other"})])
+        with self.assertRaisesRegex(ImportingError, "not registered: SO:0002, part_of"):
+            self.loader.store_relationships([("SO:0001", "SO:0002", "part_of")])
+        self.assertFalse(Cvterm.objects.filter(name="other").exists())
+
+    def test_store_cvtermpath(self):
+        """Test store cvtermpath."""
+        self.loader.store_type_def({"id": "part_of", "name": "part_of"})
+        self.loader.store_terms(
+            [("SO:000{}".format(i), {"name": name}) for i, name in enumerate("ABCD")]
+        )
+        self.loader.store_relationships(
+            [
+                ("SO:0001", "SO:0000", "is_a"),
+                ("SO:0002", "SO:0001", "is_a"),
+                ("SO:0003", "SO:0002", "part_of"),
+                ("SO:0003", "SO:0000", "is_a"),
+            ]
+        )
+        expected = [
+            ("B", "A", "is_a", 1),
+            ("C", "A", "is_a", 2),
+            ("C", "B", "is_a", 1),
+            ("D", "A", "is_a", 1),
+            ("D", "A", "part_of", 3),
+            ("D", "B", "part_of", 2),
+            ("D", "C", "part_of", 1),
+        ]
+        for i in range(2):
+            # the paths are replaced when stored again
+            self.assertEqual(store_cvtermpath(["sequence"]), len(expected))
+            self.assertEqual(
+                sorted(
+                    Cvtermpath.objects.filter(cv__name="sequence").values_list(
+                        "subject__name", "object__name", "type__name", "pathdistance"
+                    )
+                ),
+                expected,
+            )
+        with self.assertRaisesRegex(ImportingError, "Cv not registered: missing"):
+            store_cvtermpath(["sequence", "missing"])
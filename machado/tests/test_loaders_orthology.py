@@ -600,3 +600,22 @@ class OrthologyTest(TestCase):
                 value=group1_name,
             ).exists()
         )
+
+        # the batch path stores the same featureprops
+        groups = [
+            (group1_name, members1),
+            (group2_name, members2),
+            (group3_name, members3),
+            (group4_name, members4),
+            (group5_name, members5),
+            (group6_name, members6),
+            (group7_name, members7),
+        ]
+        featureprops = Featureprop.objects.filter(type_id=term)
+        expected = sorted(featureprops.values_list("feature_id", "value", "rank"))
+        featureprops.delete()
+        with self.assertNumQueries(7):
+            test_orthology_loader.store_feature_group_batch(groups, term, soterm)
+        self.assertEqual(
+            sorted(featureprops.values_list("feature_id", "value", "rank")), expected
+        )
@@ -9,9 +9,11 @@
 from django.core.management import call_command
 from django.test import TestCase
 
+from machado.loaders.exceptions import ImportingError
 from machado.loaders.organism import OrganismLoader
 from machado.loaders.phylotree import PhylotreeLoader
-from machado.models import Organism, Phylonode, Phylotree
+from machado.management.commands.load_phylotree import Command
+from machado.models import Organism, Phylonode, PhylonodeOrganism, Phylotree
 
 
 class PhylotreeTest(TestCase):
@@ -105,3 +107,89 @@ class PhylotreeTest(TestCase):
         self.assertTrue(Phylotree.objects.filter(name="testTaxonomy").exists())
         call_command("remove_phylotree", "--name=testTaxonomy", "--verbosity=0")
         self.assertFalse(Phylotree.objects.filter(name="testTaxonomy").exists())
+
+    def test_store_phylonodes(self):
+        """Tests - store phylonodes matches store phylonode record."""
+        organism_db = OrganismLoader("testOrganism")
+        for taxid, scname in enumerate(
+            ["root", "Ilex", "Ilex paraguariensis", "Ilex montana"], start=1
+        ):
+            organism_db.store_organism_record(
+                taxid=taxid, scname=scname, synonyms=[], common_names=[]
+            )
+        command = Command()
+        command.nodes = {
+            1: {"parent_id": 1, "level": "no rank", "children": [1, 2]},
+            2: {"parent_id": 1, "level": "genus", "children": [3, 4]},
+            3: {"parent_id": 2, "level": "species", "children": []},
+            4: {"parent_id": 2, "level": "species", "children": []},
+        }
+        command.ctr = 0
+        command.walktree(node_id=1)
+
+        row = PhylotreeLoader(phylotree_name="row", organism_db="testOrganism")
+        for key, data in command.nodes.items():
+            tax_id, phylonode = row.store_phylonode_record(
+                tax_id=key,
+                parent_id=None,
+                level=data["level"],
+                left_idx=data["left_idx"],
+                right_idx=data["right_idx"],
+            )
+            data["phylonode_id"] = phylonode.phylonode_id
+        for key, data in command.nodes.items():
+            row.update_parent_phylonode_id(data["phylonode_id"], data["parent_id"])
+
+        bulk = PhylotreeLoader(phylotree_name="bulk", organism_db="testOrganism")
+        phylonode_ids = bulk.store_phylonodes(command.nodes)
+
+        def snapshot(name):
+            return sorted(
+                PhylonodeOrganism.objects.filter(
+                    phylonode__phylotree__name=name
+                ).values_list(
+                    "organism__genus",
+                    "organism__species",
+                    "phylonode__parent_phylonode__left_idx",
+                    "phylonode__type__name",
+                    "phylonode__left_idx",
+                    "phylonode__right_idx",
+                )
+            )
+
+        self.assertEqual(snapshot("row"), snapshot("bulk"))
+        self.assertEqual(
+            snapshot("bulk")[:2],
+            [
+                ("Ilex", ".spp", 1, "genus", 2, 7),
+                ("Ilex", "montana", 2, "species", 5, 6),
+            ],
+        )
+        self.assertEqual(
+            Phylonode.objects.get(phylonode_id=phylonode_ids[3]).parent_phylonode_id,
+            phylonode_ids[2],
+        )
+
+        command.nodes[5] = {"parent_id": 1, "level": "species", "left_idx": 9}
+        command.nodes[5]["right_idx"] = 10
+        with self.assertRaisesRegex(ImportingError, "taxonomic ID '5'"):
+            PhylotreeLoader(
+                phylotree_name="missing", organism_db="testOrganism"
+            ).store_phylonodes(command.nodes)
+
+    def test_walktree(self):
+        """Tests - walktree doesn't depend on the recursion limit."""
+        command = Command()
+        depth = 5000
+        command.nodes = {
+            i: {"parent_id": i - 1, "children": [i + 1] if i < depth else []}
+            for i in range(1, depth + 1)
+        }
+        command.nodes[1]["children"].insert(0, 1)
+        command.ctr = 0
+        command.walktree(node_id=1)
+        self.assertIsNone(command.nodes[1]["parent_id"])
+        self.assertEqual(command.nodes[1]["left_idx"], 1)
+        self.assertEqual(command.nodes[1]["right_idx"], depth * 2)
+        self.assertEqual(command.nodes[depth]["left_idx"], depth)
+        self.assertEqual(command.nodes[depth]["right_idx"], depth + 1)
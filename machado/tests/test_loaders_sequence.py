@@ -6,15 +6,19 @@
 
 """Tests for sequence loader."""
 
+import io
+
 from django.test import TestCase
+from Bio import SeqIO
 from Bio.SeqRecord import SeqRecord
 from Bio.Seq import Seq
-from machado.loaders.sequence import SequenceLoader
+from machado.loaders.sequence import SequenceLoader, read_fasta_blocks
 from machado.loaders.exceptions import ImportingError
 from machado.models import (
     Organism,
     Db,
     Dbxref,
+    Dbxrefprop,
     Cv,
     Cvterm,
     Pub,
@@ -112,6 +116,126 @@ class SequenceLoaderTest(TestCase):
         feature = Feature.objects.get(uniquename="feat1")
         self.assertTrue(FeaturePub.objects.filter(feature=feature, pub=pub).exists())
 
+    def test_store_biopython_seq_records(self):
+        """Test store biopython seq records."""
+        loader = SequenceLoader("test.fa", self.org)
+        Feature.objects.create(
+            organism=self.org,
+            uniquename="feat0",
+            type=self.cvterm_gene,
+            is_analysis=False,
+            is_obsolete=False,
+            timeaccessioned="2023-01-01T00:00:00Z",
+            timelastmodified="2023-01-01T00:00:00Z",
+        )
+        records = [
+            SeqRecord(Seq("ATGC"), id="feat1", description="Description 1"),
+            SeqRecord(Seq("AT"), id="feat2"),
+        ]
+        with self.assertNumQueries(8):
+            loader.store_biopython_seq_records(records, "gene")
+        feature = Feature.objects.get(uniquename="feat1")
+        self.assertEqual(feature.name, "Description 1")
+        self.assertEqual(feature.md5checksum, "2af651ad6e4063caae6ad7712c77d523")
+        self.assertEqual(feature.dbxref.accession, "feat1")
+        self.assertTrue(
+            Dbxrefprop.objects.filter(
+                dbxref=feature.dbxref, type=self.cvterm_loc
+            ).exists()
+        )
+        self.assertIsNone(Feature.objects.get(uniquename="feat2").name)
+
+        for accession in ["feat0", "feat2", "feat3"]:
+            with self.subTest(accession=accession):
+                records = [
+                    SeqRecord(Seq("A"), id="feat3"),
+                    SeqRecord(Seq("A"), id=accession),
+                ]
+                with self.assertRaisesRegex(
+                    ImportingError, "'{}' is already registered".format(accession)
+                ):
+                    loader.store_biopython_seq_records(records, "gene")
+        self.assertFalse(Feature.objects.filter(uniquename="feat3").exists())
+
+    def test_read_fasta_blocks(self):
+        """Test read fasta blocks."""
+        handle = io.StringIO(">seq1 first one\nAC GT\nA\n\n>seq2\r\nTT\r\n>seq3\n")
+        chunks = list(read_fasta_blocks(handle, block_size=3))
+        self.assertEqual(
+            [(index, title) for index, title, residues in chunks if not residues],
+            [(0, "seq1 first one"), (1, "seq2"), (2, "seq3")],
+        )
+        self.assertEqual(
+            "".join(residues for index, title, residues in chunks if index == 0),
+            "ACGTA",
+        )
+        self.assertEqual(
+            "".join(residues for index, title, residues in chunks if index == 1),
+            "TT",
+        )
+        with self.assertRaisesRegex(ImportingError, "before the first header"):
+            list(read_fasta_blocks(io.StringIO("ACGT\n>seq1\n")))
+
+    def test_store_fasta_stream(self):
+        """Test store fasta stream matches store biopython seq records."""
+        fasta = ">feat1 Description 1\nATGC\nAT\n>feat2\nGG\n>feat3\n"
+        loader = SequenceLoader("test.fa", self.org)
+        self.assertEqual(
+            list(loader.store_fasta_stream(io.StringIO(fasta), "gene", block_size=4)),
+            ["feat1", "feat2", "feat3"],
+        )
+        other = Organism.objects.create(genus="Genus", species="other")
+        SequenceLoader("test.fa", other).store_biopython_seq_records(
+            list(SeqIO.parse(io.StringIO(fasta), "fasta")), "gene"
+        )
+        for organism in [self.org, other]:
+            with self.subTest(organism=organism.species):
+                self.assertEqual(
+                    list(
+                        Feature.objects.filter(organism=organism)
+                        .order_by("uniquename")
+                        .values_list(
+                            "uniquename", "name", "residues", "seqlen", "md5checksum"
+                        )
+                    ),
+                    [
+                        (
+                            "feat1",
+                            "feat1 Description 1",
+                            "ATGCAT",
+                            6,
+                            "49805c3b01a615356de32ccfa81e6daf",
+                        ),
+                        ("feat2", "feat2", "GG", 2, "86d8d92aba9ecf9bbf89f69cb3e49588"),
+                        ("feat3", "feat3", "", 0, "d41d8cd98f00b204e9800998ecf8427e"),
+                    ],
+                )
+
+        with self.assertRaisesRegex(ImportingError, "'feat2' is already registered"):
+            list(loader.store_fasta_stream(io.StringIO(">feat4\nA\n>feat2\nA"), "gene"))
+        self.assertTrue(Feature.objects.filter(uniquename="feat4").exists())
+
+    def test_store_fasta_stream_title_too_long(self):
+        """Test store fasta stream with a title longer than the feature name."""
+        loader = SequenceLoader("test.fa", self.org)
+        fasta = ">feat1 {}\nATGC\n".format("x" * 300)
+        with self.assertRaisesRegex(ImportingError, "too long"):
+            list(loader.store_fasta_stream(io.StringIO(fasta), "gene"))
+        self.assertFalse(Feature.objects.filter(uniquename="feat1").exists())
+
+    def test_store_fasta_stream_ignore_residues(self):
+        """Test store fasta stream ignore residues."""
+        loader = SequenceLoader("test.fa", self.org)
+        list(
+            loader.store_fasta_stream(
+                io.StringIO(">feat1\nATGC\n"), "gene", ignore_residues=True
+            )
+        )
+        feature = Feature.objects.get(uniquename="feat1")
+        self.assertEqual(feature.residues, "")
+        self.assertEqual(feature.seqlen, 4)
+        self.assertEqual(feature.md5checksum, "2af651ad6e4063caae6ad7712c77d523")
+
     def test_add_sequence_to_feature_success(self):
         """Test add sequence to feature success."""
         loader = SequenceLoader("test.fa", self.org)
@@ -131,6 +255,47 @@ class SequenceLoaderTest(TestCase):
 
         feature = Feature.objects.get(uniquename="feat1")
         self.assertEqual(feature.residues, "ATGC")
+        self.assertEqual(feature.seqlen, 4)
+        self.assertEqual(feature.md5checksum, "2af651ad6e4063caae6ad7712c77d523")
+
+    def test_add_sequences_to_features(self):
+        """Test add sequences to features."""
+        for uniquename, name in [("feat1", None), ("feat2", "Feature Two")]:
+            Feature.objects.create(
+                organism=self.org,
+                uniquename=uniquename,
+                name=name,
+                type=self.cvterm_gene,
+                is_analysis=False,
+                is_obsolete=False,
+                timeaccessioned="2023-01-01T00:00:00Z",
+                timelastmodified="2023-01-01T00:00:00Z",
+            )
+        loader = SequenceLoader("test.fa", self.org)
+        loader.add_sequences_to_features(
+            [
+                SeqRecord(Seq("AAAA"), id="feat1"),
+                SeqRecord(Seq("GG"), id="feature two"),
+                SeqRecord(Seq("TT"), id="missing1"),
+            ],
+            "gene",
+        )
+        loader.add_sequences_to_features(
+            [SeqRecord(Seq("ATGC"), id="feat1"), SeqRecord(Seq("T"), id="missing2")],
+            "gene",
+        )
+        self.assertEqual(
+            list(
+                Feature.objects.order_by("uniquename").values_list(
+                    "uniquename", "residues", "seqlen", "md5checksum"
+                )
+            ),
+            [
+                ("feat1", "ATGC", 4, "2af651ad6e4063caae6ad7712c77d523"),
+                ("feat2", "GG", 2, "86d8d92aba9ecf9bbf89f69cb3e49588"),
+            ],
+        )
+        self.assertEqual(loader.unmatched, ["missing1", "missing2"])
 
     def test_add_sequence_to_feature_fail(self):
         """Test add sequence to feature fail."""
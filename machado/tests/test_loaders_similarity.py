@@ -8,17 +8,23 @@
 
 from django.test import TestCase
 from unittest.mock import MagicMock
+from machado.loaders.exceptions import ImportingError
 from machado.loaders.similarity import SimilarityLoader
 
 from machado.models import (
+    Analysisfeature,
     Cvterm,
     Cv,
     Dbxref,
     Db,
     Organism,
     Feature,
+    FeatureCvterm,
+    FeatureCvtermprop,
     FeatureRelationship,
+    FeatureRelationshipprop,
     Featureloc,
+    Pub,
 )
 
 
@@ -249,6 +255,92 @@ class SimilarityLoaderTest(TestCase):
             Feature.objects.filter(uniquename__contains="match_part").exists()
         )
 
+    def test_store_bio_searchio_query_results(self):
+        """Test store bio searchio query results in a batch."""
+        loader = SimilarityLoader(
+            filename="test.xml",
+            program="blast",
+            programversion="2.1",
+            so_query="mRNA",
+            so_subject="mRNA",
+            org_query="GenusQ speciesQ",
+            org_subject="GenusS speciesS",
+            input_format="blast-xml",
+        )
+        features = dict()
+        for organism, uniquename in [
+            (self.org_q, "Q1"),
+            (self.org_q, "Q2"),
+            (self.org_s, "S1"),
+        ]:
+            features[uniquename] = Feature.objects.create(
+                organism=organism,
+                uniquename=uniquename,
+                type=self.type_mrna,
+                is_analysis=False,
+                is_obsolete=False,
+                timeaccessioned="2023-01-01T00:00:00Z",
+                timelastmodified="2023-01-01T00:00:00Z",
+            ).feature_id
+
+        query_results = list()
+        for query_id, starts in [("Q1", [0, 200]), ("Q2", [10])]:
+            hsps = list()
+            for start in starts:
+                hsp_mock = MagicMock()
+                hsp_mock.query_id = query_id
+                hsp_mock.hit_id = "S1"
+                hsp_mock.query_start = start
+                hsp_mock.query_end = start + 50
+                hsp_mock.hit_start = 5
+                hsp_mock.hit_end = 55
+                hsp_mock.ident_num = 40
+                hsp_mock.bitscore = 80.5
+                hsp_mock.bitscore_raw = 200
+                hsp_mock.evalue = 1e-10
+                hsps.append(hsp_mock)
+            query_result_mock = MagicMock()
+            query_result_mock.hsps = hsps
+            query_results.append(query_result_mock)
+
+        loader.store_bio_searchio_query_results(query_results)
+
+        prefix = "match_part_{}".format(loader.analysis.analysis_id)
+        match_parts = Feature.objects.filter(type=self.cvterm_match)
+        self.assertEqual(
+            sorted(match_parts.values_list("uniquename", flat=True)),
+            sorted(
+                [
+                    "{}_{}_{}_1".format(prefix, features["Q1"], features["S1"]),
+                    "{}_{}_{}_2".format(prefix, features["Q1"], features["S1"]),
+                    "{}_{}_{}_1".format(prefix, features["Q2"], features["S1"]),
+                ]
+            ),
+        )
+        self.assertEqual(
+            sorted(
+                Featureloc.objects.filter(feature__in=match_parts).values_list(
+                    "srcfeature_id", "fmin", "fmax", "rank"
+                )
+            ),
+            sorted(
+                [
+                    (features["Q1"], 0, 50, 0),
+                    (features["Q1"], 200, 250, 0),
+                    (features["Q2"], 10, 60, 0),
+                ]
+                + [(features["S1"], 5, 55, 1)] * 3
+            ),
+        )
+        self.assertEqual(
+            set(
+                Analysisfeature.objects.filter(feature__in=match_parts).values_list(
+                    "analysis_id", "rawscore", "normscore", "significance", "identity"
+                )
+            ),
+            {(loader.analysis.analysis_id, 200, 80.5, 1e-10, 40)},
+        )
+
     def test_retrieve_query_from_hsp_description_fallback(self):
         """Test retrieve query from hsp description fallback."""
         loader = SimilarityLoader(
@@ -276,6 +368,50 @@ class SimilarityLoaderTest(TestCase):
 
         self.assertEqual(loader.retrieve_query_from_hsp(hsp_mock), q_feat.feature_id)
 
+    def test_retrieve_features_from_hsp_memoized(self):
+        """Test ids are resolved once, including the ones not found."""
+        loader = SimilarityLoader(
+            filename="test.xml",
+            program="blast",
+            programversion="2.1",
+            so_query="mRNA",
+            so_subject="mRNA",
+            org_query="GenusQ speciesQ",
+            org_subject="GenusS speciesS",
+            input_format="blast-xml",
+            ignorenotfound=True,
+        )
+        for organism, uniquename in [(self.org_q, "Q1"), (self.org_s, "S1")]:
+            Feature.objects.create(
+                organism=organism,
+                uniquename=uniquename,
+                type=self.type_mrna,
+                is_analysis=False,
+                is_obsolete=False,
+                timeaccessioned="2023-01-01T00:00:00Z",
+                timelastmodified="2023-01-01T00:00:00Z",
+            )
+        hsps = list()
+        for query_id, hit_id in [("Q1", "S1"), ("Q1", "MISSING"), ("Q2", "S1")]:
+            hsp_mock = MagicMock()
+            hsp_mock.query_id = query_id
+            hsp_mock.query_description = "no id"
+            hsp_mock.hit_id = hit_id
+            hsp_mock.hit_description = "no id"
+            hsps.append(hsp_mock)
+
+        results = [loader.retrieve_features_from_hsp(hsp) for hsp in hsps]
+        self.assertIsNotNone(results[0])
+        self.assertEqual(results[1:], [None, None])
+        self.assertEqual(loader.unresolved, {("subject", "MISSING"), ("query", "Q2")})
+        with self.assertNumQueries(0):
+            for hsp in hsps * 2:
+                loader.retrieve_features_from_hsp(hsp)
+
+        loader.ignorenotfound = False
+        with self.assertRaisesRegex(ImportingError, "Query feature 'Q2'"):
+            loader.retrieve_features_from_hsp(hsps[2])
+
     def test_interproscan_mRNA_annotation(self):
         """Test interproscan mRNA annotation."""
         loader = SimilarityLoader(
@@ -364,3 +500,124 @@ class SimilarityLoaderTest(TestCase):
                 object_id=q_mrna.feature_id, subject_id=s_feat.feature_id
             ).exists()
         )
+
+    def test_store_feature_relationships(self):
+        """Test the set-based transfer of the subjects' annotation."""
+        dbxref_poly = Dbxref.objects.create(db=self.db_internal, accession="poly")
+        type_poly = Cvterm.objects.create(
+            name="polypeptide",
+            cv=self.cv_seq,
+            dbxref=dbxref_poly,
+            is_obsolete=0,
+            is_relationshiptype=0,
+        )
+        type_trans = Cvterm.objects.create(
+            name="translation_of",
+            cv=self.cv_seq,
+            dbxref=Dbxref.objects.create(
+                db=self.db_internal, accession="translation_of"
+            ),
+            is_obsolete=0,
+            is_relationshiptype=1,
+        )
+        cv_go = Cv.objects.create(name="biological_process")
+        go_terms = [
+            Cvterm.objects.create(
+                name="go {}".format(i),
+                cv=cv_go,
+                dbxref=Dbxref.objects.create(
+                    db=self.db_internal, accession="GO{}".format(i)
+                ),
+                is_obsolete=0,
+                is_relationshiptype=0,
+            )
+            for i in range(2)
+        ]
+        pub = Pub.objects.create(uniquename="null", type_id=go_terms[0].cvterm_id)
+
+        def create_feature(organism, uniquename, soterm):
+            return Feature.objects.create(
+                organism=organism,
+                uniquename=uniquename,
+                type=soterm,
+                is_analysis=False,
+                is_obsolete=False,
+                timeaccessioned="2023-01-01T00:00:00Z",
+                timelastmodified="2023-01-01T00:00:00Z",
+            )
+
+        polypeptides = [
+            create_feature(self.org_q, "QPOLY{}".format(i), type_poly) for i in range(2)
+        ]
+        mrna = create_feature(self.org_q, "QMRNA0", self.type_mrna)
+        FeatureRelationship.objects.create(
+            object=polypeptides[0], subject=mrna, type=type_trans, rank=0
+        )
+        subjects = [
+            create_feature(self.org_s, "IPR{}".format(i), self.type_mrna)
+            for i in range(2)
+        ]
+        for subject in subjects:
+            for go_term in go_terms:
+                FeatureCvterm.objects.create(
+                    feature=subject, cvterm=go_term, pub=pub, is_not=False, rank=0
+                )
+
+        pairs = [
+            (polypeptides[0].feature_id, subjects[0].feature_id),
+            (polypeptides[0].feature_id, subjects[1].feature_id),
+            (polypeptides[1].feature_id, subjects[1].feature_id),
+        ]
+        for filename, repeats in [("first.xml", 2), ("second.xml", 1)]:
+            loader = SimilarityLoader(
+                filename=filename,
+                program="interproscan",
+                programversion="5",
+                so_query="polypeptide",
+                so_subject="protein_match",
+                org_query="GenusQ speciesQ",
+                org_subject="GenusS speciesS",
+                input_format="interproscan-xml",
+            )
+            for _ in range(repeats):
+                loader.store_feature_relationships(pairs + pairs[:1], parents=True)
+
+        similarity = FeatureRelationship.objects.filter(type=self.cvterm_sim)
+        self.assertEqual(
+            sorted(similarity.values_list("object__uniquename", "subject__uniquename")),
+            [
+                ("QMRNA0", "IPR0"),
+                ("QMRNA0", "IPR1"),
+                ("QPOLY0", "IPR0"),
+                ("QPOLY0", "IPR1"),
+                ("QPOLY1", "IPR1"),
+            ],
+        )
+        self.assertEqual(
+            sorted(
+                FeatureRelationshipprop.objects.filter(
+                    feature_relationship__in=similarity
+                ).values_list("value", "rank")
+            ),
+            [("first.xml", 0)] * 5 + [("second.xml", 1)] * 5,
+        )
+        self.assertEqual(
+            sorted(
+                FeatureCvterm.objects.filter(feature__organism=self.org_q).values_list(
+                    "feature__uniquename", "cvterm__name"
+                )
+            ),
+            [
+                (uniquename, go_term.name)
+                for uniquename in ["QMRNA0", "QPOLY0", "QPOLY1"]
+                for go_term in go_terms
+            ],
+        )
+        self.assertEqual(
+            sorted(
+                FeatureCvtermprop.objects.filter(
+                    feature_cvterm__feature__organism=self.org_q
+                ).values_list("value", "rank")
+            ),
+            [("first.xml", 0)] * 6 + [("second.xml", 1)] * 6,
+        )
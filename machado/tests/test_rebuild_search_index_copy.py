@@ -0,0 +1,53 @@
+# Copyright 2026 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""COPY writes and deferred index builds of rebuild_search_index."""
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from machado.management.commands.rebuild_search_index import Command
+from machado.models import FeatureSearchIndex
+from machado.tests.searchindex_fixture import build_search_index_fixture
+
+
+def index_names():
+    """Return the names of the indexes of the index table."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes WHERE tablename = %s",
+            [FeatureSearchIndex._meta.db_table],
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+class DeferredIndexTest(TestCase):
+    """A full rebuild drops the secondary indexes and builds them again."""
+
+    def setUp(self):
+        """Build the shared fixture corpus."""
+        build_search_index_fixture()
+        self.names = {index.name for index in FeatureSearchIndex._meta.indexes}
+
+    def test_full_rebuild_restores_the_indexes(self):
+        """The indexes exist after a rebuild written with COPY."""
+        call_command("rebuild_search_index", verbosity=0)
+        self.assertTrue(self.names <= index_names())
+        row = FeatureSearchIndex.objects.get(uniquename="GENE_A")
+        self.assertIn("kinas", str(row.search_vector))
+        self.assertTrue(
+            FeatureSearchIndex.objects.filter(search_vector="kinase").exists()
+        )
+
+    def test_resume_restores_missing_indexes(self):
+        """A run killed before the indexes were built is repaired by --resume."""
+        call_command("rebuild_search_index", verbosity=0)
+        Command().drop_indexes()
+        self.assertFalse(self.names & index_names())
+
+        call_command("rebuild_search_index", resume=True, verbosity=0)
+        self.assertTrue(self.names <= index_names())
@@ -0,0 +1,115 @@
+# Copyright 2026 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Incremental behaviour for rebuild_search_index."""
+
+import io
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.test import TestCase
+
+from machado.management.commands.rebuild_search_index import INDEX_LOCK
+from machado.models import (
+    Featureprop,
+    FeatureSearchIndex,
+    FeatureSearchIndexQueue,
+)
+from machado.tests.searchindex_fixture import (
+    build_search_index_fixture,
+    snapshot_index,
+)
+
+
+def queued():
+    """Return the queued feature ids."""
+    return set(FeatureSearchIndexQueue.objects.values_list("feature_id", flat=True))
+
+
+class IncrementalTest(TestCase):
+    """--incremental rebuilds only the features queued by the triggers."""
+
+    def setUp(self):
+        """Build the shared fixture corpus."""
+        self.features = build_search_index_fixture()
+
+    def test_triggers_queue_changed_features(self):
+        """Writes to the Chado tables queue the features they touch."""
+        gene_a = self.features["gene_a"]
+        self.assertIn(gene_a.feature_id, queued())
+
+        call_command("rebuild_search_index", verbosity=0)
+        self.assertEqual(queued(), set())
+
+        Featureprop.objects.filter(feature=gene_a, type__name="display").update(
+            value="beta kinase"
+        )
+        self.assertEqual(queued(), {gene_a.feature_id})
+
+    def test_incremental_matches_full_rebuild(self):
+        """Rebuilding the queue equals a full rebuild of the changed data."""
+        call_command("rebuild_search_index", verbosity=0)
+        gene_a = self.features["gene_a"]
+        Featureprop.objects.filter(feature=gene_a, type__name="display").update(
+            value="beta kinase"
+        )
+
+        call_command("rebuild_search_index", incremental=True, verbosity=0)
+        self.assertEqual(queued(), set())
+        incremental = snapshot_index()
+        self.assertIn("beta kinase", incremental["GENE_A"]["display"])
+
+        call_command("rebuild_search_index", verbosity=0)
+        self.assertEqual(snapshot_index(), incremental)
+
+    def test_incremental_removes_obsolete_features(self):
+        """A feature no longer eligible loses its entry."""
+        call_command("rebuild_search_index", verbosity=0)
+        gene_b = self.features["gene_b"]
+        gene_b.is_obsolete = True
+        gene_b.save()
+
+        call_command("rebuild_search_index", incremental=True, verbosity=0)
+        self.assertFalse(
+            FeatureSearchIndex.objects.filter(feature_id=gene_b.feature_id).exists()
+        )
+        self.assertTrue(
+            FeatureSearchIndex.objects.filter(
+                feature_id=self.features["gene_a"].feature_id
+            ).exists()
+        )
+
+    def test_incremental_rejects_resume(self):
+        """--incremental can't be combined with --resume."""
+        with self.assertRaises(CommandError):
+            call_command(
+                "rebuild_search_index",
+                incremental=True,
+                resume=True,
+                verbosity=0,
+                stdout=io.StringIO(),
+            )
+
+    def test_incremental_refuses_during_another_run(self):
+        """--incremental fails while another run holds the index lock."""
+        other = connections.create_connection(connection.alias)
+        try:
+            with other.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_lock(%s)", [INDEX_LOCK])
+            with self.assertRaisesRegex(CommandError, "Another rebuild_search_index"):
+                call_command(
+                    "rebuild_search_index",
+                    incremental=True,
+                    verbosity=0,
+                    stdout=io.StringIO(),
+                )
+            self.assertIn(self.features["gene_a"].feature_id, queued())
+        finally:
+            other.close()
+
+        call_command("rebuild_search_index", incremental=True, verbosity=0)
+        self.assertEqual(queued(), set())
@@ -64,8 +64,8 @@ class ResumeTest(TestCase):
         because bulk_create uses ignore_conflicts=True, re-processing an
         already-indexed feature is silently absorbed and the end result still
         looks correct. So assert on the COUNT the command reports it will
-        index. That is what distinguishes the correct MAX + __gt from a MIN,
-        or from an off-by-one __gte.
+        index. That is what distinguishes planning only the features missing
+        from the index from re-planning the indexed ones as well.
 
         (Do not assert PK uniqueness here -- feature_id IS the primary key, so
         uniqueness is a schema guarantee and such a test is tautological.)
@@ -93,6 +93,27 @@ class ResumeTest(TestCase):
         )
         self.assertEqual(FeatureSearchIndex.objects.count(), total)
 
+    def test_resume_fills_gaps_below_the_highest_indexed_row(self):
+        """--resume indexes the ranges a parallel run left behind.
+
+        Workers complete their ranges out of order, so an interrupted
+        --workers run leaves gaps below the highest indexed feature_id.
+        """
+        call_command("rebuild_search_index", verbosity=0)
+        complete = snapshot_index()
+
+        ids = list(
+            FeatureSearchIndex.objects.order_by("feature_id").values_list(
+                "feature_id", flat=True
+            )
+        )
+        FeatureSearchIndex.objects.filter(feature_id__in=ids[1:-1]).delete()
+
+        out = io.StringIO()
+        call_command("rebuild_search_index", resume=True, stdout=out)
+        self.assertIn("Indexing {} features...".format(len(ids) - 2), out.getvalue())
+        self.assertEqual(snapshot_index(), complete)
+
     def test_default_rebuild_clears_the_index(self):
         """Without --resume the index is cleared first."""
         call_command("rebuild_search_index", verbosity=0)
@@ -0,0 +1,95 @@
+# Copyright 2026 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Organism- and type-scoped runs of rebuild_search_index."""
+
+import io
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from machado.models import Cvterm, FeatureSearchIndex, Organism
+from machado.tests.searchindex_fixture import (
+    _feature,
+    build_search_index_fixture,
+    snapshot_index,
+)
+
+
+class ScopeTest(TestCase):
+    """A scoped run rebuilds the matching entries and no others."""
+
+    def setUp(self):
+        """Build the shared fixture corpus, a second organism and the index."""
+        self.features = build_search_index_fixture()
+        other = Organism.objects.create(genus="Oryza", species="sativa")
+        _feature(other, Cvterm.objects.get(name="gene", cv__name="sequence"), "GENE_OS")
+        call_command("rebuild_search_index", verbosity=0)
+        self.complete = snapshot_index()
+        FeatureSearchIndex.objects.update(display="STALE")
+
+    def stale(self):
+        """Return the uniquenames of the entries not rebuilt."""
+        return set(
+            FeatureSearchIndex.objects.filter(display="STALE").values_list(
+                "uniquename", flat=True
+            )
+        )
+
+    def test_organism_scope(self):
+        """Only the organism's entries are rebuilt."""
+        call_command("rebuild_search_index", organism="Oryza sativa", verbosity=0)
+        self.assertEqual(self.stale(), set(self.complete) - {"GENE_OS"})
+        self.assertEqual(snapshot_index()["GENE_OS"], self.complete["GENE_OS"])
+
+    def test_types_scope(self):
+        """Only the entries of the types are rebuilt, in every organism."""
+        call_command(
+            "rebuild_search_index",
+            organism="Arabidopsis thaliana",
+            types=["mRNA"],
+            verbosity=0,
+        )
+        self.assertEqual(self.stale(), set(self.complete) - {"MRNA_A"})
+
+        call_command("rebuild_search_index", types=["gene"], verbosity=0)
+        snapshot = snapshot_index()
+        for uniquename in ["GENE_A", "GENE_B", "GENE_C", "GENE_OS"]:
+            self.assertEqual(snapshot[uniquename], self.complete[uniquename])
+
+    def test_scope_removes_obsolete_features(self):
+        """Entries of features no longer eligible are deleted."""
+        gene_b = self.features["gene_b"]
+        gene_b.is_obsolete = True
+        gene_b.save()
+        call_command("rebuild_search_index", types=["gene"], verbosity=0)
+        self.assertNotIn("GENE_B", snapshot_index())
+        self.assertIn("GENE_A", snapshot_index())
+
+    def test_resume_within_scope(self):
+        """--resume indexes the scope's missing features only."""
+        FeatureSearchIndex.objects.all().delete()
+        call_command(
+            "rebuild_search_index", organism="Oryza sativa", resume=True, verbosity=0
+        )
+        self.assertEqual(set(snapshot_index()), {"GENE_OS"})
+
+    def test_invalid_scope(self):
+        """Unknown organisms and types, and --shadow, are rejected."""
+        for options in [
+            {"organism": "Unknown species"},
+            {"types": ["chromosome"]},
+            {"types": ["gene"], "shadow": True},
+        ]:
+            with self.subTest(**options):
+                with self.assertRaises(CommandError):
+                    call_command(
+                        "rebuild_search_index",
+                        verbosity=0,
+                        stdout=io.StringIO(),
+                        **options,
+                    )
@@ -0,0 +1,127 @@
+# Copyright 2026 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Shadow-table rebuilds and rollback of rebuild_search_index."""
+
+import io
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+
+from machado.management.commands.rebuild_search_index import Command
+from machado.models import Feature, FeatureSearchIndex, FeatureSearchIndexQueue
+from machado.tests.searchindex_fixture import (
+    build_search_index_fixture,
+    snapshot_index,
+)
+
+LIVE = FeatureSearchIndex._meta.db_table
+RETIRED = LIVE + "_old"
+
+
+def table_state(table):
+    """Return the index names and validated foreign key count, or None."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [table])
+        if cursor.fetchone()[0] is None:
+            return None
+        cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", [table])
+        indexes = {row[0] for row in cursor.fetchall()}
+        cursor.execute(
+            "SELECT count(*) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f' AND convalidated",
+            [table],
+        )
+        return indexes, cursor.fetchone()[0]
+
+
+class ShadowTest(TestCase):
+    """--shadow swaps in a complete table and keeps the previous one."""
+
+    def setUp(self):
+        """Build the shared fixture corpus and a stale index."""
+        build_search_index_fixture()
+        call_command("rebuild_search_index", verbosity=0)
+        self.complete = snapshot_index()
+        FeatureSearchIndex.objects.filter(uniquename="GENE_A").update(organism="STALE")
+        self.names = {LIVE + "_pkey"}
+        self.names.update(index.name for index in FeatureSearchIndex._meta.indexes)
+
+    def test_shadow_swaps_in_a_complete_table(self):
+        """The live table is rebuilt with its indexes and foreign keys."""
+        call_command("rebuild_search_index", shadow=True, verbosity=0)
+        self.assertEqual(snapshot_index(), self.complete)
+        self.assertEqual(table_state(LIVE), (self.names, 1))
+        self.assertEqual(
+            table_state(RETIRED), ({name + "_old" for name in self.names}, 0)
+        )
+        self.assertIsNone(table_state(LIVE + "_shadow"))
+
+    def test_shadow_drops_features_deleted_during_the_build(self):
+        """A feature deleted after its entry was written is left out."""
+        restore_indexes = Command.restore_indexes
+
+        def delete_then_restore(command, *args):
+            Feature.objects.filter(uniquename="GENE_B").delete()
+            return restore_indexes(command, *args)
+
+        with mock.patch.object(Command, "restore_indexes", delete_then_restore):
+            call_command("rebuild_search_index", shadow=True, verbosity=0)
+        del self.complete["GENE_B"]
+        self.assertEqual(snapshot_index(), self.complete)
+        self.assertEqual(table_state(LIVE), (self.names, 1))
+
+    def test_failed_shadow_keeps_the_queue(self):
+        """A failed run leaves the live table and the queue as they were."""
+        FeatureSearchIndexQueue.objects.create(
+            feature_id=Feature.objects.get(uniquename="GENE_A").feature_id
+        )
+        stale = snapshot_index()
+
+        with mock.patch.object(Command, "index_serial", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                call_command(
+                    "rebuild_search_index",
+                    shadow=True,
+                    verbosity=0,
+                    stdout=io.StringIO(),
+                )
+        self.assertEqual(snapshot_index(), stale)
+        self.assertTrue(
+            FeatureSearchIndexQueue.objects.filter(
+                feature_id=Feature.objects.get(uniquename="GENE_A").feature_id
+            ).exists()
+        )
+
+    def test_rollback_restores_the_retired_table(self):
+        """--rollback swaps the retired table back, and undoes itself."""
+        call_command("rebuild_search_index", shadow=True, verbosity=0)
+        call_command("rebuild_search_index", rollback=True, verbosity=0)
+        self.assertEqual(snapshot_index()["GENE_A"]["organism"], "STALE")
+        self.assertEqual(table_state(LIVE), (self.names, 1))
+
+        call_command("rebuild_search_index", rollback=True, verbosity=0)
+        self.assertEqual(snapshot_index(), self.complete)
+
+    def test_second_shadow_replaces_the_retired_table(self):
+        """Only the table retired by the last run is kept."""
+        call_command("rebuild_search_index", shadow=True, verbosity=0)
+        call_command("rebuild_search_index", shadow=True, verbosity=0)
+        call_command("rebuild_search_index", rollback=True, verbosity=0)
+        self.assertEqual(snapshot_index(), self.complete)
+
+    def test_rollback_without_retired_table(self):
+        """--rollback fails when no --shadow run retired a table."""
+        with self.assertRaisesRegex(CommandError, "no retired index table"):
+            call_command(
+                "rebuild_search_index",
+                rollback=True,
+                verbosity=0,
+                stdout=io.StringIO(),
+            )
@@ -0,0 +1,84 @@
+# Copyright 2026 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Range planning and the worker of rebuild_search_index --workers."""
+
+import io
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from machado.management.commands.rebuild_search_index import Command, index_range
+from machado.models import FeatureSearchIndex
+from machado.searchindex import IndexConfig, IndexRunCache
+from machado.tests.searchindex_fixture import (
+    build_search_index_fixture,
+    snapshot_index,
+)
+
+
+class WorkersTest(TestCase):
+    """The ranges handed to the workers cover exactly the missing features."""
+
+    def setUp(self):
+        """Build the shared fixture corpus."""
+        build_search_index_fixture()
+        self.config = IndexConfig.from_settings()
+        self.command = Command()
+        self.eligible = list(
+            self.command.base_queryset(self.config).values_list("feature_id", flat=True)
+        )
+
+    def test_plan_ranges_covers_the_missing_features(self):
+        """Ranges are ordered, bounded by batch size and skip indexed rows."""
+        ranges = self.command.plan_ranges(self.config, 2)
+        self.assertEqual(sum(count for _, _, count in ranges), len(self.eligible))
+        self.assertTrue(all(count <= 2 for _, _, count in ranges))
+        self.assertEqual(ranges[0][0], self.eligible[0])
+        self.assertEqual(ranges[-1][1], self.eligible[-1])
+
+        call_command("rebuild_search_index", verbosity=0)
+        self.assertEqual(self.command.plan_ranges(self.config, 2), [])
+
+        half = len(self.eligible) // 2
+        FeatureSearchIndex.objects.exclude(feature_id=self.eligible[half]).delete()
+        self.assertEqual(
+            self.command.plan_ranges(self.config, 100),
+            [
+                (self.eligible[0], self.eligible[half - 1], half),
+                (
+                    self.eligible[half + 1],
+                    self.eligible[-1],
+                    len(self.eligible) - half - 1,
+                ),
+            ],
+        )
+
+    def test_index_range_matches_full_rebuild(self):
+        """Indexing every planned range equals a full rebuild."""
+        call_command("rebuild_search_index", verbosity=0)
+        complete = snapshot_index()
+        FeatureSearchIndex.objects.all().delete()
+
+        cache = IndexRunCache()
+        indexed = sum(
+            index_range(first_id, last_id, self.config, 2, cache=cache)
+            for first_id, last_id, _ in self.command.plan_ranges(self.config, 2)
+        )
+        self.assertEqual(indexed, len(complete))
+        self.assertEqual(snapshot_index(), complete)
+
+    def test_workers_rejects_max_features(self):
+        """--max-features can't be combined with --workers."""
+        with self.assertRaises(CommandError):
+            call_command(
+                "rebuild_search_index",
+                workers=2,
+                max_features=1,
+                verbosity=0,
+                stdout=io.StringIO(),
+            )
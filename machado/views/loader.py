@@ -48,7 +48,23 @@ COMMANDS_CONFIG = {
                 "default_url": "https://raw.githubusercontent.com/The-Sequence-Ontology/SO-Ontologies/refs/heads/master/Ontology_Files/so.obo",
                 "help": "Path to the Sequence Ontology OBO file",
                 "type": "file",
-            }
+            },
+            {
+                "name": "bulk",
+                "required": False,
+                "default": None,
+                "help": "Store the terms and relationships with multi-row statements",
+                "type": "checkbox",
+                "label": "Bulk Mode",
+            },
+            {
+                "name": "cvtermpath",
+                "required": False,
+                "default": None,
+                "help": "Store the transitive closure of the terms after loading",
+                "type": "checkbox",
+                "label": "Closure",
+            },
         ],
         "title": "Load Sequence Ontology",
     },
@@ -70,9 +86,40 @@ COMMANDS_CONFIG = {
                 "help": "Number of threads for parallel processing",
                 "type": "text",
             },
+            {
+                "name": "bulk",
+                "required": False,
+                "default": None,
+                "help": "Store the terms and relationships with multi-row statements",
+                "type": "checkbox",
+                "label": "Bulk Mode",
+            },
+            {
+                "name": "cvtermpath",
+                "required": False,
+                "default": None,
+                "help": "Store the transitive closure of the terms after loading",
+                "type": "checkbox",
+                "label": "Closure",
+            },
         ],
         "title": "Load Gene Ontology",
     },
+    "load_cvtermpath": {
+        "help": "Store the transitive closure of the ontology terms (cvtermpath)",
+        "args": [
+            {
+                "name": "name",
+                "required": False,
+                "default": None,
+                "help": "Name of the ontology; default: every ontology "
+                "with relationships",
+                "type": "ontology",
+                "multiple": True,
+            }
+        ],
+        "title": "Load Ontology Closure",
+    },
     "load_publication": {
         "help": "Load publication metadata (e.g., title, year, journal) from a file",
         "args": [
@@ -201,6 +248,21 @@ COMMANDS_CONFIG = {
                 "help": "Number of threads for parallel processing",
                 "type": "text",
             },
+            {
+                "name": "batch-size",
+                "required": False,
+                "default": 500,
+                "help": "Number of sequences stored per batch",
+                "type": "text",
+            },
+            {
+                "name": "stream",
+                "required": False,
+                "default": None,
+                "help": "Copy the sequences while reading them (long chromosomes)",
+                "type": "checkbox",
+                "label": "Stream",
+            },
             {
                 "name": "description",
                 "required": False,
@@ -278,6 +340,28 @@ COMMANDS_CONFIG = {
                 "help": "Number of threads for parallel processing",
                 "type": "text",
             },
+            {
+                "name": "bulk",
+                "required": False,
+                "default": None,
+                "help": "Load the features in batches written with COPY",
+                "type": "checkbox",
+                "label": "Bulk Mode",
+            },
+            {
+                "name": "batch-size",
+                "required": False,
+                "default": 5000,
+                "help": "Number of GFF rows per batch in bulk mode",
+                "type": "text",
+            },
+            {
+                "name": "processes",
+                "required": False,
+                "default": 1,
+                "help": "Number of worker processes; each one loads whole contigs",
+                "type": "text",
+            },
         ],
         "title": "Load GFF3",
     },
@@ -447,6 +531,21 @@ COMMANDS_CONFIG = {
                 "help": "Number of threads for parallel processing",
                 "type": "text",
             },
+            {
+                "name": "bulk",
+                "required": False,
+                "default": None,
+                "help": "Apply the sequences in batches with a single UPDATE",
+                "type": "checkbox",
+                "label": "Bulk Mode",
+            },
+            {
+                "name": "batch-size",
+                "required": False,
+                "default": 1000,
+                "help": "Number of sequences per batch in bulk mode",
+                "type": "text",
+            },
         ],
         "title": "Load Feature Sequence",
     },
@@ -475,6 +574,21 @@ COMMANDS_CONFIG = {
                 "help": "Number of threads for parallel processing",
                 "type": "text",
             },
+            {
+                "name": "bulk",
+                "required": False,
+                "default": None,
+                "help": "Store the distinct hits in batches written with upserts",
+                "type": "checkbox",
+                "label": "Bulk Mode",
+            },
+            {
+                "name": "batch-size",
+                "required": False,
+                "default": 1000,
+                "help": "Number of distinct hits per batch in bulk mode",
+                "type": "text",
+            },
         ],
         "title": "Load Similarity Matches",
     },
@@ -568,6 +682,29 @@ COMMANDS_CONFIG = {
                 "help": "Number of threads for parallel processing",
                 "type": "text",
             },
+            {
+                "name": "ignorenotfound",
+                "required": False,
+                "default": None,
+                "help": "Skip HSPs whose query or subject is not found",
+                "type": "checkbox",
+                "label": "Ignore Not Found",
+            },
+            {
+                "name": "bulk",
+                "required": False,
+                "default": None,
+                "help": "Store the HSPs of many query results at once, with COPY",
+                "type": "checkbox",
+                "label": "Bulk Mode",
+            },
+            {
+                "name": "batch-size",
+                "required": False,
+                "default": 100,
+                "help": "Number of query results per batch in bulk mode",
+                "type": "text",
+            },
         ],
         "title": "Load Similarity",
     },
@@ -588,6 +725,21 @@ COMMANDS_CONFIG = {
                 "help": "Number of threads for parallel processing",
                 "type": "text",
             },
+            {
+                "name": "bulk",
+                "required": False,
+                "default": None,
+                "help": "Resolve the members of many groups at once",
+                "type": "checkbox",
+                "label": "Bulk Mode",
+            },
+            {
+                "name": "batch-size",
+                "required": False,
+                "default": 5000,
+                "help": "Number of groups per batch in bulk mode",
+                "type": "text",
+            },
         ],
         "title": "Load OrthoMCL",
     },
@@ -713,6 +865,21 @@ COMMANDS_CONFIG = {
                 "help": "Number of threads for parallel processing",
                 "type": "text",
             },
+            {
+                "name": "bulk",
+                "required": False,
+                "default": None,
+                "help": "Write the non-zero scores in blocks of rows with COPY",
+                "type": "checkbox",
+                "label": "Bulk Mode",
+            },
+            {
+                "name": "batch-size",
+                "required": False,
+                "default": 1000,
+                "help": "Number of matrix rows per block in bulk mode",
+                "type": "text",
+            },
         ],
         "title": "Load RNA-Seq Data",
     },
@@ -747,6 +914,21 @@ COMMANDS_CONFIG = {
                 "help": "Number of threads for parallel processing",
                 "type": "text",
             },
+            {
+                "name": "bulk",
+                "required": False,
+                "default": None,
+                "help": "Resolve the members of many clusters at once",
+                "type": "checkbox",
+                "label": "Bulk Mode",
+            },
+            {
+                "name": "batch-size",
+                "required": False,
+                "default": 5000,
+                "help": "Number of clusters per batch in bulk mode",
+                "type": "text",
+            },
         ],
         "title": "Load Co-expression Clusters",
     },
@@ -781,6 +963,21 @@ COMMANDS_CONFIG = {
                 "help": "Number of threads for parallel processing",
                 "type": "text",
             },
+            {
+                "name": "bulk",
+                "required": False,
+                "default": None,
+                "help": "Stream the pairs in batches written with COPY",
+                "type": "checkbox",
+                "label": "Bulk Mode",
+            },
+            {
+                "name": "batch-size",
+                "required": False,
+                "default": 50000,
+                "help": "Number of pairs per batch in bulk mode",
+                "type": "text",
+            },
         ],
         "title": "Load Co-expression Pairs",
     },
@@ -815,6 +1012,28 @@ COMMANDS_CONFIG = {
                 "help": "Number of threads for parallel processing",
                 "type": "text",
             },
+            {
+                "name": "processes",
+                "required": False,
+                "default": 1,
+                "help": "Number of worker processes; each one loads whole contigs",
+                "type": "text",
+            },
+            {
+                "name": "bulk",
+                "required": False,
+                "default": None,
+                "help": "Load the variants in batches written with COPY",
+                "type": "checkbox",
+                "label": "Bulk Mode",
+            },
+            {
+                "name": "batch-size",
+                "required": False,
+                "default": 5000,
+                "help": "Number of VCF rows per batch in bulk mode",
+                "type": "text",
+            },
         ],
         "title": "Load VCF",
     },
@@ -832,6 +1051,16 @@ COMMANDS_CONFIG = {
                 ),
                 "type": "text",
             },
+            {
+                "name": "workers",
+                "required": False,
+                "default": 1,
+                "help": (
+                    "Number of worker processes, each indexing chunks of "
+                    "features on its own database connection. Default: 1."
+                ),
+                "type": "text",
+            },
             {
                 "name": "resume",
                 "required": False,
@@ -839,8 +1068,8 @@ COMMANDS_CONFIG = {
                 "label": "Resume interrupted run",
                 "help": (
                     "Continue a rebuild that was interrupted, skipping "
-                    "features already indexed. Only indexes features newer "
-                    "than the highest already in the index -- it is NOT a way "
+                    "features already indexed. Only indexes features missing "
+                    "from the index -- it is NOT a way "
                     "to refresh data loaded onto features that are already "
                     "indexed. After a loader that attaches data to existing "
                     "features -- load_similarity, load_feature_annotation, "
@@ -852,6 +1081,59 @@ COMMANDS_CONFIG = {
                 ),
                 "type": "checkbox",
             },
+            {
+                "name": "incremental",
+                "required": False,
+                "default": None,
+                "label": "Changed features only",
+                "help": (
+                    "Rebuild only the entries of the features changed since "
+                    "the last run, as recorded by the database, and remove "
+                    "the entries of deleted or obsolete features. Can't be "
+                    "combined with resume."
+                ),
+                "type": "checkbox",
+            },
+            {
+                "name": "organism",
+                "required": False,
+                "default": None,
+                "help": "Rebuild only the entries of this organism's features",
+                "type": "organism",
+            },
+            {
+                "name": "types",
+                "required": False,
+                "default": None,
+                "help": (
+                    "Rebuild only the entries of the features of these "
+                    "types, from MACHADO_VALID_TYPES (comma-separated)"
+                ),
+                "type": "text",
+            },
+            {
+                "name": "shadow",
+                "required": False,
+                "default": None,
+                "label": "Rebuild without downtime",
+                "help": (
+                    "Build into a copy of the index and swap it in once "
+                    "complete, so searches keep working during the rebuild. "
+                    "The previous index is kept for rollback."
+                ),
+                "type": "checkbox",
+            },
+            {
+                "name": "rollback",
+                "required": False,
+                "default": None,
+                "label": "Roll back",
+                "help": (
+                    "Swap back the index replaced by the last rebuild "
+                    "without downtime. Nothing is rebuilt."
+                ),
+                "type": "checkbox",
+            },
         ],
         "title": "Rebuild Search Index",
     },
@@ -997,6 +1279,7 @@ class DashboardView(LoginRequiredMixin, View):
                     "load_relations_ontology",
                     "load_sequence_ontology",
                     "load_gene_ontology",
+                    "load_cvtermpath",
                 ],
             },
             {